@@ -80,6 +80,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # background analysis workers write to the DB while requests read it
+        'OPTIONS': {
+            'timeout': 20,
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            # concurrent writers (batch videos) wait for the lock instead of failing on a read->write upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # tests use a file too: threads sharing an in-memory database fail on table locks instead of waiting
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -124,3 +133,114 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Sentiment analysis pipeline
+
+# RoBERTa inference: comments per forward pass and torch CPU threads of the process, set when the model is
+# loaded (None = torch default)
+ROBERTA_BATCH_SIZE = 32
+ROBERTA_NUM_THREADS = None
+# ONNX Runtime sessions of the exported RoBERTa models (roberta_onnx, roberta_int8): threads per operator
+# (None = one per core) and operators run in parallel
+ONNX_INTRA_OP_THREADS = None
+ONNX_INTER_OP_THREADS = 1
+# "cascade" model: CASCADE_FAST_MODEL classifies every comment, the ones whose predicted label has a probability
+# below CASCADE_THRESHOLD are classified again by CASCADE_EXPERT_MODEL
+CASCADE_FAST_MODEL = 'logistic_regression'
+CASCADE_EXPERT_MODEL = 'roberta'
+CASCADE_THRESHOLD = 0.8
+
+# Background analysis jobs: analyses running at once per process, and analyses allowed to wait in the queue
+ANALYSIS_MAX_CONCURRENT_JOBS = 2
+ANALYSIS_MAX_QUEUED_JOBS = 20
+# Jobs left queued/running by a stopped server process of this host are marked failed on the first request of
+# each process (jobs of live processes, e.g. other gunicorn workers, are left alone)
+ANALYSIS_RECOVER_STALE_JOBS = True
+# Progress of running jobs: Django cache holding the latest update of every job (share it between processes, e.g.
+# Redis, when running several workers) and how often, in seconds, progress is also written to the AnalysisJob row
+ANALYSIS_PROGRESS_CACHE = 'default'
+ANALYSIS_PROGRESS_DB_INTERVAL = 2.0
+ANALYSIS_PROGRESS_STREAM_TIMEOUT = 15 * 60
+
+# Cache of finished analyses per (video, model, model version): lifetime in seconds and max number of entries (LRU)
+ANALYSIS_CACHE_TTL = 6 * 60 * 60
+ANALYSIS_CACHE_MAX_ENTRIES = 200
+
+# Re-analysis of an already analysed video only fetches and classifies comments newer than the last run
+ANALYSIS_INCREMENTAL = True
+
+# Classified comments of a finished analysis are read from the database page by page: comments per page
+# (the first page is rendered with the dashboard, the next ones are fetched as JSON) and the largest page a client may ask for
+RESULTS_PAGE_SIZE = 50
+RESULTS_MAX_PAGE_SIZE = 500
+
+# Batch analysis of video lists, playlists and channels (/batch/, manage.py analyze_batch): max videos per batch,
+# videos analysed at the same time and max comments fetched per video
+BATCH_MAX_VIDEOS = 50
+BATCH_WORKERS = 4
+BATCH_COMMENTS_PER_VIDEO = 1000
+# compare mode (/compare/, compare_models command): comments where the models disagree kept in the report
+COMPARE_MAX_DISAGREEMENTS = 200
+
+# Sampling mode for videos above PRO_COMMENT_LIMIT comments (data_processing.sampling): at most
+# SAMPLING_MAX_COMMENTS are classified, sampling stops once the widest SAMPLING_CONFIDENCE interval of the
+# sentiment shares is at most SAMPLING_TARGET_WIDTH (fraction, 0.05 = 5 points) after SAMPLING_MIN_COMMENTS.
+# Disabled, such videos get the PRO modal.
+SAMPLING_ENABLED = True
+SAMPLING_MAX_COMMENTS = 5000
+SAMPLING_MIN_COMMENTS = 400
+SAMPLING_TARGET_WIDTH = 0.05
+SAMPLING_CONFIDENCE = 0.95
+
+# Duplicate comments (data_processing.dedup): groups of equal normalized text or near-duplicates (MinHash/LSH,
+# Jaccard similarity of character shingles >= DEDUP_THRESHOLD) are classified once
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.8
+DEDUP_NUM_PERM = 64
+DEDUP_BANDS = 16
+DEDUP_NEAR_MIN_CHARS = 20
+
+# spaCy preprocessing: texts per nlp.pipe batch and worker processes
+PREPROCESSING_BATCH_SIZE = 256
+PREPROCESSING_N_PROCESS = 1
+# Preprocessing caches: cleaned text -> tokens, word -> lemmas ("token" lemma mode lemmatizes words out of context).
+# With PREPROCESSING_CACHE_PATH set, the caches are loaded by new worker processes and saved after an analysis once
+# PREPROCESSING_CACHE_SAVE_INTERVAL seconds passed since the last save or PREPROCESSING_CACHE_SAVE_MIN_CHANGES
+# entries were added (and when the process exits).
+PREPROCESSING_TEXT_CACHE_SIZE = 50000
+PREPROCESSING_TOKEN_CACHE_SIZE = 100000
+PREPROCESSING_LEMMA_MODE = "context"
+PREPROCESSING_CACHE_PATH = None
+PREPROCESSING_CACHE_SAVE_INTERVAL = 300
+PREPROCESSING_CACHE_SAVE_MIN_CHANGES = 10000
+
+# Translation of non-English comments: backend class, texts per request, concurrent requests, retries per chunk
+# and base backoff in seconds (doubled after every failed attempt). Results are cached in the database.
+TRANSLATION_BACKEND = 'youtube_integration.translation.GoogleTranslatorBackend'
+TRANSLATION_CHUNK_SIZE = 50
+TRANSLATION_WORKERS = 4
+TRANSLATION_RETRIES = 3
+TRANSLATION_BACKOFF = 1.0
+
+# YouTube Data API scheduling (per API key): quota units per day (reset at midnight Pacific time),
+# requests per second and burst size, retries of 5xx/429/network errors and base backoff in seconds
+# (exponential with full jitter). A run stopped by the quota resumes from its last page on the next try.
+# The units used are counted in the YOUTUBE_QUOTA_CACHE Django cache (share it between processes, e.g. Redis,
+# when running several workers).
+YOUTUBE_DAILY_QUOTA = 10000
+YOUTUBE_REQUESTS_PER_SECOND = 10
+YOUTUBE_BURST = 10
+YOUTUBE_RETRIES = 4
+YOUTUBE_BACKOFF = 1.0
+YOUTUBE_QUOTA_CACHE = 'default'
+
+# Comment language detection: "cascade" (cld2, langid for unsure results), "cld2", "langid" or "langdetect",
+# and worker processes for large batches
+LANGUAGE_DETECTION_ENGINE = 'cascade'
+LANGUAGE_DETECTION_PROCESSES = 1
+
+# Models are loaded on first use. MODEL_MEMORY_BUDGET_MB (None = no limit) unloads the least recently used ones
+# when exceeded (sizes estimated from the model files), MODEL_WARMUP models are loaded in the background at start.
+MODEL_MEMORY_BUDGET_MB = None
+MODEL_WARMUP = []
@@ -24,6 +24,13 @@ urlpatterns = [
     path('loading/', dashboard_views.loading_view, name='loading'),
     path('analyze/', proces_views.run_analysis, name='run_analysis'),
     path('dashboard/', dashboard_views.results_dashboard, name='results_dashboard'),
+    path('dashboard/comments/', dashboard_views.results_comments, name='results_comments'),
     path('analyze-status/', proces_views.get_analysis_status, name='get_analysis_status'),
+    path('analyze-events/', proces_views.analysis_events, name='analysis_events'),
+    path('analyze-cancel/', proces_views.cancel_analysis, name='cancel_analysis'),
+    path('batch/', proces_views.batch_analysis, name='batch_analysis'),
+    path('compare/', proces_views.compare_models, name='compare_models'),
+    # Prometheus scrapes /metrics (no trailing slash)
+    path('metrics', proces_views.prometheus_metrics, name='metrics'),
 ]
 
@@ -1,15 +1,21 @@
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib import messages
 import re
 import json
 
-from data_processing.views import MODEL_CATALOG
-from youtube_integration.services import check_video_limit
+from data_processing.models import AnalysisJob
+from data_processing.model_registry import MODEL_CATALOG, get_model_version
+from data_processing import result_cache, results_store, sampling
+from youtube_integration.services import check_video, comment_limit_message
 
 DISPLAY_NAMES = {
     'logistic_regression': 'Logistic Regression',
     'svc': 'Support Vector Machine (SVC)',
     'naive_bayes': 'Naive Bayes Classifier',
+    'roberta_onnx': 'RoBERTa (ONNX)',
+    'roberta_int8': 'RoBERTa int8 (ONNX, fast on CPU)',
+    'cascade': 'Cascade (Logistic Regression, RoBERTa if unsure)',
 }
 
 def extract_video_id(link):
@@ -41,12 +47,36 @@ def sentiment_dashboard(request):
         video_id = extract_video_id(submitted_link)
         model_name = request.POST.get("model_name", "logistic_regression")
 
+        cached = None
+        if video_id and model_name in MODEL_CATALOG:
+            entry = result_cache.get_cached(video_id, model_name, get_model_version(model_name))
+            if entry is not None:
+                # its comments are read from the VideoAnalysis, gone if a newer run replaced it
+                cached = results_store.get_analysis(entry.stats.get('analysis_id'))
+
         if not video_id:
             messages.error(request, "Input valid YouTube link.")
+        elif cached is not None:
+            # same video and model analysed recently -> skip the pipeline
+            request.session.pop('analysis_job_id', None)
+            request.session['last_analysis_id'] = cached.pk
+            return redirect('results_dashboard')
         else:
-            # Check comment limit before proceeding, when 10000 comments exceeded, show error.
-            is_allowed, limit_msg = check_video_limit(video_id)
-            if not is_allowed:
+            # Check comment limit before proceeding: above 10000 comments the shares are estimated from a sample
+            # (sampling mode); the PRO modal is shown if sampling is disabled.
+            comment_count, error = check_video(video_id)
+            limit_msg = error or comment_limit_message(comment_count)
+            sample = error is None and limit_msg is not None and sampling.SAMPLING_ENABLED
+            entry = None
+            if sample and model_name in MODEL_CATALOG:
+                entry = result_cache.get_cached(video_id, model_name, get_model_version(model_name), 'sample')
+            cached_sample = results_store.get_analysis(entry.stats.get('analysis_id')) if entry is not None else None
+            if cached_sample is not None:
+                # same video and model sampled recently
+                request.session.pop('analysis_job_id', None)
+                request.session['last_analysis_id'] = cached_sample.pk
+                return redirect('results_dashboard')
+            if limit_msg and not sample:
                 # loading and showing pro modal
                 model_choices_for_template = [
                     (key, DISPLAY_NAMES.get(key, key.replace('_', ' ').title()))
@@ -69,10 +99,11 @@ def sentiment_dashboard(request):
                     return redirect('sentiment_dashboard')
 
                 # RESET PROGRESS BAR STATUS BEFORE STARTING
-                request.session['analysis_status'] = {'progress': 0, 'step': 'Initializing...'}
+                request.session.pop('analysis_job_id', None)
                 request.session['analysis_params'] = {
                     'video_id': video_id,
-                    'model_name': model_name
+                    'model_name': model_name,
+                    'sample': sample,
                 }
                 request.session.save()
                 return redirect('loading')
@@ -93,8 +124,32 @@ def sentiment_dashboard(request):
 def loading_view(request):
     return render(request, "loading.html")
 
+def _share_intervals(sentiment_share, sampling_report):
+    """Rows (label, share, low, high, margin) for the error bars of a sampled analysis, in percent."""
+    if not sampling_report:
+        return []
+    rows = []
+    for label in ('positive', 'neutral', 'negative'):
+        interval = sampling_report['intervals'][label]
+        rows.append({'label': label, 'share': sentiment_share.get(label, 0), 'low': interval['low'],
+                     'high': interval['high'], 'width': round(interval['high'] - interval['low'], 1),
+                     'margin': round((interval['high'] - interval['low']) / 2, 1)})
+    return rows
+
 def results_dashboard(request):
-    data = request.session.get('last_stats', {})
+    # results of a finished background job replace the previous ones; the session only keeps the analysis id
+    job_id = request.session.get('analysis_job_id')
+    if job_id:
+        job = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.STATUS_DONE).first()
+        if job is not None:
+            request.session['last_analysis_id'] = (job.result or {}).get('analysis_id')
+            request.session.pop('analysis_job_id')
+    request.session.pop('last_stats', None)  # per-comment results stored by older versions
+
+    analysis = results_store.get_analysis(request.session.get('last_analysis_id'))
+    data = analysis.report if analysis is not None else {}
+    # first page rendered with the dashboard, the next ones (or another label) come from results_comments
+    first_page = results_store.comment_page(analysis) if analysis is not None else {}
     sentiment_share = data.get('sentiment_share') or {}
     context = {
         'comment_count': data.get('comment_count'),
@@ -111,6 +166,38 @@ def results_dashboard(request):
         'dominant_sentiment': data.get('dominant_sentiment'),
         'dominant_sentiment_percent': data.get('dominant_sentiment_percent'),
         'model_used': data.get('model_used'),
-        'classified_comments': data.get('classified_comments', []),
+        'overall_confidence': data.get('overall_confidence'),
+        'mean_confidence': data.get('mean_confidence') or {},
+        'low_confidence_count': data.get('low_confidence_count'),
+        'low_confidence_threshold': data.get('low_confidence_threshold'),
+        'confidence_histogram_json': json.dumps(
+            {'bins': data['confidence_bins'], 'counts': data['confidence_histogram']}
+            if data.get('overall_confidence') is not None else None),
+        # share of comments that repeat an earlier one (spam signal), see data_processing.dedup
+        'duplicates': data.get('duplicates'),
+        'duplicate_percent': data['duplicates']['ratio'] * 100 if data.get('duplicates') else None,
+        # sampled analysis (videos above the comment limit): confidence intervals of the shares
+        'sampling': data.get('sampling'),
+        'share_intervals': _share_intervals(sentiment_share, data.get('sampling')),
+        'time_series': data.get('time_series') or {},
+        'time_series_json': json.dumps(data.get('time_series')),
+        'classified_comments': first_page.get('comments', []),
+        'comments_has_next': first_page.get('has_next', False),
     }
-    return render(request, "dashboard.html", context)
\ No newline at end of file
+    return render(request, "dashboard.html", context)
+
+
+def results_comments(request):
+    """
+    JSON page of the classified comments of the session's last analysis.
+    GET params: label (negative / neutral / positive, empty = all), page (from 1), page_size.
+    """
+    analysis = results_store.get_analysis(request.session.get('last_analysis_id'))
+    if analysis is None:
+        return JsonResponse({"status": "error", "message": "No analysis results."}, status=404)
+    try:
+        page = results_store.comment_page(analysis, label=request.GET.get('label') or None,
+                                          page=request.GET.get('page', 1), page_size=request.GET.get('page_size'))
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return JsonResponse(page)
\ No newline at end of file
@@ -1,27 +1,40 @@
 # train_and_serialize.py
-import pandas as pd
-import joblib
+#
+# python train_and_serialize.py                      # whole CSV in memory, models trained in parallel
+# python train_and_serialize.py --svm linear         # LinearSVC instead of SVC(kernel='linear') (large corpora)
+# python train_and_serialize.py --out-of-core --chunksize 100000   # millions of comments in bounded memory
+#
+# The corpus is tokenized once (spaCy with several processes) and the tokens are cached on disk,
+# keyed on the CSV file, so re-training with other models or settings skips spaCy entirely.
+import argparse
+import hashlib
 import os
+import time
+from collections import Counter
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.svm import SVC, LinearSVC
 from sklearn.naive_bayes import ComplementNB
 from sklearn.metrics import classification_report
 
-from data_processing.preprocessing_text import text_tokenizer
+from data_processing import preprocessing_text
+from data_processing.preprocessing_text import tokenize_batch, split_tokens
+from data_processing.artifacts import save_vectorizer, write_vectorizer, load_vectorizer, dump_model
 
-# ----------------------------------------------------------------------
-# 1. LOADING AND PREPARING DATA
-# ----------------------------------------------------------------------
+# processes used by spaCy while tokenizing the training corpus
+N_PROCESS = int(os.getenv('SPACY_N_PROCESS', os.cpu_count() or 1))
 
-path = '../colab_train_models/Data/1_training_data_high_quality.csv'
-try:
-    df = pd.read_csv(path)
-except FileNotFoundError:
-    print(f"❌ ERROR: CSV file not found at path: {path}")
-    print("Check if you are running the script from the main project directory.")
-    exit()
+DATA_PATH = '../colab_train_models/Data/1_training_data_high_quality.csv'
+# Directory to save models
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'colab_train_models', 'models')
+# tokenized corpora (one file per CSV / chunk), safe to delete
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
 
 # Sentiment mapping
 sentiment_mapping = {
@@ -29,23 +42,123 @@ sentiment_mapping = {
     'neutral': 1,
     'positive': 2
 }
-df['Sentiment'] = df['Sentiment'].map(sentiment_mapping)
-df.dropna(subset=['Sentiment', 'Comment'], inplace=True)  # Dropping NaN values
+CLASSES = np.array([0, 1, 2])
+
+VECTORIZER_PARAMS = dict(ngram_range=(1, 2), min_df=3, max_df=0.9)
+# out-of-core: every TEST_EVERY-th row is held out for the report (20%)
+TEST_EVERY = 5
+# out-of-core: n-gram document frequencies kept in memory; above it, n-grams seen once so far are dropped.
+# That can leave rare n-grams out of the vocabulary, so the kept ones are counted again (exact idf).
+MAX_COUNTED_TERMS = 2_000_000
+
+
+# ----------------------------------------------------------------------
+# 1. LOADING DATA AND TOKENIZATION (cached on disk)
+# ----------------------------------------------------------------------
+
+def load_data(path):
+    try:
+        df = pd.read_csv(path)
+    except FileNotFoundError:
+        print(f"❌ ERROR: CSV file not found at path: {path}")
+        print("Check if you are running the script from the main project directory.")
+        exit()
+    return prepare_frame(df)
+
+
+def prepare_frame(df):
+    df['Sentiment'] = df['Sentiment'].map(sentiment_mapping)
+    df.dropna(subset=['Sentiment', 'Comment'], inplace=True)  # Dropping NaN values
+    df['Sentiment'] = df['Sentiment'].astype(int)
+    return df
+
+
+def cache_path(path, *parts):
+    # the key changes whenever the CSV file or the lemmatization mode changes
+    st = os.stat(path)
+    key = hashlib.sha1(
+        f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}:{preprocessing_text.LEMMA_MODE}:{parts}".encode()
+    ).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, f"tokens_{key}.joblib")
+
+
+def tokenize_cached(comments, cache_file, n_process, use_cache=True):
+    """Token tuples of the comments, read from cache_file when it exists (spaCy runs once per corpus)."""
+    if use_cache and os.path.exists(cache_file):
+        return joblib.load(cache_file)
+    tokens = list(tokenize_batch(comments, n_process=n_process))
+    if use_cache:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        joblib.dump(tokens, cache_file)
+    return tokens
+
+
+# ----------------------------------------------------------------------
+# 2. MODELS
+# ----------------------------------------------------------------------
+
+def build_models(svm='svc', class_weight='balanced', incremental=False):
+    """
+    {name: (classifier, file name)}. svm: 'svc' (SVC, linear kernel), 'linear' (LinearSVC, scales
+    linearly with the corpus) or 'sgd' (SGDClassifier, hinge loss). incremental: models with partial_fit.
+    """
+    if incremental:
+        return {
+            'logistic_regression': (SGDClassifier(loss='log_loss', class_weight=class_weight, random_state=42),
+                                    'logistic_regression_model.joblib'),
+            'naive_bayes': (ComplementNB(), 'naive_model.joblib'),
+            'svc': (SGDClassifier(loss='hinge', class_weight=class_weight, random_state=42), 'svc_model.joblib'),
+        }
+
+    svms = {
+        'svc': lambda: SVC(kernel='linear', class_weight=class_weight, random_state=42),
+        'linear': lambda: LinearSVC(class_weight=class_weight, random_state=42),
+        'sgd': lambda: SGDClassifier(loss='hinge', class_weight=class_weight, random_state=42),
+    }
+    return {
+        'logistic_regression': (LogisticRegression(class_weight=class_weight, random_state=42, max_iter=1000),
+                                'logistic_regression_model.joblib'),
+        'naive_bayes': (ComplementNB(), 'naive_model.joblib'),
+        'svc': (svms[svm](), 'svc_model.joblib'),
+    }
+
+
+def train_model(model_name, classifier, model_path, X_train, y_train, X_test, y_test):
+    # runs in a joblib worker process
+    start = time.time()
+    try:
+        classifier.fit(X_train, y_train)
+        y_pred = classifier.predict(X_test)
+
+        # Saving the model (uncompressed, loaded with mmap_mode='r')
+        dump_model(classifier, model_path)
+        return model_name, model_path, classification_report(y_test, y_pred), round(time.time() - start, 1), None
+    except Exception as e:
+        return model_name, None, None, round(time.time() - start, 1), e
+
 
-print(f"--- Data preparation complete. Number of samples: {len(df)} ---")
-print("--- Starting training and vectorization... ---")
+def print_result(model_name, model_path, report, seconds, error):
+    if error is not None:
+        print(f"❌ ERROR during training/saving model {model_name}: {error}")
+        return
+    took = f" ({seconds}s)" if seconds is not None else ""
+    print(f"\n✅ Saved model '{model_name}' to: {model_path}{took}")
+    print(f"Report on the test set:\n{report}")
 
 
 # ----------------------------------------------------------------------
-# 2. VECTORIZATION AND SPLITTING FUNCTION
+# 3. IN-MEMORY TRAINING
 # ----------------------------------------------------------------------
 
-def split_and_vectorize_text(X, y, test_size=0.2):
+def split_and_vectorize_text(tokens, y, test_size=0.2):
+    # the vectorizer only splits the joined lemmas, spaCy already ran (once, cached)
+    X = pd.Series([" ".join(t) for t in tokens], index=y.index)
+
     vectorizer = TfidfVectorizer(
-        tokenizer=text_tokenizer,
-        ngram_range=(1, 2),
-        min_df=3,
-        max_df=0.9
+        tokenizer=split_tokens,
+        token_pattern=None,
+        lowercase=False,
+        **VECTORIZER_PARAMS
     )
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
@@ -58,58 +171,173 @@ def split_and_vectorize_text(X, y, test_size=0.2):
     return X_train_transform, X_test_transform, y_train, y_test, vectorizer
 
 
-# ----------------------------------------------------------------------
-# 3. VECTORIZATION and SERIALIZATION SETTINGS
-# ----------------------------------------------------------------------
+def train_in_memory(args):
+    df = load_data(args.data)
+    print(f"--- Data preparation complete. Number of samples: {len(df)} ---")
 
-X_train, X_test, y_train, y_test, fitted_vectorizer = split_and_vectorize_text(df['Comment'], df['Sentiment'], test_size=0.2)
+    start = time.time()
+    tokens = tokenize_cached(df['Comment'].astype(str).tolist(), cache_path(args.data), args.n_process,
+                             use_cache=not args.no_cache)
+    print(f"--- Tokenized in {round(time.time() - start, 1)}s ---")
 
-# Directory to save models
-MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'colab_train_models', 'models')
+    X_train, X_test, y_train, y_test, fitted_vectorizer = split_and_vectorize_text(tokens, df['Sentiment'])
 
-# Ensuring the folder exists
-if not os.path.exists(MODEL_DIR):
-    os.makedirs(MODEL_DIR)
-    print(f"Created target folder: {MODEL_DIR}")
+    # compact, memory-mappable format (data_processing.artifacts): sorted vocabulary + idf_ arrays
+    vectorizer_path = save_vectorizer(fitted_vectorizer, os.path.join(MODEL_DIR, 'tfidf_vectorizer'))
+    print(f"\n✅ Saved TF-IDF Vectorizer to: {vectorizer_path}")
 
-# ----------------------------------------------------------------------
-# 4. TRAINING AND SAVING THE VECTORIZER
-# ----------------------------------------------------------------------
+    print("\n--- Starting training of classification models ---")
+    models = build_models(args.svm)
+    # mmap_mode='c': the matrices are shared with the workers, copy-on-write (libsvm writes to its input)
+    results = Parallel(n_jobs=min(args.n_jobs, len(models)), mmap_mode='c')(
+        delayed(train_model)(name, classifier, os.path.join(MODEL_DIR, file_name), X_train, y_train, X_test, y_test)
+        for name, (classifier, file_name) in models.items()
+    )
+    for result in results:
+        print_result(*result)
 
-vectorizer_path = os.path.join(MODEL_DIR, 'tfidf_vectorizer.joblib')
-joblib.dump(fitted_vectorizer, vectorizer_path)
-print(f"\n✅ Saved TF-IDF Vectorizer to: {vectorizer_path}")
 
 # ----------------------------------------------------------------------
-# 5. TRAINING AND SAVING CLASSIFICATION MODELS
+# 4. OUT-OF-CORE TRAINING (chunked CSV, partial_fit)
 # ----------------------------------------------------------------------
 
-MODELS_TO_TRAIN = {
-    'logistic_regression': (LogisticRegression(class_weight='balanced', random_state=42, max_iter=1000), 'logistic_regression_model.joblib'),
-    'naive_bayes': (ComplementNB(), 'naive_model.joblib'),
-    'svc': (SVC(kernel='linear', class_weight='balanced', random_state=42), 'svc_model.joblib')
-}
+def iter_token_chunks(args):
+    """(tokens, labels, is_test) per CSV chunk; chunk tokens are cached, so later passes skip spaCy."""
+    for i, chunk in enumerate(pd.read_csv(args.data, chunksize=args.chunksize)):
+        chunk = prepare_frame(chunk)
+        tokens = tokenize_cached(chunk['Comment'].astype(str).tolist(), cache_path(args.data, args.chunksize, i),
+                                 args.n_process, use_cache=True)
+        yield tokens, chunk['Sentiment'].to_numpy(), chunk.index.to_numpy() % TEST_EVERY == 0
 
-print("\n--- Starting training of classification models ---")
 
-for model_name, (classifier, file_name) in MODELS_TO_TRAIN.items():
-    print(f"\n⏳ Training model: {model_name}...")
+def ngram_terms(tokens, ngram_range):
+    min_n, max_n = ngram_range
+    tokens = list(tokens)
+    return {" ".join(tokens[i:i + n]) for n in range(min_n, max_n + 1) for i in range(len(tokens) - n + 1)}
 
-    try:
-        classifier.fit(X_train, y_train)
-        y_pred = classifier.predict(X_test)
 
-        # Saving the model
-        model_path = os.path.join(MODEL_DIR, file_name)
-        joblib.dump(classifier, model_path)
+def count_documents(args, terms=None):
+    """
+    Document frequencies of the n-grams of the training rows, number of training rows and label counts.
+    terms: count only these n-grams (exact recount), otherwise all of them with MAX_COUNTED_TERMS pruning.
+    Returns (document_frequency, n_docs, label_counts, pruned).
+    """
+    document_frequency = Counter()
+    label_counts = Counter()
+    n_docs = 0
+    pruned = False
+    for tokens, labels, is_test in iter_token_chunks(args):
+        for doc, test in zip(tokens, is_test):
+            if not test:
+                doc_terms = ngram_terms(doc, VECTORIZER_PARAMS['ngram_range'])
+                document_frequency.update(doc_terms if terms is None else doc_terms & terms)
+        label_counts.update(labels[~is_test].tolist())
+        n_docs += int((~is_test).sum())
+        if terms is None and len(document_frequency) > MAX_COUNTED_TERMS:
+            # n-grams seen in one document so far are unlikely to reach min_df
+            document_frequency = Counter({t: c for t, c in document_frequency.items() if c > 1})
+            pruned = True
+        print(f"Pass {1 if terms is None else 2}: {n_docs} training comments, "
+              f"{len(document_frequency)} n-grams counted")
+    return document_frequency, n_docs, label_counts, pruned
 
-        print(f"✅ Saved model '{model_name}' to: {model_path}")
-        print(f"Report on the test set:\n{classification_report(y_test, y_pred)}")
 
-    except Exception as e:
-        print(f"❌ ERROR during training/saving model {model_name}: {e}")
+def fit_vocabulary(args):
+    """
+    First pass: document frequencies of the n-grams of the training rows -> vocabulary and idf_
+    (same min_df / max_df / smooth idf as TfidfVectorizer). Memory is bounded by MAX_COUNTED_TERMS.
+    After pruning, the remaining n-grams are counted again in a second pass: their frequencies (and idf) are
+    exact, but n-grams dropped while pruning can be missing from the vocabulary.
+    """
+    document_frequency, n_docs, label_counts, pruned = count_documents(args)
+    if pruned:
+        print(f"⚠️ More than {MAX_COUNTED_TERMS} n-grams: rare ones were dropped, recounting the others")
+        document_frequency, _, _, _ = count_documents(args, terms=set(document_frequency))
+
+    max_count = VECTORIZER_PARAMS['max_df'] * n_docs
+    terms = sorted(t for t, c in document_frequency.items() if VECTORIZER_PARAMS['min_df'] <= c <= max_count)
+    df_values = np.array([document_frequency[t] for t in terms], dtype=np.float64)
+    idf = np.log((1 + n_docs) / (1 + df_values)) + 1
+    vocabulary = {t: i for i, t in enumerate(terms)}
+    # balanced class weights (partial_fit does not accept class_weight='balanced')
+    class_weight = {c: n_docs / (len(CLASSES) * label_counts[c]) for c in CLASSES if label_counts[c]}
+    return vocabulary, idf, class_weight
+
+
+def train_out_of_core(args):
+    vocabulary, idf, class_weight = fit_vocabulary(args)
+    params = {'ngram_range': VECTORIZER_PARAMS['ngram_range'], 'lowercase': False, 'norm': 'l2', 'use_idf': True,
+              'sublinear_tf': False}
+    vectorizer_path = write_vectorizer(vocabulary, idf, params, os.path.join(MODEL_DIR, 'tfidf_vectorizer'))
+    vectorizer = load_vectorizer(vectorizer_path)
+    print(f"\n✅ Saved TF-IDF Vectorizer to: {vectorizer_path} ({len(vocabulary)} terms)")
+
+    models = build_models(class_weight=class_weight, incremental=True)
+    print("\n--- Starting incremental training of classification models ---")
+    for epoch in range(args.epochs):
+        for tokens, labels, is_test in iter_token_chunks(args):
+            if is_test.all():
+                continue  # e.g. a short last chunk
+            X = vectorizer.transform_tokens(tokens)[~is_test]
+            y = labels[~is_test]
+            # the models are independent, each one is updated in its own thread
+            Parallel(n_jobs=min(args.n_jobs, len(models)), prefer='threads')(
+                delayed(classifier.partial_fit)(X, y, classes=CLASSES) for classifier, _ in models.values()
+            )
+        print(f"Epoch {epoch + 1}/{args.epochs} done")
+
+    # held-out rows, predicted chunk by chunk
+    y_test = []
+    y_pred = {name: [] for name in models}
+    for tokens, labels, is_test in iter_token_chunks(args):
+        if not is_test.any():
+            continue
+        X = vectorizer.transform_tokens(tokens)[is_test]
+        y_test.append(labels[is_test])
+        for name, (classifier, _) in models.items():
+            y_pred[name].append(classifier.predict(X))
+    y_test = np.concatenate(y_test)
+
+    for name, (classifier, file_name) in models.items():
+        model_path = dump_model(classifier, os.path.join(MODEL_DIR, file_name))
+        print_result(name, model_path, classification_report(y_test, np.concatenate(y_pred[name])), None, None)
+
+
+# ----------------------------------------------------------------------
+# 5. MAIN
+# ----------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Trains the TF-IDF vectorizer and the sentiment classifiers.")
+    parser.add_argument('--data', default=DATA_PATH, help="CSV file with Comment and Sentiment columns")
+    parser.add_argument('--n-process', type=int, default=N_PROCESS, help="spaCy processes used for tokenization")
+    parser.add_argument('--n-jobs', type=int, default=3, help="models trained at the same time")
+    parser.add_argument('--svm', choices=['svc', 'linear', 'sgd'], default='svc',
+                        help="SVM implementation: SVC (linear kernel), LinearSVC or SGDClassifier")
+    parser.add_argument('--no-cache', action='store_true', help="do not read/write the tokenized corpus cache")
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="read the CSV in chunks and train with partial_fit (bounded memory)")
+    parser.add_argument('--chunksize', type=int, default=100000, help="CSV rows per chunk (--out-of-core)")
+    parser.add_argument('--epochs', type=int, default=1, help="passes over the data (--out-of-core)")
+    args = parser.parse_args()
+
+    # Ensuring the folder exists
+    if not os.path.exists(MODEL_DIR):
+        os.makedirs(MODEL_DIR)
+        print(f"Created target folder: {MODEL_DIR}")
+
+    print("--- Starting training and vectorization... ---")
+    start = time.time()
+    if args.out_of_core:
+        train_out_of_core(args)
+    else:
+        train_in_memory(args)
+
+    print("\n=======================================================")
+    print(f"✅ Training and serialization process COMPLETED SUCCESSFULLY ({round(time.time() - start, 1)}s).")
+    print("You can now run the Django server: python manage.py runserver")
+    print("=======================================================")
+
 
-print("\n=======================================================")
-print("✅ Training and serialization process COMPLETED SUCCESSFULLY.")
-print("You can now run the Django server: python manage.py runserver")
-print("=======================================================")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# data_processing/aggregation.py
+# Statistics of an analysis computed on NumPy arrays of labels (0 negative, 1 neutral, 2 positive),
+# confidences (probability of the predicted label) and comment publish times.
+#
+# Everything is a bincount over the arrays, so the report is recomputed from the stored comments
+# after every (incremental) run instead of being patched. Missing confidences (NaN) and publish times
+# (NaT) are left out of the statistics that need them. agreement() compares the labels several models gave
+# to the same comments (compare mode, data_processing.compare).
+
+import numpy as np
+from django.conf import settings
+
+IDX_TO_LABEL = {0: 'negative', 1: 'neutral', 2: 'positive'}
+N_CLASSES = len(IDX_TO_LABEL)
+
+CONFIDENCE_BINS = getattr(settings, 'ANALYSIS_CONFIDENCE_BINS', 10)
+LOW_CONFIDENCE = getattr(settings, 'ANALYSIS_LOW_CONFIDENCE', 0.6)
+
+# time series step: the finest unit that keeps the series at most this many points long
+TIME_SERIES_MAX_POINTS = 60
+TIME_UNITS = (('hour', 'h'), ('day', 'D'), ('week', 'W'), ('month', 'M'), ('year', 'Y'))
+
+
+def class_counts(labels):
+    """Comments per class as an int array of length N_CLASSES."""
+    return np.bincount(np.asarray(labels, dtype=np.int64), minlength=N_CLASSES)[:N_CLASSES]
+
+
+def counts_dict(counts):
+    return {k: int(n) for k, n in enumerate(counts)}
+
+
+def summarize_counts(counts):
+    """Shares, average score (-1..1) and dominant class of per-class counts (array or {class: count} dict)."""
+    if isinstance(counts, dict):
+        counts = [counts.get(k, 0) for k in range(N_CLASSES)]
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    shares = np.round(counts / (total or 1) * 100.0, 1)
+    sentiment_share = {IDX_TO_LABEL[k]: float(shares[k]) for k in range(N_CLASSES)}
+
+    if total > 0:
+        avg_score = round(float(np.dot(np.arange(N_CLASSES), counts) / total) - 1, 2)
+        avg_percent = round(((avg_score + 1) / 2) * 100, 1)
+        dominant_class = int(counts.argmax())
+        dominant_sentiment = IDX_TO_LABEL[dominant_class]
+        dominant_percent = float(shares[dominant_class])
+    else:
+        avg_score = avg_percent = 0
+        dominant_sentiment = "N/A"
+        dominant_percent = 0
+
+    return {
+        'sentiment_share': sentiment_share,
+        'avg_sentiment_score': avg_score, 'avg_sentiment_percent': avg_percent,
+        'dominant_sentiment': dominant_sentiment, 'dominant_sentiment_percent': dominant_percent,
+    }
+
+
+def confidence_stats(labels, confidences, bins=CONFIDENCE_BINS, low=LOW_CONFIDENCE):
+    """Per-class confidence histogram over [0, 1], per-class mean confidence and the count below `low`."""
+    labels = np.asarray(labels, dtype=np.int64)
+    confidences = np.asarray(confidences, dtype=np.float64)
+    known = np.isfinite(confidences)
+    labels, confidences = labels[known], confidences[known]
+
+    # bin index per comment, confidence 1.0 goes to the last bin
+    bin_idx = np.minimum((confidences * bins).astype(np.int64), bins - 1).clip(min=0)
+    histogram = np.bincount(labels * bins + bin_idx, minlength=N_CLASSES * bins).reshape(N_CLASSES, bins)
+    per_class = np.bincount(labels, minlength=N_CLASSES)
+    sums = np.bincount(labels, weights=confidences, minlength=N_CLASSES)
+    means = np.divide(sums, per_class, out=np.full(N_CLASSES, np.nan), where=per_class > 0)
+
+    return {
+        'confidence_bins': np.round(np.linspace(0, 1, bins + 1), 3).tolist(),
+        'confidence_histogram': {IDX_TO_LABEL[k]: histogram[k].tolist() for k in range(N_CLASSES)},
+        'mean_confidence': {IDX_TO_LABEL[k]: (round(float(means[k]), 3) if per_class[k] else None)
+                            for k in range(N_CLASSES)},
+        'overall_confidence': round(float(confidences.mean()), 3) if len(confidences) else None,
+        'low_confidence_threshold': low,
+        'low_confidence_count': int((confidences < low).sum()),
+        'scored_count': int(len(confidences)),
+    }
+
+
+def time_series(labels, published_at, max_points=TIME_SERIES_MAX_POINTS):
+    """
+    Comments per class and mean score per time step, binned by publish time (datetime64 array).
+    The step (hour, day, week, month or year) is the finest one giving at most max_points steps.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    published_at = np.asarray(published_at, dtype='datetime64[s]')
+    known = ~np.isnat(published_at)
+    labels, published_at = labels[known], published_at[known]
+    if not len(labels):
+        return {'unit': None, 'periods': [], 'counts': {name: [] for name in IDX_TO_LABEL.values()}, 'mean_score': []}
+
+    for unit, code in TIME_UNITS:
+        periods = published_at.astype(f'datetime64[{code}]')
+        first, last = periods.min(), periods.max()
+        n_points = int((last - first).astype(np.int64)) + 1
+        if n_points <= max_points:
+            break
+
+    step = (periods - first).astype(np.int64)
+    counts = np.bincount(step * N_CLASSES + labels, minlength=n_points * N_CLASSES).reshape(n_points, N_CLASSES)
+    totals = counts.sum(axis=1)
+    scores = np.divide(counts @ np.arange(N_CLASSES), totals, out=np.full(n_points, np.nan), where=totals > 0) - 1
+
+    starts = (first + np.arange(n_points)).astype('datetime64[m]' if code == 'h' else 'datetime64[D]')
+    return {
+        'unit': unit,
+        'periods': np.datetime_as_string(starts).tolist(),
+        'counts': {IDX_TO_LABEL[k]: counts[:, k].tolist() for k in range(N_CLASSES)},
+        'mean_score': [round(float(s), 3) if totals[i] else None for i, s in enumerate(scores)],
+    }
+
+
+def aggregate(labels, confidences=None, published_at=None):
+    """Report statistics of one analysis: counts, summary, confidence statistics and the time series."""
+    labels = np.asarray(labels, dtype=np.int64)
+    counts = class_counts(labels)
+    report = {
+        'comment_count': int(counts.sum()),
+        'sentiment_counts': counts_dict(counts),
+        **summarize_counts(counts),
+    }
+    if confidences is not None:
+        report.update(confidence_stats(labels, confidences))
+    if published_at is not None:
+        report['time_series'] = time_series(labels, published_at)
+    return report
+
+
+def parse_published(values):
+    """datetime64[s] array of ISO 8601 UTC strings ('...Z' from the YouTube API), NaT for missing ones."""
+    return np.array([v[:19] if v else 'NaT' for v in values], dtype='datetime64[s]')
+
+
+def agreement(labels_by_model):
+    """
+    Pairwise agreement of models on the same comments; labels_by_model is {model: labels array}.
+    'agreement' is the share of comments with the same label, 'kappa' Cohen's kappa (agreement corrected
+    for chance, from both models' label distributions), 'all_agree' the share on which every model agrees.
+    """
+    names = list(labels_by_model)
+    labels = np.vstack([np.asarray(labels_by_model[name], dtype=np.int64) for name in names])
+    n = labels.shape[1]
+    if not n:
+        empty = [[None] * len(names) for _ in names]
+        return {'models': names, 'agreement': empty, 'kappa': empty, 'all_agree': None}
+
+    observed = (labels[:, None, :] == labels[None, :, :]).mean(axis=2)
+    shares = np.stack([class_counts(row) / n for row in labels])
+    expected = shares @ shares.T
+    kappa = np.divide(observed - expected, 1 - expected, out=np.ones_like(observed), where=expected < 1)
+    return {
+        'models': names,
+        'agreement': np.round(observed, 4).tolist(),
+        'kappa': np.round(kappa, 4).tolist(),
+        'all_agree': round(float((labels == labels[0]).all(axis=0).mean()), 4),
+    }
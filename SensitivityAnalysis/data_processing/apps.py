@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+def _recover_stale_jobs(**kwargs):
+    # once per process, before the first request is handled (no database access during app loading)
+    request_started.disconnect(_recover_stale_jobs, dispatch_uid='recover_stale_jobs')
+    from data_processing.jobs import recover_stale_jobs
+    recover_stale_jobs()
 
 
 class DataProcessingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'data_processing'
+
+    def ready(self):
+        from data_processing.model_registry import MODEL_CATALOG, WARMUP_MODELS
+        if WARMUP_MODELS:
+            # load the listed models in the background, so the first analysis does not wait for them
+            MODEL_CATALOG.warmup(WARMUP_MODELS)
+
+        from data_processing.jobs import RECOVER_STALE_JOBS
+        if RECOVER_STALE_JOBS:
+            request_started.connect(_recover_stale_jobs, dispatch_uid='recover_stale_jobs')
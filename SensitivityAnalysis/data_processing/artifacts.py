@@ -0,0 +1,280 @@
+# data_processing/artifacts.py
+# On-disk format of the model artifacts, loaded memory-mapped and read-only.
+#
+# Large numeric arrays are not copied into every worker process: they are mapped from the files,
+# so N gunicorn workers share one physical copy through the page cache.
+# - sklearn classifiers: uncompressed joblib files loaded with mmap_mode='r' (coef_, support vectors, ...)
+# - TF-IDF vectorizer: a directory with the vocabulary as a sorted term array (terms.npy) and the column
+#   of each term (columns.npy) instead of a Python dict, idf_ (idf.npy) and the analyzer params (params.json)
+# - RoBERTa: weights in model.safetensors, mapped straight into the model's tensors
+#
+# No Django imports here, the module is also used by the training script and by worker subprocesses.
+
+import json
+import mmap
+import os
+import struct
+import warnings
+from itertools import repeat
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+VECTORIZER_PARAMS = ('ngram_range', 'lowercase', 'norm', 'use_idf', 'sublinear_tf')
+
+
+# --- sklearn classifiers ---
+
+def dump_model(model, path):
+    # compress=0: compressed joblib files cannot be memory-mapped
+    joblib.dump(model, path, compress=0)
+    return path
+
+
+def load_model(path):
+    return joblib.load(path, mmap_mode='r')
+
+
+def is_compressed(path):
+    with open(path, 'rb') as f:
+        return f.read(1) != b'\x80'  # uncompressed joblib files start with a pickle protocol marker
+
+
+# --- TF-IDF vectorizer ---
+
+class CompactVocabulary:
+    """Term -> column lookup over a sorted term array (binary search), shareable between processes."""
+
+    def __init__(self, terms, columns):
+        self.terms = terms
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.terms)
+
+    def lookup(self, terms):
+        """Column of every term, -1 for terms missing from the vocabulary."""
+        if len(terms) == 0 or len(self.terms) == 0:
+            return np.full(len(terms), -1, dtype=np.int64)
+        query = np.array([t.encode('utf-8') for t in terms], dtype=bytes)
+        positions = np.searchsorted(self.terms, query).clip(max=len(self.terms) - 1)
+        found = self.terms[positions] == query
+        return np.where(found, self.columns[positions], -1).astype(np.int64)
+
+
+class CompactTfidfVectorizer:
+    """
+    TF-IDF transform equivalent to the fitted TfidfVectorizer of train_and_serialize.py
+    (documents are space-joined lemmas, split on whitespace), built on a CompactVocabulary.
+    """
+
+    def __init__(self, vocabulary, idf, ngram_range=(1, 1), lowercase=True, norm='l2', use_idf=True,
+                 sublinear_tf=False):
+        self.vocabulary = vocabulary
+        self.idf_ = idf
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.norm = norm
+        self.use_idf = use_idf
+        self.sublinear_tf = sublinear_tf
+        self._index = None
+
+    @property
+    def n_features(self):
+        return len(self.idf_)
+
+    def ngrams(self, tokens):
+        if self.lowercase:
+            tokens = " ".join(tokens).lower().split()
+        min_n, max_n = self.ngram_range
+        terms = []
+        for n in range(min_n, max_n + 1):
+            terms.extend(tokens if n == 1 else map(" ".join, zip(*[tokens[i:] for i in range(n)])))
+        return terms
+
+    def transform(self, documents):
+        """TF-IDF matrix of space-joined documents."""
+        return self.transform_tokens(document.split() for document in documents)
+
+    def transform_tokens(self, token_lists):
+        """
+        TF-IDF matrix built directly from token lists (e.g. tokenize_batch output), no join/split and no
+        second tokenizer pass. Unigrams and bigrams are matched on word ids with numpy over the whole batch.
+        """
+        if self.ngram_range[1] > 2:
+            return self._transform_terms(token_lists)
+        word_ids, unigram_columns, bigram_keys, bigram_columns = self._word_index()
+
+        tokens = []
+        lengths = []
+        for doc in token_lists:
+            doc = " ".join(doc).lower().split() if self.lowercase else list(doc)
+            tokens.extend(doc)
+            lengths.append(len(doc))
+        ids = np.fromiter(map(word_ids.get, tokens, repeat(-1)), dtype=np.int64, count=len(tokens))
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+
+        all_rows = []
+        all_columns = []
+        if self.ngram_range[0] <= 1:
+            columns = np.where(ids >= 0, unigram_columns[ids.clip(min=0)], -1) if len(ids) else ids
+            all_rows.append(rows[columns >= 0])
+            all_columns.append(columns[columns >= 0])
+        if self.ngram_range[1] >= 2 and len(bigram_keys) and len(ids) > 1:
+            # bigram = two known words next to each other in the same document
+            pairs = (rows[:-1] == rows[1:]) & (ids[:-1] >= 0) & (ids[1:] >= 0)
+            keys = ids[:-1][pairs] * len(unigram_columns) + ids[1:][pairs]
+            positions = np.searchsorted(bigram_keys, keys).clip(max=len(bigram_keys) - 1)
+            found = bigram_keys[positions] == keys
+            all_rows.append(rows[:-1][pairs][found])
+            all_columns.append(bigram_columns[positions[found]])
+
+        return self._matrix(np.concatenate(all_rows) if all_rows else rows[:0],
+                            np.concatenate(all_columns) if all_columns else rows[:0], len(lengths))
+
+    def _word_index(self):
+        """
+        Word -> id dict over the words of the vocabulary terms, the unigram column of every word (-1 if the
+        word is only part of bigrams) and the sorted bigram keys (left id * n_words + right id) with their
+        columns. Derived once per process from the shared term arrays; it is small (words, not n-grams).
+        """
+        if self._index is None:
+            terms = [t.decode('utf-8').split(' ') for t in self.vocabulary.terms]
+            words = sorted({w for parts in terms for w in parts})
+            word_ids = {w: i for i, w in enumerate(words)}
+            unigram_columns = np.full(len(words), -1, dtype=np.int64)
+            keys = []
+            key_columns = []
+            for parts, column in zip(terms, np.asarray(self.vocabulary.columns)):
+                if len(parts) == 1:
+                    unigram_columns[word_ids[parts[0]]] = column
+                elif len(parts) == 2:
+                    keys.append(word_ids[parts[0]] * len(words) + word_ids[parts[1]])
+                    key_columns.append(column)
+            keys = np.array(keys, dtype=np.int64)
+            order = np.argsort(keys)
+            self._index = (word_ids, unigram_columns, keys[order], np.array(key_columns, dtype=np.int64)[order])
+        return self._index
+
+    def _transform_terms(self, token_lists):
+        # any n-gram range: n-gram strings looked up in the vocabulary (each distinct one once)
+        terms = []
+        counts = []
+        for tokens in token_lists:
+            grams = self.ngrams(tokens if isinstance(tokens, list) else list(tokens))
+            terms.extend(grams)
+            counts.append(len(grams))
+
+        distinct = dict.fromkeys(terms)
+        for term, column in zip(distinct, self.vocabulary.lookup(list(distinct))):
+            distinct[term] = column
+        columns = np.array(list(map(distinct.__getitem__, terms)), dtype=np.int64)
+        rows = np.repeat(np.arange(len(counts)), counts)
+        known = columns >= 0
+        return self._matrix(rows[known], columns[known], len(counts))
+
+    def _matrix(self, rows, columns, n_docs):
+        # duplicate (row, col) pairs are summed into term counts
+        X = sp.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(n_docs, self.n_features))
+        X.sum_duplicates()
+        return self._weight(X)
+
+    def _weight(self, X):
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.use_idf:
+            X.data *= self.idf_[X.indices]
+        if self.norm:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+
+def save_vectorizer(vectorizer, directory):
+    """Writes a fitted TfidfVectorizer in the compact format."""
+    return write_vectorizer(vectorizer.vocabulary_, vectorizer.idf_,
+                            {name: getattr(vectorizer, name) for name in VECTORIZER_PARAMS}, directory)
+
+
+def write_vectorizer(vocabulary, idf, params, directory):
+    """Writes the compact format from a {term: column} dict, the idf_ array and VECTORIZER_PARAMS values."""
+    os.makedirs(directory, exist_ok=True)
+    terms = sorted(vocabulary)
+    # UTF-8 bytes: 1 byte per character instead of 4 for a numpy str array (same sort order)
+    np.save(os.path.join(directory, 'terms.npy'), np.array([t.encode('utf-8') for t in terms], dtype=bytes))
+    np.save(os.path.join(directory, 'columns.npy'), np.array([vocabulary[t] for t in terms], dtype=np.int32))
+    np.save(os.path.join(directory, 'idf.npy'), np.asarray(idf, dtype=np.float64))
+    with open(os.path.join(directory, 'params.json'), 'w', encoding='utf-8') as f:
+        json.dump({name: params[name] for name in VECTORIZER_PARAMS}, f, indent=2)
+    return directory
+
+
+def load_vectorizer(directory):
+    def _array(name):
+        return np.load(os.path.join(directory, name), mmap_mode='r')
+
+    with open(os.path.join(directory, 'params.json'), encoding='utf-8') as f:
+        params = json.load(f)
+    return CompactTfidfVectorizer(CompactVocabulary(_array('terms.npy'), _array('columns.npy')), _array('idf.npy'),
+                                  **params)
+
+
+# --- RoBERTa ---
+
+SAFETENSORS_FILE = 'model.safetensors'
+_SAFETENSORS_DTYPES = {'F64': 'float64', 'F32': 'float32', 'F16': 'float16', 'BF16': 'bfloat16',
+                       'I64': 'int64', 'I32': 'int32', 'I16': 'int16', 'I8': 'int8', 'U8': 'uint8', 'BOOL': 'bool'}
+
+
+def save_roberta(model, tokenizer, directory):
+    model.save_pretrained(directory, safe_serialization=True)
+    tokenizer.save_pretrained(directory)
+    return directory
+
+
+def mmap_safetensors(path):
+    """
+    Tensors of a .safetensors file as read-only views over one memory map of the file
+    (format: 8-byte header length, JSON header with dtype/shape/offsets, raw data).
+    """
+    import torch
+
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data_start = 8 + header_size
+    tensors = {}
+    with warnings.catch_warnings():
+        # the map is read-only on purpose, the weights are never written at inference
+        warnings.filterwarnings('ignore', message='The given buffer is not writable')
+        for name, info in header.items():
+            if name == '__metadata__':
+                continue
+            dtype = getattr(torch, _SAFETENSORS_DTYPES[info['dtype']])
+            start, end = info['data_offsets']
+            count = (end - start) // torch.empty((), dtype=dtype).element_size()
+            tensor = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + start)
+            tensors[name] = tensor.view(info['shape'])
+    return tensors
+
+
+def load_roberta_model(directory):
+    """Sequence classification model whose weights are mapped from model.safetensors (from_pretrained otherwise)."""
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    path = os.path.join(directory, SAFETENSORS_FILE)
+    model = None
+    if os.path.exists(path):
+        model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(directory))
+        # assign=True keeps the mapped tensors instead of copying them into the randomly initialised ones
+        result = model.load_state_dict(mmap_safetensors(path), strict=False, assign=True)
+        if result.missing_keys or result.unexpected_keys:
+            model = None  # e.g. tied weights left out of the file, let transformers resolve them
+    if model is None:
+        model = AutoModelForSequenceClassification.from_pretrained(directory)
+    model.eval()  # evaluation mode
+    return model
@@ -0,0 +1,183 @@
+# data_processing/batch.py
+# Batch analysis of many videos: a list of ids, a playlist or a channel's uploads.
+#
+# Limits and metadata of all videos are checked with one videos.list call per 50 ids, then the videos
+# run through the usual pipeline (views.analyze_video, which fetches, translates and classifies pages
+# in its own stage threads) on one shared pool of BATCH_WORKERS threads, each video capped at
+# comments_per_video comments. Used by the analyze_batch management command and the /batch/ endpoint.
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+
+from data_processing import aggregation, incremental
+from data_processing.jobs import current_job_id, running_job
+from data_processing.models import VideoAnalysis
+from youtube_integration.services import (get_videos_meta, get_playlist_video_ids, get_channel_video_ids,
+                                          comment_limit_message)
+
+BATCH_MAX_VIDEOS = getattr(settings, 'BATCH_MAX_VIDEOS', 50)
+BATCH_WORKERS = getattr(settings, 'BATCH_WORKERS', 4)
+BATCH_COMMENTS_PER_VIDEO = getattr(settings, 'BATCH_COMMENTS_PER_VIDEO', 1000)
+
+# per-video fields of the batch report (the rest of analyze_video's stats stays on the VideoAnalysis)
+VIDEO_REPORT_FIELDS = ('video_title', 'channel_title', 'published_at', 'view_count', 'comment_count',
+                       'sentiment_share', 'avg_sentiment_score', 'dominant_sentiment', 'overall_confidence',
+                       'analysis_id', 'incremental')
+
+VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|embed/|shorts/|live/|^)([\w-]{11})(?=$|[&?#/])')
+PLAYLIST_ID_RE = re.compile(r'(?:[?&]list=|^)([\w-]{12,})')
+CHANNEL_RE = re.compile(r'(?:youtube\.com/(?:channel/)?|^)(@[\w.-]+|UC[\w-]{22})')
+
+
+class BatchStopped(Exception):
+    pass
+
+
+def parse_video_ids(text):
+    """Video ids from a string of ids and/or links separated by commas or whitespace; ValueError if one is invalid."""
+    video_ids = []
+    for item in re.split(r'[\s,]+', text or ''):
+        if not item:
+            continue
+        match = VIDEO_ID_RE.search(item)
+        if not match:
+            raise ValueError(f"Not a YouTube video id or link: {item}")
+        video_ids.append(match.group(1))
+    return video_ids
+
+
+def parse_playlist(value):
+    """Playlist id from an id or a link with list=..., None for an empty value."""
+    if not value:
+        return None
+    match = PLAYLIST_ID_RE.search(value.strip())
+    if not match:
+        raise ValueError(f"Not a YouTube playlist id or link: {value}")
+    return match.group(1)
+
+
+def parse_channel(value):
+    """Channel id (UC...) or handle (@name) from an id, a handle or a channel link, None for an empty value."""
+    if not value:
+        return None
+    match = CHANNEL_RE.search(value.strip())
+    if not match:
+        raise ValueError(f"Not a YouTube channel id, handle or link: {value}")
+    return match.group(1)
+
+
+def resolve_video_ids(videos=None, playlist=None, channel=None, max_videos=BATCH_MAX_VIDEOS):
+    """Video ids of the batch: the given ids, then the playlist's and the channel's videos (deduplicated)."""
+    video_ids = list(videos or [])
+    if playlist:
+        video_ids += get_playlist_video_ids(playlist, max_videos)
+    if channel:
+        video_ids += get_channel_video_ids(channel, max_videos)
+    return list(dict.fromkeys(video_ids))[:max_videos]
+
+
+def _video_report(video_id, stats):
+    return {'video_id': video_id, 'status': 'done', **{key: stats.get(key) for key in VIDEO_REPORT_FIELDS}}
+
+
+def combined_report(analysis_ids):
+    """Statistics over the comments of all analysed videos together (same keys as a single video's)."""
+    arrays = [incremental.stored_arrays(analysis) for analysis in VideoAnalysis.objects.filter(pk__in=analysis_ids)]
+    if not arrays:
+        return aggregation.aggregate([])
+    labels, confidences, published = (np.concatenate(parts) for parts in zip(*arrays))
+    return aggregation.aggregate(labels, confidences, published)
+
+
+def run_batch(video_ids, model_name, analyze_video, comments_per_video=BATCH_COMMENTS_PER_VIDEO,
+              workers=BATCH_WORKERS, update_step=None):
+    """
+    Analyses the videos with analyze_video(video_id, model_name, update_step, max_comments, meta) on a shared
+    thread pool. Returns {'videos': per-video reports, 'combined': statistics of all comments, 'throughput'}.
+    update_step(progress, step_name) gets the overall progress; an exception raised by it (job cancelled)
+    stops the batch: queued videos are dropped and running ones stop at their next progress update.
+    """
+    start = time.time()
+    update_step = update_step or (lambda progress, step_name: None)
+    video_ids = list(dict.fromkeys(video_ids))
+
+    update_step(2, f"Checking {len(video_ids)} videos...")
+    metas = get_videos_meta(video_ids)
+    reports = {}
+    runnable = []
+    for video_id in video_ids:
+        if video_id not in metas:
+            reports[video_id] = {'video_id': video_id, 'status': 'skipped',
+                                 'error': "Video with the given ID was not found or is private."}
+            continue
+        limit_msg = comment_limit_message(int(metas[video_id][6] or 0))
+        if limit_msg:
+            reports[video_id] = {'video_id': video_id, 'status': 'skipped', 'error': limit_msg}
+            continue
+        runnable.append(video_id)
+
+    stop = threading.Event()
+    video_progress = dict.fromkeys(runnable, 0)
+    job_id = current_job_id()
+
+    def run_one(video_id):
+        def video_step(progress, step_name):
+            if stop.is_set():
+                raise BatchStopped()
+            video_progress[video_id] = progress
+
+        close_old_connections()
+        try:
+            with running_job(job_id):  # the videos' analyses belong to the batch job
+                return analyze_video(video_id, model_name, video_step, max_comments=comments_per_video,
+                                     meta=metas[video_id])
+        finally:
+            close_old_connections()
+
+    with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="batch-video") as pool:
+        futures = {pool.submit(run_one, video_id): video_id for video_id in runnable}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    video_id = futures[future]
+                    video_progress[video_id] = 100
+                    try:
+                        reports[video_id] = _video_report(video_id, future.result())
+                    except Exception as e:
+                        logging.error(f"Batch analysis of {video_id} failed: {e}")
+                        reports[video_id] = {'video_id': video_id, 'status': 'failed', 'error': str(e)}
+                finished = len(runnable) - len(pending)
+                overall = sum(video_progress.values()) / (len(runnable) or 1)
+                update_step(5 + int(overall * 0.9), f"Analysed {finished} of {len(runnable)} videos...")
+        except BaseException:
+            stop.set()
+            for future in pending:
+                future.cancel()
+            raise
+
+    update_step(97, "Combining the video reports...")
+    videos = [reports[video_id] for video_id in video_ids]
+    done_reports = [r for r in videos if r['status'] == 'done']
+    elapsed = time.time() - start
+    comments = sum(r['comment_count'] or 0 for r in done_reports)
+    return {
+        'model_used': model_name,
+        'comments_per_video': comments_per_video,
+        'videos': videos,
+        'combined': combined_report([r['analysis_id'] for r in done_reports]),
+        'throughput': {
+            'videos': len(done_reports),
+            'elapsed_seconds': round(elapsed, 2),
+            'videos_per_hour': round(len(done_reports) / elapsed * 3600, 1) if elapsed else 0.0,
+            'comments_per_second': round(comments / elapsed, 1) if elapsed else 0.0,
+        },
+    }
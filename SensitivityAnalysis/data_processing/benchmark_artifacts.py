@@ -0,0 +1,100 @@
+"""
+python manage.py shell
+from data_processing.benchmark_artifacts import benchmark_artifacts
+benchmark_artifacts(workers=4)
+
+Combined memory of N worker processes holding the same model artifact, memory-mapped vs copied
+(what joblib.load without mmap_mode did). Every worker loads the artifact and reads all of its arrays;
+the table reports the sum of the workers' PSS growth (shared pages are split between the processes
+that map them, so N workers sharing one copy add up to about one copy).
+"""
+
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+from data_processing.model_registry import MODEL_CATALOG
+
+WORKER = """
+import sys
+import joblib
+import numpy as np
+import psutil
+import scipy.sparse as sp
+import sklearn.linear_model, sklearn.naive_bayes, sklearn.svm  # imported before the baseline is taken
+from data_processing import artifacts
+
+def pss():
+    return psutil.Process().memory_full_info().pss / 2 ** 20
+
+def touch(obj):
+    values = list(vars(obj).values())
+    if isinstance(getattr(obj, 'vocabulary', None), artifacts.CompactVocabulary):
+        values += list(vars(obj.vocabulary).values())
+    for value in values:
+        if sp.issparse(value):
+            value = value.data
+        if isinstance(value, np.ndarray) and value.dtype.kind != 'O' and value.flags.c_contiguous:
+            int(np.asarray(value).view(np.uint8).sum())  # reads every page
+
+path, mode = sys.argv[1], sys.argv[2]
+before = pss()
+if path.endswith('/'):
+    obj = artifacts.load_vectorizer(path)
+    if mode == 'copy':
+        obj.idf_ = np.array(obj.idf_)
+        obj.vocabulary.terms, obj.vocabulary.columns = np.array(obj.vocabulary.terms), np.array(obj.vocabulary.columns)
+else:
+    obj = artifacts.load_model(path) if mode == 'mmap' else joblib.load(path)
+touch(obj)
+print('ready', flush=True)
+sys.stdin.readline()
+print(pss() - before, flush=True)
+sys.stdin.readline()
+"""
+
+
+def measure_workers(path, workers=4, mmap=True):
+    """PSS growth (MB) of each of `workers` processes holding the artifact at path at the same time."""
+    if os.path.isdir(path):
+        path = os.path.join(path, '')  # trailing slash marks a vectorizer directory
+    processes = [
+        subprocess.Popen([sys.executable, "-c", WORKER, path, "mmap" if mmap else "copy"], cwd=settings.BASE_DIR,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(workers)
+    ]
+    try:
+        for p in processes:
+            if p.stdout.readline().strip() != 'ready':
+                raise RuntimeError(f"Worker failed to load {path}")
+        # measured only once every worker holds the artifact
+        growth = []
+        for p in processes:
+            p.stdin.write("measure\n")
+            p.stdin.flush()
+            growth.append(float(p.stdout.readline()))
+        return growth
+    finally:
+        for p in processes:
+            p.stdin.close()
+            p.wait(timeout=30)
+
+
+def benchmark_artifacts(workers=4, names=('tfidf_vectorizer', 'logistic_regression', 'naive_bayes', 'svc')):
+    results = []
+    for name in names:
+        path = MODEL_CATALOG.path(name)
+        if not os.path.exists(path):
+            continue
+        copied = sum(measure_workers(path, workers, mmap=False))
+        mapped = sum(measure_workers(path, workers, mmap=True))
+        results.append({"artifact": name, "copy_mb": round(copied, 1), "mmap_mb": round(mapped, 1)})
+
+    print(f"\nWorkers: {workers}\n")
+
+    for r in results:
+        print(f"{r['artifact']:20} | copied: {r['copy_mb']:7} MB | memory-mapped: {r['mmap_mb']:7} MB")
+
+    return results
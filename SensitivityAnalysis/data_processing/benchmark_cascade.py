@@ -0,0 +1,68 @@
+"""
+python manage.py shell
+from data_processing.benchmark_cascade import benchmark_cascade
+benchmark_cascade(thresholds=(0.6, 0.7, 0.8, 0.9))
+
+Cascade (data_processing.cascade) vs its two models on a held-out set of labelled comments (the test split
+used by benchmark_onnx). The fast and the expert model classify every comment once; the cascade at each
+threshold takes the expert's label for the comments the fast model is unsure about, so its cost is the fast
+model's time plus the expert's time for the escalated share. Reports accuracy, agreement with full RoBERTa,
+escalated fraction and time relative to running RoBERTa on everything.
+"""
+
+import time
+
+import numpy as np
+
+from data_processing import cascade
+from data_processing.benchmark_onnx import DEFAULT_EVAL_DATA, load_held_out
+
+
+def cascade_table(labels, fast, fast_seconds, expert, expert_seconds, thresholds):
+    """Rows of the comparison from (labels, confidences) of both models on the same comments."""
+    labels = np.asarray(labels)
+    (fast_labels, fast_confidences), (expert_labels, _) = fast, expert
+    fast_labels, expert_labels = np.asarray(fast_labels), np.asarray(expert_labels)
+    n = len(labels) or 1
+
+    def row(name, predictions, escalated, seconds):
+        return {'method': name, 'accuracy': round(float((predictions == labels).mean()), 4),
+                'agreement': round(float((predictions == expert_labels).mean()), 4),
+                'escalated': round(escalated, 4), 'seconds': round(seconds, 3),
+                'relative_cost': round(seconds / expert_seconds, 3) if expert_seconds else None}
+
+    rows = [row('fast', fast_labels, 0.0, fast_seconds), row('expert', expert_labels, 1.0, expert_seconds)]
+    for threshold in thresholds:
+        uncertain = cascade.CascadeClassifier('fast', 'expert', threshold).escalate(fast_confidences)
+        predictions = fast_labels.copy()
+        predictions[uncertain] = expert_labels[uncertain]
+        share = len(uncertain) / n
+        rows.append(row(f"cascade@{threshold}", predictions, share, fast_seconds + expert_seconds * share))
+    return rows
+
+
+def format_table(rows):
+    lines = [f"{'method':14} | {'accuracy':>8} | {'vs RoBERTa':>10} | {'escalated':>9} | {'time s':>8} | {'cost':>6}"]
+    for r in rows:
+        lines.append(f"{r['method']:14} | {r['accuracy']:8} | {r['agreement']:10} | {r['escalated']:9} | "
+                     f"{r['seconds']:8} | {r['relative_cost']!s:>6}")
+    return "\n".join(lines)
+
+
+def benchmark_cascade(path=DEFAULT_EVAL_DATA, limit=1000, thresholds=(0.6, 0.7, 0.8, 0.9),
+                      fast_model=cascade.FAST_MODEL, expert_model=cascade.EXPERT_MODEL):
+    from data_processing.views import classify_texts  # the serving path, with its preprocessing and batching
+
+    texts, labels = load_held_out(path, limit)
+    print(f"Held-out set: {len(texts)} comments, {fast_model} -> {expert_model}.\n")
+
+    results = []
+    for model_name in (fast_model, expert_model):
+        classify_texts(model_name, texts[:8])  # model loading is not timed
+        start = time.perf_counter()
+        results.append(classify_texts(model_name, texts))
+        results.append(time.perf_counter() - start)
+
+    rows = cascade_table(labels, *results, thresholds)
+    print(format_table(rows))
+    return rows
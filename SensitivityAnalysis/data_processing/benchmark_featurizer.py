@@ -0,0 +1,70 @@
+"""
+python manage.py shell
+from data_processing.benchmark_featurizer import benchmark_featurizer
+benchmark_featurizer()
+
+Benchmark of the TF-IDF featurization step (tokens -> sparse matrix) on already tokenized comments:
+- "sklearn": TfidfVectorizer with the same vocabulary/idf_, fed space-joined lemmas (what run_analysis did)
+- "compact joined": CompactTfidfVectorizer.transform on the joined strings
+- "compact tokens": CompactTfidfVectorizer.transform_tokens on the token lists (used by classify_texts)
+Reports docs/sec and whether the matrices equal the sklearn one.
+"""
+
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from data_processing.benchmark_preprocessing import load_comments
+from data_processing.model_registry import MODEL_CATALOG
+from data_processing.preprocessing_text import tokenize_batch, split_tokens
+
+
+def sklearn_vectorizer(compact):
+    """TfidfVectorizer equivalent to the compact one (vocabulary dict rebuilt from the term arrays)."""
+    vocabulary = {t.decode('utf-8'): int(c) for t, c in zip(compact.vocabulary.terms, compact.vocabulary.columns)}
+    vectorizer = TfidfVectorizer(tokenizer=split_tokens, token_pattern=None, lowercase=compact.lowercase,
+                                 ngram_range=compact.ngram_range, norm=compact.norm, use_idf=compact.use_idf,
+                                 sublinear_tf=compact.sublinear_tf, vocabulary=vocabulary)
+    vectorizer.fit([""] if not vocabulary else [next(iter(vocabulary))])
+    vectorizer.idf_ = np.array(compact.idf_)
+    return vectorizer
+
+
+def benchmark_featurizer(token_lists=None, n=10000, repeat=3):
+    if token_lists is None:
+        token_lists = list(tokenize_batch(load_comments(n)))
+    joined = [" ".join(tokens) for tokens in token_lists]
+    print(f"Komentarzy: {len(token_lists)}\n")
+
+    compact = MODEL_CATALOG.load('tfidf_vectorizer')
+    reference = sklearn_vectorizer(compact)
+    methods = {
+        "sklearn": lambda: reference.transform(joined),
+        "compact joined": lambda: compact.transform(joined),
+        "compact tokens": lambda: compact.transform_tokens(token_lists),
+    }
+
+    expected = None
+    results = []
+    for name, run in methods.items():
+        times = []
+        for _ in range(repeat):
+            start = time.time()
+            X = run()
+            times.append(time.time() - start)
+        if expected is None:
+            expected = X
+        elapsed = min(times)
+        results.append({"method": name, "time": round(elapsed, 3), "docs_per_sec": round(len(joined) / elapsed, 1),
+                        "same_output": abs(X - expected).max() < 1e-12 if X.nnz or expected.nnz else True})
+
+    print("\n")
+
+    for r in results:
+        print(
+            f"{r['method']:16} | time: {r['time']:8}s | "
+            f"docs/sec: {r['docs_per_sec']:10} | same output: {r['same_output']}"
+        )
+
+    return results
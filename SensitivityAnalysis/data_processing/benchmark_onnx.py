@@ -0,0 +1,81 @@
+"""
+python manage.py shell
+from data_processing.benchmark_onnx import benchmark_onnx
+benchmark_onnx()
+
+RoBERTa backends on a held-out set of labelled comments: PyTorch fp32 (the reference), ONNX fp32 and
+ONNX int8 (data_processing.onnx_inference). Reports accuracy, agreement with the reference predictions,
+latency per batch (p50/p95 in ms) and throughput (comments/sec). The export_roberta_onnx command runs the
+same comparison as its accuracy regression check.
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+
+from data_processing.model_registry import MODEL_CATALOG, MODEL_DIR
+from data_processing.roberta_inference import predict_roberta
+
+DEFAULT_EVAL_DATA = os.path.join(os.path.dirname(MODEL_DIR), 'Data', 'YoutubeCommentsDataSet.csv')
+SENTIMENT_MAPPING = {'negative': 0, 'neutral': 1, 'positive': 2}
+BACKENDS = (('pytorch fp32', 'roberta'), ('onnx fp32', 'roberta_onnx'), ('onnx int8', 'roberta_int8'))
+
+
+def load_held_out(path=DEFAULT_EVAL_DATA, limit=1000, test_size=0.2):
+    """Comments and labels of the test split of a Comment,Sentiment CSV (same split as the training scripts)."""
+    df = pd.read_csv(path)
+    df['Sentiment'] = df['Sentiment'].map(SENTIMENT_MAPPING)
+    df = df.dropna(subset=['Sentiment', 'Comment'])
+    _, X_test, _, y_test = train_test_split(df['Comment'].astype(str), df['Sentiment'].astype(int),
+                                            test_size=test_size, random_state=42)
+    return X_test.tolist()[:limit], y_test.to_numpy()[:limit]
+
+
+def evaluate_backend(name, model, tokenizer, texts, labels, batch_size=32, reference=None):
+    batch_ends = []
+    start = time.perf_counter()
+    predictions, _ = predict_roberta(texts, tokenizer, model, batch_size=batch_size,
+                                     progress_callback=lambda done, total: batch_ends.append(time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    latencies = np.diff([start] + batch_ends) * 1000
+
+    return {
+        'backend': name,
+        'predictions': predictions,
+        'accuracy': round(float((predictions == labels).mean()), 4) if len(labels) else 0.0,
+        'agreement': round(float((predictions == reference).mean()), 4) if reference is not None else 1.0,
+        'p50_ms': round(float(np.percentile(latencies, 50)), 1) if len(latencies) else 0.0,
+        'p95_ms': round(float(np.percentile(latencies, 95)), 1) if len(latencies) else 0.0,
+        'comments_per_sec': round(len(texts) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare_backends(backends, tokenizer, texts, labels, batch_size=32):
+    """backends: (name, model) pairs, the first one is the reference the others are compared with."""
+    labels = np.asarray(labels)
+    rows = []
+    for name, model in backends:
+        reference = rows[0]['predictions'] if rows else None
+        rows.append(evaluate_backend(name, model, tokenizer, texts, labels, batch_size, reference))
+    return rows
+
+
+def format_table(rows):
+    lines = [f"{'backend':14} | {'accuracy':>8} | {'agreement':>9} | {'p50 ms':>8} | {'p95 ms':>8} | {'comments/s':>10}"]
+    for r in rows:
+        lines.append(f"{r['backend']:14} | {r['accuracy']:8} | {r['agreement']:9} | {r['p50_ms']:8} | "
+                     f"{r['p95_ms']:8} | {r['comments_per_sec']:10}")
+    return "\n".join(lines)
+
+
+def benchmark_onnx(path=DEFAULT_EVAL_DATA, limit=1000, batch_size=32):
+    texts, labels = load_held_out(path, limit)
+    print(f"Held-out set: {len(texts)} comments.\n")
+
+    backends = [(name, MODEL_CATALOG[model_name]) for name, model_name in BACKENDS if model_name in MODEL_CATALOG]
+    rows = compare_backends(backends, MODEL_CATALOG.load('roberta_tokenizer'), texts, labels, batch_size)
+    print(format_table(rows))
+    return rows
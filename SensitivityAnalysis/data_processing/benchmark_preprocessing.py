@@ -0,0 +1,70 @@
+"""
+python manage.py shell
+from data_processing.benchmark_preprocessing import benchmark_preprocessing
+benchmark_preprocessing()
+
+Benchmark of text preprocessing: text_tokenizer called per comment vs tokenize_batch (nlp.pipe).
+By default runs on 10 000 comments from YoutubeCommentsDataSet.csv and reports docs/sec.
+Caches are cleared before every run; "cached" repeats the last run on a warm cache.
+"""
+
+import os
+import time
+
+import pandas as pd
+from django.conf import settings
+
+from data_processing.preprocessing_text import text_tokenizer, tokenize_batch, text_cache, token_cache
+
+DATA_PATH = os.path.join(settings.BASE_DIR, 'data_processing', 'colab_train_models', 'Data',
+                         'YoutubeCommentsDataSet.csv')
+
+
+def load_comments(n=10000, path=DATA_PATH):
+    comments = pd.read_csv(path)['Comment'].dropna().astype(str).tolist()
+    # repeat the dataset if it is smaller than n
+    while len(comments) < n:
+        comments = comments + comments
+    return comments[:n]
+
+
+def benchmark_preprocessing(comments=None, n=10000, batch_sizes=(64, 256, 1000), n_process_values=(1, 2)):
+    if comments is None:
+        comments = load_comments(n)
+    print(f"Komentarzy: {len(comments)}\n")
+
+    results = []
+
+    text_cache.clear()
+    token_cache.clear()
+    start = time.time()
+    baseline = [text_tokenizer(c) for c in comments]
+    elapsed = time.time() - start
+    results.append({"method": "per-call", "time": round(elapsed, 3),
+                    "docs_per_sec": round(len(comments) / elapsed, 1), "same_output": True})
+
+    for n_process in n_process_values:
+        for batch_size in batch_sizes:
+            text_cache.clear()
+            start = time.time()
+            tokens = list(tokenize_batch(comments, batch_size=batch_size, n_process=n_process))
+            elapsed = time.time() - start
+            results.append({"method": f"pipe b={batch_size} p={n_process}", "time": round(elapsed, 3),
+                            "docs_per_sec": round(len(comments) / elapsed, 1), "same_output": tokens == baseline})
+
+    start = time.time()
+    tokens = list(tokenize_batch(comments))
+    elapsed = time.time() - start
+    results.append({"method": "pipe cached", "time": round(elapsed, 3),
+                    "docs_per_sec": round(len(comments) / elapsed, 1), "same_output": tokens == baseline})
+    print(text_cache.info())
+
+    print("\n")
+
+    for r in results:
+        print(
+            f"{r['method']:20} | time: {r['time']:8}s | "
+            f"docs/sec: {r['docs_per_sec']:8} | same output: {r['same_output']}"
+        )
+
+    return results
@@ -0,0 +1,64 @@
+"""
+python manage.py shell
+from data_processing.benchmark_roberta import benchmark_roberta
+benchmark_roberta("ID_FILMU")
+
+Benchmark of RoBERTa inference: per-comment loop vs batched, length-bucketed engine.
+Reports comments/sec for the old loop and for every tested batch size.
+"""
+
+import time
+
+import torch
+import torch.nn.functional as F
+
+from data_processing.roberta_inference import predict_roberta, set_num_threads
+from data_processing.model_registry import MODEL_CATALOG
+from youtube_integration.services import get_yt_comments
+
+
+def per_comment_loop(comments, tokenizer, model):
+    # the loop run_analysis used before the batched engine
+    predictions = []
+    for comment in comments:
+        inputs = tokenizer(comment, return_tensors="pt", truncation=True, max_length=128, padding=True)
+        with torch.no_grad():
+            outputs = model(**inputs)
+        predictions.append(torch.argmax(F.softmax(outputs.logits, dim=-1), dim=-1).item())
+    return predictions
+
+
+def benchmark_roberta(video_id=None, comments=None, batch_sizes=(8, 16, 32, 64), num_threads=None, limit=2000):
+    if comments is None:
+        comments = get_yt_comments(video_id)
+    comments = list(comments)[:limit]
+    print(f"Pobrano {len(comments)} komentarzy.\n")
+
+    set_num_threads(num_threads)
+    model = MODEL_CATALOG['roberta']
+    tokenizer = MODEL_CATALOG.load('roberta_tokenizer')
+    results = []
+
+    start = time.time()
+    baseline = per_comment_loop(comments, tokenizer, model)
+    elapsed = time.time() - start
+    results.append({"method": "loop", "time": round(elapsed, 3),
+                    "comments_per_sec": round(len(comments) / elapsed, 1), "agreement": 1.0})
+
+    for batch_size in batch_sizes:
+        start = time.time()
+        predictions, _ = predict_roberta(comments, tokenizer, model, batch_size=batch_size)
+        elapsed = time.time() - start
+        agreement = sum(int(a) == int(b) for a, b in zip(baseline, predictions)) / (len(comments) or 1)
+        results.append({"method": f"batch={batch_size}", "time": round(elapsed, 3),
+                        "comments_per_sec": round(len(comments) / elapsed, 1), "agreement": round(agreement, 4)})
+
+    print("\n")
+
+    for r in results:
+        print(
+            f"{r['method']:10} | time: {r['time']:8}s | "
+            f"comments/sec: {r['comments_per_sec']:8} | agreement: {r['agreement']}"
+        )
+
+    return results
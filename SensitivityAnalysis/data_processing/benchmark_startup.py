@@ -0,0 +1,62 @@
+"""
+python manage.py shell
+from data_processing.benchmark_startup import benchmark_startup
+benchmark_startup()
+
+Benchmark of worker startup: every scenario runs in a fresh Python process that sets up Django and
+imports the views (what a gunicorn/runserver worker does), then reports the time taken and its RSS.
+"lazy" is the startup with the model registry, "eager" also loads every model and spaCy right away
+(what importing data_processing.views did before), "first analysis" loads only logistic regression.
+"""
+
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+
+SCENARIOS = {
+    "lazy": "",
+    "first analysis (LR)": "MODEL_CATALOG['logistic_regression']; get_nlp()",
+    "eager (all models)": "MODEL_CATALOG.warmup(background=False); get_nlp()",
+}
+
+CHILD = """
+import json, os, sys, time
+start = time.time()
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SensitivityAnalysis.settings')
+django.setup()
+import data_processing.views, dashboard.views
+from data_processing.model_registry import MODEL_CATALOG
+from data_processing.preprocessing_text import get_nlp
+{code}
+import psutil
+print(json.dumps({{'time': time.time() - start, 'rss_mb': psutil.Process().memory_info().rss / 2**20,
+                  'loaded': MODEL_CATALOG.loaded()}}))
+"""
+
+
+def run_scenario(code):
+    output = subprocess.run([sys.executable, "-c", CHILD.format(code=code)], cwd=settings.BASE_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark_startup(repeat=3):
+    results = []
+    for name, code in SCENARIOS.items():
+        try:
+            runs = [run_scenario(code) for _ in range(repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{name}: failed\n{e.stderr}")
+            continue
+        results.append({"scenario": name, "time": round(min(r["time"] for r in runs), 2),
+                        "rss_mb": round(min(r["rss_mb"] for r in runs), 1), "loaded": runs[0]["loaded"]})
+
+    print("\n")
+
+    for r in results:
+        print(f"{r['scenario']:20} | startup: {r['time']:6}s | RSS: {r['rss_mb']:7} MB | loaded: {r['loaded']}")
+
+    return results
@@ -0,0 +1,63 @@
+# data_processing/cascade.py
+# Confidence-gated cascade: the cheap TF-IDF model classifies every comment, and only the comments it is
+# unsure about (probability of its label below CASCADE_THRESHOLD) are classified again by RoBERTa.
+#
+# The 'cascade' MODEL_CATALOG entry has no files of its own: CascadeClassifier only names the fast and the
+# expert model, both are run through the usual classify_texts path (batched RoBERTa, shared caches).
+# The comments sent to the expert are counted in the job timings ('escalated') and in
+# sentiment_cascade_comments_total; benchmark_cascade measures accuracy against full RoBERTa.
+
+from contextlib import nullcontext
+
+import numpy as np
+from django.conf import settings
+from prometheus_client import Counter
+
+FAST_MODEL = getattr(settings, 'CASCADE_FAST_MODEL', 'logistic_regression')
+EXPERT_MODEL = getattr(settings, 'CASCADE_EXPERT_MODEL', 'roberta')
+THRESHOLD = getattr(settings, 'CASCADE_THRESHOLD', 0.8)
+
+CASCADE_COMMENTS = Counter('sentiment_cascade_comments_total', "Comments classified by the cascade, by the model "
+                           "that gave the final label (fast, expert).", ['route'])
+
+
+class CascadeClassifier:
+    def __init__(self, fast_model, expert_model, threshold=THRESHOLD):
+        self.fast_model = fast_model
+        self.expert_model = expert_model
+        self.threshold = float(threshold)
+
+    def escalate(self, confidences):
+        """Indices of the comments for the expert: below the threshold, or without a probability (NaN)."""
+        return np.flatnonzero(~(np.asarray(confidences, dtype=np.float64) >= self.threshold))
+
+    def classify(self, texts, classify, timings=None):
+        """
+        Labels and confidences of texts; classify(model_name, texts) is the single-model classifier
+        (views.classify_texts). The time and number of comments of both passes are added to timings.
+        """
+        texts = list(texts)
+        with _timed(timings, "fast", len(texts)):
+            labels, confidences = classify(self.fast_model, texts)
+        labels = np.asarray(labels, dtype=np.int64).copy()
+        confidences = np.asarray(confidences, dtype=np.float64).copy()
+
+        uncertain = self.escalate(confidences)
+        with _timed(timings, "escalated", len(uncertain)):
+            if len(uncertain):
+                expert_labels, expert_confidences = classify(self.expert_model, [texts[i] for i in uncertain])
+                labels[uncertain] = expert_labels
+                confidences[uncertain] = expert_confidences
+
+        CASCADE_COMMENTS.labels('fast').inc(len(texts) - len(uncertain))
+        CASCADE_COMMENTS.labels('expert').inc(len(uncertain))
+        return labels, confidences
+
+
+def _timed(timings, stage, items):
+    return timings.time(stage, items) if timings is not None else nullcontext()
+
+
+def load_cascade(entry):
+    fast_model, expert_model = entry['requires'][:2]
+    return CascadeClassifier(fast_model, expert_model, entry.get('threshold', THRESHOLD))
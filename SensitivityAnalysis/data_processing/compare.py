@@ -0,0 +1,111 @@
+# data_processing/compare.py
+# Compare mode: one video scored by several models in a single pass.
+#
+# Comments are fetched and translated once. Every page is classified by all the models with
+# views.classify_texts_multi: the TF-IDF models share one preprocessing pass and one sparse matrix, so an
+# extra model only costs its predict call (RoBERTa / cascade, if picked, classify the raw texts).
+# The result has per-model aggregates, the pairwise agreement matrix (share of equal labels and Cohen's
+# kappa) and the comments the models disagree on (the first COMPARE_MAX_DISAGREEMENTS of them).
+# Used by the /compare/ endpoint and the compare_models management command.
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+from django.conf import settings
+
+from data_processing import aggregation, metrics
+from data_processing.model_registry import MODEL_CATALOG, uses_tfidf
+from data_processing.streaming import PipelineStage, run_pipeline
+from youtube_integration.services import PRO_COMMENT_LIMIT, get_yt_video_meta, iter_comment_pages, translate_page
+
+COMPARE_MAX_DISAGREEMENTS = getattr(settings, 'COMPARE_MAX_DISAGREEMENTS', 200)
+
+
+def default_models():
+    """Every available TF-IDF model (they share the sparse matrix, so comparing them is cheap)."""
+    return [name for name in MODEL_CATALOG if uses_tfidf(name)]
+
+
+def parse_models(text):
+    """Model names from a comma separated string (default_models() if empty); ValueError for unknown ones."""
+    names = list(dict.fromkeys(n.strip() for n in (text or '').split(',') if n.strip())) or default_models()
+    unknown = [n for n in names if n not in MODEL_CATALOG]
+    if unknown:
+        raise ValueError(f"Unknown or unavailable models: {', '.join(unknown)}")
+    if len(names) < 2:
+        raise ValueError("Pick at least two models to compare.")
+    return names
+
+
+def _disagreement(record, results, index):
+    return {
+        'id': record['id'], 'text': record['text'], 'published_at': record.get('published_at'),
+        'labels': {name: aggregation.IDX_TO_LABEL[int(labels[index])] for name, (labels, _) in results.items()},
+        'confidences': {name: (round(float(conf[index]), 3) if np.isfinite(conf[index]) else None)
+                        for name, (_, conf) in results.items()},
+    }
+
+
+def run_comparison(video_id, model_names, classify_multi, update_step=None, max_comments=PRO_COMMENT_LIMIT):
+    """
+    Scores the video's comments with every model; classify_multi(model_names, texts, timings) returns
+    {model: (labels, confidences)} (views.classify_texts_multi). update_step(progress, step_name) as in jobs.
+    """
+    update_step = update_step or (lambda progress, step_name: None)
+    timings = metrics.JobTimings('compare')
+    labels = {name: [] for name in model_names}
+    confidences = {name: [] for name in model_names}
+    published = []
+    disagreements = []
+    disagreement_count = 0
+
+    update_step(5, "Connecting to YouTube API...")
+    with ThreadPoolExecutor(max_workers=1) as meta_pool:
+        meta_future = meta_pool.submit(partial(get_yt_video_meta, video_id))
+        fetch = PipelineStage("fetch", timings=timings)
+        translate = PipelineStage("translate", translate_page, timings)
+        classify = PipelineStage("classify", lambda page: (
+            page, classify_multi(model_names, [r['text'] for r in page], timings)), timings)
+        pages = iter_comment_pages(video_id, max_results_total=max_comments)
+
+        for records, results in run_pipeline(pages, fetch, [translate, classify]):
+            for name in model_names:
+                labels[name].append(np.asarray(results[name][0], dtype=np.int64))
+                confidences[name].append(np.asarray(results[name][1], dtype=np.float64))
+            published.extend(r.get('published_at') for r in records)
+
+            page_labels = np.vstack([labels[name][-1] for name in model_names])
+            differ = np.flatnonzero((page_labels != page_labels[0]).any(axis=0))
+            disagreement_count += len(differ)
+            for i in differ[:max(0, COMPARE_MAX_DISAGREEMENTS - len(disagreements))]:
+                disagreements.append(_disagreement(records[i], results, i))
+
+            update_step(10 + int(min(1.0, classify.items / max_comments) * 80),
+                        f"Fetched {fetch.items}, classified {classify.items} comments with "
+                        f"{len(model_names)} models ({classify.throughput()} comments/s)...")
+
+        update_step(90, "Fetching video metadata...")
+        title, thumb, channel, published_at, views, likes, _ = meta_future.result()
+
+    update_step(95, "Comparing the models...")
+    with timings.time("report"):
+        labels = {name: np.concatenate(parts) if parts else np.empty(0, np.int64) for name, parts in labels.items()}
+        confidences = {name: np.concatenate(parts) if parts else np.empty(0) for name, parts in confidences.items()}
+        published = aggregation.parse_published(published)
+        per_model = {name: aggregation.aggregate(labels[name], confidences[name], published) for name in model_names}
+        models_agreement = aggregation.agreement(labels)
+
+    comment_count = len(published)
+    return {
+        'video_id': video_id, 'video_title': title, 'thumbnail_url': thumb, 'channel_title': channel,
+        'published_at': published_at, 'view_count': views, 'like_count': likes,
+        'models': model_names,
+        'comment_count': comment_count,
+        'per_model': per_model,
+        'agreement': models_agreement,
+        'disagreement_count': disagreement_count,
+        'disagreement_share': round(disagreement_count / comment_count, 4) if comment_count else 0.0,
+        'disagreements': disagreements,
+        'timings': timings.breakdown(),
+    }
@@ -0,0 +1,190 @@
+# data_processing/dedup.py
+# Collapsing of duplicate comments before classification (spam waves, copy-paste replies).
+#
+# Comments are compared by their normalized form (normalize: casefolded, punctuation dropped, whitespace
+# collapsed). Unlike clean_text it keeps the letters of every script, digits and emojis, so comments that only
+# differ in non-Latin text are not grouped together; comments with nothing left (only punctuation) are not grouped.
+# - exact duplicates share the hash of the normalized text,
+# - near-duplicates (normalized text of DEDUP_NEAR_MIN_CHARS or more) are found with MinHash signatures of
+#   character shingles and LSH banding (DEDUP_BANDS bands of DEDUP_NUM_PERM / DEDUP_BANDS rows). Candidates
+#   from the LSH buckets are confirmed with the exact Jaccard similarity of the shingle sets
+#   (>= DEDUP_THRESHOLD), so banding only decides which pairs are compared.
+# One representative per group is classified and its label and confidence are copied to the other members.
+# Every comment is still stored with its label, so the aggregates count each copy (weight = group size).
+# The Deduplicator of a run keeps its groups across pages: a copy on page 40 reuses the label from page 1.
+# A resumed run seeds it with the comments stored before the interruption (seed), so its groups and stats
+# cover the whole analysis.
+
+import functools
+import hashlib
+import re
+import sys
+import unicodedata
+import zlib
+
+import numpy as np
+from django.conf import settings
+from prometheus_client import Counter
+
+DEDUP_ENABLED = getattr(settings, 'DEDUP_ENABLED', True)
+DEDUP_THRESHOLD = getattr(settings, 'DEDUP_THRESHOLD', 0.8)
+DEDUP_NUM_PERM = getattr(settings, 'DEDUP_NUM_PERM', 64)
+DEDUP_BANDS = getattr(settings, 'DEDUP_BANDS', 16)
+DEDUP_NEAR_MIN_CHARS = getattr(settings, 'DEDUP_NEAR_MIN_CHARS', 20)
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+DUPLICATE_COMMENTS = Counter('sentiment_duplicate_comments_total', "Comments not classified because they "
+                             "duplicate an earlier comment, by kind (exact, near).", ['kind'])
+
+
+_EMOTICONS = re.compile(r'[:;=]-?[()DP]')
+
+
+@functools.lru_cache(maxsize=1)
+def _punctuation_table():
+    # every Unicode punctuation character (categories P*) -> space
+    return {i: ' ' for i in range(sys.maxunicode + 1) if unicodedata.category(chr(i))[0] == 'P'}
+
+
+def normalize(text):
+    """Casefolded text without punctuation, whitespace collapsed; emoticons such as :) are kept at the end."""
+    text = str(text)
+    emoticons = [e.replace('-', '') for e in _EMOTICONS.findall(text)]
+    words = _EMOTICONS.sub(' ', text).casefold().translate(_punctuation_table()).split()
+    return ' '.join(words + emoticons)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of crc32 hashes of the character shingles of a normalized text."""
+    padded = f" {text} "
+    return {zlib.crc32(padded[i:i + size].encode()) for i in range(max(1, len(padded) - size + 1))}
+
+
+class MinHasher:
+    def __init__(self, num_perm=DEDUP_NUM_PERM, seed=1):
+        rng = np.random.default_rng(seed)
+        # universal hashing (a * x + b) mod p; a, b < 2^29 keep a * x + b below 2^63 for 32-bit x
+        self.a = rng.integers(1, 1 << 29, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 29, num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        x = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+        return ((np.outer(self.a, x) + self.b[:, None]) % _MERSENNE_PRIME & _MAX_HASH).min(axis=1)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class Deduplicator:
+    """
+    Groups the comments of one analysis run. classify(texts, classify_func) classifies the representatives
+    only and returns labels and confidences for every text, like classify_func(texts).
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, bands=DEDUP_BANDS,
+                 near_min_chars=DEDUP_NEAR_MIN_CHARS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.near_min_chars = near_min_chars
+        self.hasher = MinHasher(num_perm)
+        self._exact = {}     # hash of the normalized text -> group
+        self._buckets = {}   # (band, band signature) -> groups
+        self._shingles = []  # group -> shingle set (None: exact matching only)
+        self._labels = []    # group -> label
+        self._confidences = []
+        self.comments = self.exact = self.near = 0
+
+    def _group_of(self, normalized):
+        """(group, kind, None) of an earlier equal / similar comment, or (None, None, data of a new group)."""
+        key = hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+        if key in self._exact:
+            return self._exact[key], 'exact', None
+        if len(normalized) < self.near_min_chars:
+            return None, None, (key, None, ())
+        shingle_set = shingles(normalized)
+        signature = self.hasher.signature(shingle_set)
+        band_keys = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                     for band in range(self.bands)]
+        candidates = {group for band_key in band_keys for group in self._buckets.get(band_key, ())}
+        for group in sorted(candidates):
+            if jaccard(shingle_set, self._shingles[group]) >= self.threshold:
+                self._exact[key] = group
+                return group, 'near', None
+        return None, None, (key, shingle_set, band_keys)
+
+    def _add_group(self, key, shingle_set, band_keys):
+        group = len(self._shingles)
+        self._exact[key] = group
+        self._shingles.append(shingle_set)
+        self._labels.append(None)
+        self._confidences.append(np.nan)
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, []).append(group)
+        return group
+
+    def seed(self, rows):
+        """Groups of already classified comments, rows of (text, label, confidence); counted in the stats."""
+        for text, label, confidence in rows:
+            self.comments += 1
+            normalized = normalize(text)
+            if not normalized:
+                continue
+            group, kind, new = self._group_of(normalized)
+            if group is None:
+                group = self._add_group(*new)
+                self._labels[group] = int(label)
+                self._confidences[group] = np.nan if confidence is None else float(confidence)
+            else:
+                setattr(self, kind, getattr(self, kind) + 1)
+
+    def classify(self, texts, classify_func):
+        groups = np.empty(len(texts), dtype=np.int64)
+        representatives = []
+        for i, text in enumerate(texts):
+            normalized = normalize(text)
+            if not normalized:
+                groups[i] = -1  # nothing left to compare (e.g. only punctuation), classified on its own
+                representatives.append(i)
+                continue
+            group, kind, new = self._group_of(normalized)
+            if group is None:
+                group = self._add_group(*new)
+                representatives.append(i)
+            else:
+                setattr(self, kind, getattr(self, kind) + 1)
+                DUPLICATE_COMMENTS.labels(kind).inc()
+            groups[i] = group
+        self.comments += len(texts)
+
+        labels, confidences = classify_func([texts[i] for i in representatives])
+        labels = np.asarray(labels, dtype=np.int64)
+        confidences = np.asarray(confidences, dtype=np.float64)
+        for i, label, confidence in zip(representatives, labels, confidences):
+            if groups[i] >= 0:
+                self._labels[groups[i]] = int(label)
+                self._confidences[groups[i]] = float(confidence)
+
+        out_labels = np.empty(len(texts), dtype=np.int64)
+        out_confidences = np.empty(len(texts), dtype=np.float64)
+        out_labels[representatives] = labels
+        out_confidences[representatives] = confidences
+        duplicates = np.flatnonzero(~np.isin(np.arange(len(texts)), representatives))
+        out_labels[duplicates] = [self._labels[groups[i]] for i in duplicates]
+        out_confidences[duplicates] = [self._confidences[groups[i]] for i in duplicates]
+        return out_labels, out_confidences
+
+    def stats(self, previous=None):
+        """Duplicate counts of the run (added to previous, the stats of the earlier runs) and their ratio."""
+        previous = previous or {}
+        comments = previous.get('comments', 0) + self.comments
+        exact = previous.get('exact', 0) + self.exact
+        near = previous.get('near', 0) + self.near
+        return {'comments': comments, 'exact': exact, 'near': near, 'classified': comments - exact - near,
+                'ratio': round((exact + near) / comments, 4) if comments else 0.0}
@@ -0,0 +1,176 @@
+# data_processing/incremental.py
+# Incremental re-analysis of a video.
+#
+# Every analysed comment (id, publish time, text, label, confidence) is kept in AnalyzedComment,
+# and the label counts in VideoAnalysis. A re-run of the same video with the same model
+# version only downloads comments newer than the stored ones (order=time, stop at the
+# first known id), classifies them and adds their counts to the stored aggregates.
+# A run that stopped half way (quota exceeded, API errors, restart) keeps its stored pages and the page
+# token of the next page in VideoAnalysis.checkpoint, and the next run of the video continues from there.
+# The unfinished run belongs to the job running it (VideoAnalysis.owner): another job only continues it once that
+# job is no longer queued or running, a second submission of the same video and model fails meanwhile.
+# Only full analyses are continued: a capped one (first max_comments comments, batch mode) is stored with
+# coverage='capped' and replaced by the next capped run.
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_datetime
+
+from data_processing.aggregation import class_counts, counts_dict
+from data_processing.models import AnalysisJob, VideoAnalysis, AnalyzedComment
+
+INCREMENTAL_ENABLED = getattr(settings, 'ANALYSIS_INCREMENTAL', True)
+
+
+class AnalysisInProgress(Exception):
+    pass
+
+
+def _running_elsewhere(state, owner):
+    """True while the unfinished run of state belongs to another job that is still queued or running."""
+    return (not state.complete and state.owner_id is not None and state.owner_id != owner and
+            AnalysisJob.objects.filter(pk=state.owner_id,
+                                       status__in=[AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING]).exists())
+
+
+def _in_progress():
+    return AnalysisInProgress("This video is already being analysed with this model. "
+                              "Wait for that analysis to finish and submit it again.")
+
+
+def load_state(video_id, model_name, model_version):
+    """Returns the stored VideoAnalysis to continue from, or None when a full run is needed."""
+    if not INCREMENTAL_ENABLED:
+        return None
+    return VideoAnalysis.objects.filter(
+        video_id=video_id, model_name=model_name, model_version=model_version, complete=True,
+        coverage=VideoAnalysis.COVERAGE_FULL,
+    ).first()
+
+
+def load_interrupted(video_id, model_name, model_version):
+    """Returns the VideoAnalysis of an interrupted run that can continue from its checkpoint, or None."""
+    return VideoAnalysis.objects.filter(
+        video_id=video_id, model_name=model_name, model_version=model_version, complete=False,
+        checkpoint__isnull=False, coverage=VideoAnalysis.COVERAGE_FULL,
+    ).first()
+
+
+def known_comment_ids(state):
+    if state is None:
+        return set()
+    return set(state.comments.values_list('comment_id', flat=True))
+
+
+def merge_counts(stored_counts, predictions):
+    stored = {int(k): int(v) for k, v in (stored_counts or {}).items()}
+    counts = class_counts(predictions)
+    counts += [stored.get(k, 0) for k in range(len(counts))]
+    return counts_dict(counts)
+
+
+def start_run(video_id, model_name, model_version, state, order="relevance", coverage=VideoAnalysis.COVERAGE_FULL,
+              owner=None):
+    """
+    Prepares the VideoAnalysis the pages of this run are added to, owned by the job `owner` (AnalysisJob id).
+    state=None means a new run: older data of this video/model with the same coverage is replaced (the rows of
+    other model versions once the run finishes).
+    The analysis is marked incomplete until finish_run(); its checkpoint records how far paging got,
+    an interrupted state (load_interrupted) is continued as it is.
+    Raises AnalysisInProgress when another job is running the stored analysis.
+    """
+    checkpoint = {'order': order, 'page_token': None, 'fetched': 0}
+    if state is None:
+        # the row of the same model version is replaced right away (unique key), unless a job still runs it;
+        # other versions stay readable until finish_run
+        previous = VideoAnalysis.objects.filter(video_id=video_id, model_name=model_name,
+                                                model_version=model_version, coverage=coverage).first()
+        if previous is not None:
+            if _running_elsewhere(previous, owner):
+                raise _in_progress()
+            previous.delete()
+        try:
+            with transaction.atomic():
+                return VideoAnalysis.objects.create(
+                    video_id=video_id, model_name=model_name, model_version=model_version,
+                    sentiment_counts=merge_counts({}, []), complete=False, checkpoint=checkpoint, coverage=coverage,
+                    owner_id=owner)
+        except IntegrityError:
+            raise _in_progress()  # another job started the same run at the same time
+
+    if _running_elsewhere(state, owner):
+        raise _in_progress()
+    fields = {'complete': False, 'owner_id': owner}
+    if state.complete:
+        fields['checkpoint'] = checkpoint
+    # conditional update: of two jobs continuing the same analysis only one claims it
+    if not VideoAnalysis.objects.filter(pk=state.pk, complete=state.complete, owner_id=state.owner_id).update(**fields):
+        raise _in_progress()
+    for name, value in fields.items():
+        setattr(state, name, value)
+    return state
+
+
+@transaction.atomic
+def add_page(state, records, predictions, confidences=None, next_page_token=None):
+    """
+    Stores one page of classified comments and merges its counts into the aggregates.
+    Comments already stored for the analysis (e.g. a page fetched again after a resume) are neither stored
+    nor counted again. next_page_token (the page after this one) is saved in the checkpoint in the same transaction.
+    """
+    if confidences is None:
+        confidences = np.full(len(predictions), np.nan)
+    predictions = np.asarray(predictions, dtype=np.int64)
+    confidences = np.asarray(confidences, dtype=float)
+    seen = set(state.comments.filter(comment_id__in=[r['id'] for r in records]).values_list('comment_id', flat=True))
+    new = np.zeros(len(records), dtype=bool)
+    for i, r in enumerate(records):
+        if r['id'] not in seen:
+            seen.add(r['id'])
+            new[i] = True
+
+    AnalyzedComment.objects.bulk_create(
+        [
+            AnalyzedComment(analysis=state, comment_id=r['id'], text=r['text'], label=p,
+                            confidence=c if np.isfinite(c) else None,
+                            published_at=parse_datetime(r['published_at']) if r.get('published_at') else None)
+            for r, p, c, is_new in zip(records, predictions.tolist(), confidences.tolist(), new) if is_new
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+    state.sentiment_counts = merge_counts(state.sentiment_counts, predictions[new])
+    state.comment_count = sum(state.sentiment_counts.values())
+    if state.checkpoint is not None:
+        state.checkpoint = {**state.checkpoint, 'page_token': next_page_token,
+                            'fetched': state.checkpoint['fetched'] + len(records)}
+    state.save(update_fields=['sentiment_counts', 'comment_count', 'checkpoint', 'updated_at'])
+    return state
+
+
+def finish_run(state):
+    state.complete = True
+    state.checkpoint = None
+    state.save(update_fields=['complete', 'checkpoint', 'updated_at'])
+    # analyses this run supersedes (other model versions), unless a job is still running one of them
+    superseded = VideoAnalysis.objects.filter(video_id=state.video_id, model_name=state.model_name,
+                                              coverage=state.coverage).exclude(pk=state.pk)
+    for analysis in superseded:
+        if not _running_elsewhere(analysis, state.owner_id):
+            analysis.delete()
+    return state
+
+
+def stored_arrays(state):
+    """
+    Labels, confidences (NaN if unknown) and publish times (datetime64[s], NaT if unknown) of every stored
+    comment as NumPy arrays, newest first (the texts are read page by page by results_store).
+    """
+    rows = list(state.comments.order_by('-published_at', '-pk').values_list('label', 'confidence', 'published_at'))
+    labels = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    confidences = np.array([np.nan if r[1] is None else r[1] for r in rows], dtype=np.float64)
+    seconds = np.array([np.nan if r[2] is None else r[2].timestamp() for r in rows], dtype=np.float64)
+    published = np.where(np.isnan(seconds), np.datetime64('NaT'), np.nan_to_num(seconds).astype('datetime64[s]'))
+    return labels, confidences, published
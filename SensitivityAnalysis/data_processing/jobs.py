@@ -0,0 +1,224 @@
+# data_processing/jobs.py
+# In-process background job queue for the analysis pipeline.
+#
+# /analyze/ only creates an AnalysisJob row and puts its id on a bounded queue.
+# A small pool of worker threads takes jobs from the queue and runs the pipeline,
+# writing result and errors back to the job row (SQLite). Progress ticks go to the
+# progress channel (data_processing.progress) and reach the row at most every
+# ANALYSIS_PROGRESS_DB_INTERVAL seconds. The number of worker threads is the limit of
+# analyses running at the same time, the queue size is the limit of analyses waiting.
+# Finished jobs and their run time are counted in data_processing.metrics.
+# The queue lives in memory: every job records the process that queued it (AnalysisJob.worker, "host:pid") and
+# jobs left queued or running by a process that has stopped are marked failed by recover_stale_jobs() on the first
+# request of each process (ANALYSIS_RECOVER_STALE_JOBS). Jobs of live processes, e.g. the other workers of a
+# gunicorn server, are left alone; jobs of other hosts are recovered by the processes of their host.
+
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from data_processing import metrics, progress
+from data_processing.models import AnalysisJob
+
+MAX_CONCURRENT_JOBS = getattr(settings, 'ANALYSIS_MAX_CONCURRENT_JOBS', 2)
+MAX_QUEUED_JOBS = getattr(settings, 'ANALYSIS_MAX_QUEUED_JOBS', 20)
+RECOVER_STALE_JOBS = getattr(settings, 'ANALYSIS_RECOVER_STALE_JOBS', True)
+
+PROCESS_STARTED = timezone.now()
+HOSTNAME = socket.gethostname()
+
+_running = threading.local()
+
+
+@contextmanager
+def running_job(job_id):
+    """Marks the code run in this thread as part of the job (current_job_id), e.g. in the threads of a batch."""
+    previous = getattr(_running, 'job_id', None)
+    _running.job_id = job_id
+    try:
+        yield
+    finally:
+        _running.job_id = previous
+
+
+def current_job_id():
+    """Id of the AnalysisJob run by this thread, None outside the job queue."""
+    return getattr(_running, 'job_id', None)
+
+
+def worker_name(pid=None):
+    """AnalysisJob.worker of the jobs queued by this process (or by process pid of this host)."""
+    return f"{HOSTNAME}:{pid or os.getpid()}"
+
+
+def _process_alive(pid):
+    if os.name != 'posix':
+        return True  # no signal 0 to probe with: only this process' own jobs are recovered
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def _owner_stopped(worker, created_at, started):
+    """Whether the process that queued a job (its AnalysisJob.worker) has stopped."""
+    if not worker:
+        return created_at < started  # queued before jobs recorded their process
+    host, _, pid = worker.rpartition(':')
+    if host != HOSTNAME or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return created_at < started  # a previous process with the same pid
+    return not _process_alive(int(pid))
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_queued=MAX_QUEUED_JOBS):
+        self.max_workers = max(1, int(max_workers))
+        self._queue = queue.Queue(maxsize=max(1, int(max_queued)))
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # workers are started lazily on the first submit, not at import time
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.max_workers):
+                t = threading.Thread(target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job, func):
+        """
+        Queues func(video_id, model_name, update_step) for the given AnalysisJob.
+        Raises QueueFull when too many jobs are already waiting.
+        """
+        self._start()
+        job.worker = worker_name()
+        AnalysisJob.objects.filter(pk=job.pk).update(worker=job.worker)
+        try:
+            self._queue.put_nowait((job.pk, func))
+        except queue.Full:
+            raise QueueFull(f"Too many analyses in progress (limit {self._queue.maxsize}). Try again later.")
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _worker(self):
+        while True:
+            job_id, func = self._queue.get()
+            try:
+                run_job(job_id, func)
+            except Exception as e:
+                logging.error(f"Analysis worker error: {e}")
+            finally:
+                close_old_connections()
+                self._queue.task_done()
+
+
+def _finish(job_id, status, **fields):
+    AnalysisJob.objects.filter(pk=job_id).update(status=status, finished_at=timezone.now(), **fields)
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    if job is not None:
+        progress.publish(job_id, job.status_payload())
+
+
+def run_job(job_id, func):
+    close_old_connections()
+    job = AnalysisJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return
+    if job.cancel_requested:
+        _finish(job_id, AnalysisJob.STATUS_CANCELLED, step='Cancelled.')
+        return
+
+    AnalysisJob.objects.filter(pk=job_id).update(status=AnalysisJob.STATUS_RUNNING, started_at=timezone.now(),
+                                                  step='Starting...')
+    job.status, job.step = AnalysisJob.STATUS_RUNNING, 'Starting...'
+    progress.publish(job_id, job.status_payload())
+    last_write = [time.monotonic()]
+
+    def update_step(percent, step_name):
+        job.progress, job.step = percent, step_name[:255]
+        progress.publish(job_id, job.status_payload())
+        if progress.cancel_requested(job_id):
+            raise JobCancelled()
+        if time.monotonic() - last_write[0] < progress.DB_WRITE_INTERVAL:
+            return
+        # rate-limited UPDATE; 0 rows updated means the job was cancelled (e.g. from another process)
+        last_write[0] = time.monotonic()
+        updated = AnalysisJob.objects.filter(pk=job_id, cancel_requested=False).update(
+            progress=job.progress, step=job.step)
+        if not updated:
+            raise JobCancelled()
+
+    kind = 'batch' if job.batch is not None else 'compare' if job.compare is not None else 'analysis'
+    start = time.monotonic()
+    try:
+        with running_job(job_id):
+            result = func(job.video_id, job.model_name, update_step)
+    except JobCancelled:
+        status = AnalysisJob.STATUS_CANCELLED
+        _finish(job_id, status, step='Cancelled.')
+    except Exception as e:
+        logging.error(f"Analysis job {job_id} failed: {e}\n{traceback.format_exc()}")
+        status = AnalysisJob.STATUS_FAILED
+        _finish(job_id, status, step='Error.', error=str(e))
+    else:
+        status = AnalysisJob.STATUS_DONE
+        _finish(job_id, status, progress=100, step='Done!', result=result)
+    metrics.JOBS.labels(kind, status).inc()
+    metrics.JOB_SECONDS.labels(kind).observe(time.monotonic() - start)
+
+
+def recover_stale_jobs(started=None):
+    """
+    Marks the jobs left queued or running by a stopped process of this host as failed (their queue entries were
+    lost), so pages polling them stop waiting. A job of this process' pid counts as stale when created before
+    started (default: this process' start). Returns the number of jobs.
+    """
+    started = started or PROCESS_STARTED
+    stale_ids = [pk for pk, worker, created_at in AnalysisJob.objects.filter(
+        status__in=[AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING]).values_list('pk', 'worker', 'created_at')
+        if _owner_stopped(worker, created_at, started)]
+    for job_id in stale_ids:
+        _finish(job_id, AnalysisJob.STATUS_FAILED, step='Error.',
+                error="The analysis was interrupted by a server restart. Please submit it again.")
+    return len(stale_ids)
+
+
+def cancel_job(job_id):
+    """Asks a queued or running job to stop. Running jobs stop at their next progress update."""
+    updated = AnalysisJob.objects.filter(
+        pk=job_id, status__in=[AnalysisJob.STATUS_QUEUED, AnalysisJob.STATUS_RUNNING]
+    ).update(cancel_requested=True)
+    if updated:
+        progress.request_cancel(job_id)
+    if AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.STATUS_QUEUED).update(
+            status=AnalysisJob.STATUS_CANCELLED, step='Cancelled.', finished_at=timezone.now()):
+        progress.publish(job_id, AnalysisJob.objects.get(pk=job_id).status_payload())
+    return bool(updated)
+
+
+analysis_queue = JobQueue()
@@ -0,0 +1,64 @@
+# data_processing/management/commands/analyze_batch.py
+# python manage.py analyze_batch VIDEO_ID_OR_LINK ... [--playlist ID] [--channel @handle] [--model naive_bayes]
+# Runs a batch analysis (data_processing.batch) in the foreground and prints the per-video and combined reports.
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data_processing import batch
+from data_processing.model_registry import MODEL_CATALOG
+
+
+class Command(BaseCommand):
+    help = "Analyses many videos (ids/links, a playlist or a channel's uploads) and prints a combined report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('videos', nargs='*', help="Video ids or links.")
+        parser.add_argument('--playlist', help="Playlist id or link.")
+        parser.add_argument('--channel', help="Channel id, @handle or link (its newest uploads).")
+        parser.add_argument('--model', default='logistic_regression', help="Model name from the model registry.")
+        parser.add_argument('--comments-per-video', type=int, default=batch.BATCH_COMMENTS_PER_VIDEO)
+        parser.add_argument('--max-videos', type=int, default=batch.BATCH_MAX_VIDEOS)
+        parser.add_argument('--workers', type=int, default=batch.BATCH_WORKERS,
+                            help="Videos analysed at the same time.")
+        parser.add_argument('--output', help="Also write the full report as JSON to this file.")
+
+    def handle(self, *args, **options):
+        # the pipeline lives in the views module (imports the preprocessing and model setup)
+        from data_processing.views import analyze_video
+
+        if options['model'] not in MODEL_CATALOG:
+            raise CommandError(f"Unknown or unavailable model: {options['model']}")
+        try:
+            video_ids = batch.resolve_video_ids(
+                batch.parse_video_ids(" ".join(options['videos'])), batch.parse_playlist(options['playlist']),
+                batch.parse_channel(options['channel']), max_videos=options['max_videos'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not video_ids:
+            raise CommandError("Give video ids, --playlist or --channel.")
+
+        def update_step(progress, step_name):
+            self.stderr.write(f"[{progress:3d}%] {step_name}")
+
+        report = batch.run_batch(video_ids, options['model'], analyze_video, options['comments_per_video'],
+                                 workers=options['workers'], update_step=update_step)
+
+        for video in report['videos']:
+            if video['status'] == 'done':
+                self.stdout.write(f"{video['video_id']} | {video['comment_count']:6} comments | "
+                                  f"avg {video['avg_sentiment_score']:5} | {video['dominant_sentiment']:8} | "
+                                  f"{(video['video_title'] or '')[:50]}")
+            else:
+                self.stdout.write(f"{video['video_id']} | {video['status']}: {video['error']}")
+
+        combined, throughput = report['combined'], report['throughput']
+        self.stdout.write(f"\nCombined: {combined['comment_count']} comments, share {combined['sentiment_share']}, "
+                          f"avg {combined['avg_sentiment_score']}, dominant {combined['dominant_sentiment']}")
+        self.stdout.write(f"Throughput: {throughput['videos']} videos in {throughput['elapsed_seconds']}s = "
+                          f"{throughput['videos_per_hour']} videos/hour, {throughput['comments_per_second']} comments/s")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
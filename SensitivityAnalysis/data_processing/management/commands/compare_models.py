@@ -0,0 +1,60 @@
+# data_processing/management/commands/compare_models.py
+# python manage.py compare_models VIDEO_ID_OR_LINK [--models logistic_regression,naive_bayes,svc]
+# Scores one video with several models in a single pass (data_processing.compare) and prints the per-model
+# results, the agreement matrix and some of the comments the models disagree on.
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data_processing import batch, compare
+from youtube_integration.services import PRO_COMMENT_LIMIT
+
+
+class Command(BaseCommand):
+    help = "Compares sentiment models on one video: per-model results, agreement and disagreements."
+
+    def add_arguments(self, parser):
+        parser.add_argument('video', help="Video id or link.")
+        parser.add_argument('--models', default='', help="Comma separated model names (default: every TF-IDF model).")
+        parser.add_argument('--max-comments', type=int, default=PRO_COMMENT_LIMIT)
+        parser.add_argument('--show', type=int, default=10, help="Disagreements to print.")
+        parser.add_argument('--output', help="Also write the full report as JSON to this file.")
+
+    def handle(self, *args, **options):
+        from data_processing.views import classify_texts_multi
+
+        try:
+            video_ids = batch.parse_video_ids(options['video'])
+            model_names = compare.parse_models(options['models'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if len(video_ids) != 1:
+            raise CommandError("Give one YouTube video id or link.")
+
+        def update_step(progress, step_name):
+            self.stderr.write(f"[{progress:3d}%] {step_name}")
+
+        report = compare.run_comparison(video_ids[0], model_names, classify_texts_multi, update_step,
+                                        max(1, options['max_comments']))
+
+        self.stdout.write(f"{report['video_title']} - {report['comment_count']} comments\n")
+        for name in model_names:
+            result = report['per_model'][name]
+            self.stdout.write(f"{name:20} | share {result['sentiment_share']} | avg {result['avg_sentiment_score']:5} | "
+                              f"{result['dominant_sentiment']}")
+
+        matrix = report['agreement']
+        self.stdout.write(f"\nAgreement (kappa) - all models agree on {matrix['all_agree'] or 0:.1%} of the comments")
+        for i, name in enumerate(matrix['models']):
+            cells = "  ".join(f"{a:.3f} ({k})" for a, k in zip(matrix['agreement'][i], matrix['kappa'][i]))
+            self.stdout.write(f"{name:20} | {cells}")
+
+        self.stdout.write(f"\n{report['disagreement_count']} disagreements, for example:")
+        for item in report['disagreements'][:options['show']]:
+            labels = ", ".join(f"{name}={label}" for name, label in item['labels'].items())
+            self.stdout.write(f"- {item['text'][:80]!r}: {labels}")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
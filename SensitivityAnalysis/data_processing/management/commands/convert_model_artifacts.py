@@ -0,0 +1,45 @@
+# data_processing/management/commands/convert_model_artifacts.py
+# python manage.py convert_model_artifacts
+# Rewrites models trained before the memory-mapped artifact format (data_processing.artifacts):
+# the pickled TfidfVectorizer becomes a compact vocabulary directory, classifiers are re-saved
+# uncompressed and RoBERTa weights are saved as model.safetensors.
+
+import os
+
+import joblib
+from django.core.management.base import BaseCommand
+
+from data_processing import artifacts
+from data_processing.model_registry import MODEL_CATALOG, MODEL_DIR
+
+LEGACY_VECTORIZER_FILE = 'tfidf_vectorizer.joblib'
+
+
+class Command(BaseCommand):
+    help = "Converts the model files in MODEL_DIR to the memory-mapped artifact format."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-legacy', action='store_true',
+                            help="Keep tfidf_vectorizer.joblib after writing the compact vectorizer.")
+
+    def handle(self, *args, **options):
+        legacy_vectorizer = os.path.join(MODEL_DIR, LEGACY_VECTORIZER_FILE)
+        if os.path.exists(legacy_vectorizer):
+            directory = artifacts.save_vectorizer(joblib.load(legacy_vectorizer), MODEL_CATALOG.path('tfidf_vectorizer'))
+            self.stdout.write(f"Vectorizer -> {directory}")
+            if not options['keep_legacy']:
+                os.remove(legacy_vectorizer)
+
+        for name, entry in MODEL_CATALOG.manifest.items():
+            path = MODEL_CATALOG.path(name)
+            if entry['loader'] == 'joblib' and os.path.isfile(path) and artifacts.is_compressed(path):
+                artifacts.dump_model(joblib.load(path), path)
+                self.stdout.write(f"{name} -> {path} (uncompressed)")
+            elif entry['loader'] == 'hf_model' and os.path.isdir(path) \
+                    and not os.path.exists(os.path.join(path, artifacts.SAFETENSORS_FILE)):
+                from transformers import AutoModelForSequenceClassification, AutoTokenizer
+                artifacts.save_roberta(AutoModelForSequenceClassification.from_pretrained(path),
+                                       AutoTokenizer.from_pretrained(path), path)
+                if os.path.exists(os.path.join(path, 'pytorch_model.bin')):
+                    os.remove(os.path.join(path, 'pytorch_model.bin'))
+                self.stdout.write(f"{name} -> {os.path.join(path, artifacts.SAFETENSORS_FILE)}")
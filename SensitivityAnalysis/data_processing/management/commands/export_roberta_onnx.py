@@ -0,0 +1,59 @@
+# data_processing/management/commands/export_roberta_onnx.py
+# python manage.py export_roberta_onnx [--no-quantize] [--eval-data CSV] [--max-accuracy-drop 0.01]
+# Exports the fine-tuned RoBERTa model to ONNX (roberta_onnx) and its int8 dynamically quantized copy
+# (roberta_int8), then checks them against the PyTorch fp32 model on the held-out split of a labelled CSV
+# and prints the accuracy / latency / throughput table (data_processing.benchmark_onnx).
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data_processing import artifacts, benchmark_onnx, onnx_inference
+from data_processing.model_registry import MODEL_CATALOG
+
+
+class Command(BaseCommand):
+    help = "Exports RoBERTa to ONNX fp32 and int8 for CPU serving and checks their accuracy against fp32 PyTorch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=MODEL_CATALOG.path('roberta'),
+                            help="Directory of the fine-tuned transformers model.")
+        parser.add_argument('--output', default=os.path.dirname(MODEL_CATALOG.path('roberta_onnx')),
+                            help="Directory the ONNX models are written to.")
+        parser.add_argument('--opset', type=int, default=onnx_inference.ONNX_OPSET)
+        parser.add_argument('--no-quantize', action='store_true', help="Only write the fp32 ONNX model.")
+        parser.add_argument('--skip-check', action='store_true', help="Skip the accuracy check and benchmark.")
+        parser.add_argument('--eval-data', default=benchmark_onnx.DEFAULT_EVAL_DATA,
+                            help="CSV with Comment and Sentiment columns; its 20%% test split is used.")
+        parser.add_argument('--eval-limit', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--max-accuracy-drop', type=float, default=0.01,
+                            help="Fail if an exported model is less accurate than fp32 PyTorch by more than this.")
+
+    def handle(self, *args, **options):
+        from transformers import AutoTokenizer
+
+        if not os.path.isdir(options['source']):
+            raise CommandError(f"No RoBERTa model in {options['source']}")
+        tokenizer = AutoTokenizer.from_pretrained(options['source'])
+        model = artifacts.load_roberta_model(options['source'])
+
+        exported = [('onnx fp32', onnx_inference.export_onnx(model, tokenizer, options['output'], options['opset']))]
+        if not options['no_quantize']:
+            exported.append(('onnx int8', onnx_inference.quantize_onnx(exported[0][1])))
+        for name, path in exported:
+            self.stdout.write(f"{name} -> {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)")
+
+        if options['skip_check']:
+            return
+        texts, labels = benchmark_onnx.load_held_out(options['eval_data'], options['eval_limit'])
+        backends = [('pytorch fp32', model)] + [(name, onnx_inference.OnnxSequenceClassifier(path))
+                                                for name, path in exported]
+        rows = benchmark_onnx.compare_backends(backends, tokenizer, texts, labels, options['batch_size'])
+        self.stdout.write(f"\nHeld-out set: {len(texts)} comments\n" + benchmark_onnx.format_table(rows))
+
+        reference = rows[0]['accuracy']
+        regressions = [r for r in rows[1:] if r['accuracy'] < reference - options['max_accuracy_drop']]
+        if regressions:
+            raise CommandError("Accuracy regression: " + ", ".join(
+                f"{r['backend']} {r['accuracy']} vs {reference}" for r in regressions))
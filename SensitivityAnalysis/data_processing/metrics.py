@@ -0,0 +1,112 @@
+# data_processing/metrics.py
+# Prometheus metrics of the analysis pipeline (prometheus_client), served by /metrics together with the
+# YouTube API and translation metrics of youtube_integration.metrics.
+#
+# - sentiment_stage_duration_seconds{stage, model}: every pipeline stage call (fetch, translate, classify and
+#   its preprocess / vectorize / predict steps, store, metadata, report)
+# - sentiment_comments_classified_total{model}: comments/s per model is its rate()
+# - sentiment_jobs_total{kind, status} and sentiment_job_duration_seconds{kind}: background jobs
+# - sentiment_cache_lookups_total{cache, result}: result cache; the preprocessing LRU caches (hit on every
+#   token) are read from their own counters when scraped instead of being counted one lookup at a time
+#
+# JobTimings records a stage in the histogram and in the analysis' own timing breakdown, which is saved in
+# its report ('timings'). With several server processes, set PROMETHEUS_MULTIPROC_DIR (prometheus_client
+# multiprocess mode) and /metrics merges the metric files of all of them.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+import youtube_integration.metrics  # noqa: F401 (registers the API and translation metrics)
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+JOB_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+STAGE_SECONDS = Histogram('sentiment_stage_duration_seconds', "Duration of one call of an analysis pipeline stage.",
+                          ['stage', 'model'], buckets=STAGE_BUCKETS)
+COMMENTS_CLASSIFIED = Counter('sentiment_comments_classified_total', "Comments classified, by model.", ['model'])
+JOBS = Counter('sentiment_jobs_total', "Finished background jobs by kind (analysis, batch, compare) and status.",
+               ['kind', 'status'])
+JOB_SECONDS = Histogram('sentiment_job_duration_seconds', "Run time of background jobs.", ['kind'],
+                        buckets=JOB_BUCKETS)
+CACHE_LOOKUPS = Counter('sentiment_cache_lookups_total', "Cache lookups by cache and result (hit, miss).",
+                        ['cache', 'result'])
+
+
+class JobTimings:
+    """
+    Time, calls and comments per stage of one analysis. Stages running in the pipeline threads add to it
+    concurrently; every call is also observed in STAGE_SECONDS.
+    """
+
+    def __init__(self, model_name=''):
+        self.model_name = model_name
+        self._stages = {}  # stage -> [calls, seconds, items]
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, items=0, model=None):
+        """model: the stage ran for another model than the job's (compare mode), kept as 'stage:model'."""
+        STAGE_SECONDS.labels(stage, model or self.model_name).observe(seconds)
+        key = f"{stage}:{model}" if model else stage
+        with self._lock:
+            entry = self._stages.setdefault(key, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += items
+
+    @contextmanager
+    def time(self, stage, items=0, model=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, items, model)
+
+    def breakdown(self):
+        """{stage: {'calls', 'seconds', 'items', 'items_per_sec'}} in the order the stages first ran."""
+        with self._lock:
+            return {
+                stage: {'calls': calls, 'seconds': round(seconds, 3), 'items': items,
+                        'items_per_sec': round(items / seconds, 1) if seconds and items else None}
+                for stage, (calls, seconds, items) in self._stages.items()
+            }
+
+
+class PreprocessingCacheCollector:
+    """Hits, misses and size of the preprocessing LRU caches, read when /metrics is scraped."""
+
+    def collect(self):
+        from data_processing import preprocessing_text
+
+        lookups = CounterMetricFamily('preprocessing_cache_lookups', "Preprocessing cache lookups (this process).",
+                                      labels=['cache', 'result'])
+        entries = GaugeMetricFamily('preprocessing_cache_entries', "Entries in the preprocessing caches "
+                                    "(this process).", labels=['cache'])
+        for name, info in preprocessing_text.cache_info().items():
+            if not isinstance(info, dict):
+                continue  # lemma_mode
+            lookups.add_metric([name, 'hit'], info['hits'])
+            lookups.add_metric([name, 'miss'], info['misses'])
+            entries.add_metric([name], info['size'])
+        yield lookups
+        yield entries
+
+
+_preprocessing_collector = PreprocessingCacheCollector()
+REGISTRY.register(_preprocessing_collector)
+
+
+def exposition():
+    """(body, content type) of the Prometheus text format with every metric of the project."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_preprocessing_collector)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
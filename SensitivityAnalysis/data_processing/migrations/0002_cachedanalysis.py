@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=32)),
+                ('model_name', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=64)),
+                ('stats', models.JSONField()),
+                ('predictions', models.JSONField(default=list)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('video_id', 'model_name', 'model_version'), name='unique_cached_analysis')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0002_cachedanalysis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=32)),
+                ('model_name', models.CharField(max_length=64)),
+                ('model_version', models.CharField(max_length=64)),
+                ('sentiment_counts', models.JSONField(default=dict)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('video_id', 'model_name', 'model_version'), name='unique_video_analysis')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AnalyzedComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment_id', models.CharField(max_length=64)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('text', models.TextField()),
+                ('label', models.PositiveSmallIntegerField()),
+                ('analysis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='data_processing.videoanalysis')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['analysis', 'published_at'], name='data_proces_analysi_ab6617_idx')],
+                'constraints': [models.UniqueConstraint(fields=('analysis', 'comment_id'), name='unique_analyzed_comment')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0003_videoanalysis_analyzedcomment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='complete',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0004_videoanalysis_complete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='report',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='analyzedcomment',
+            index=models.Index(fields=['analysis', 'label', 'published_at'], name='data_proces_analysi_0ecff2_idx'),
+        ),
+    ]
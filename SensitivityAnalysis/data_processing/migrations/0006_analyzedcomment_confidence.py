@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0005_videoanalysis_report_comment_label_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyzedcomment',
+            name='confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0006_analyzedcomment_confidence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='batch',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='analysisjob',
+            name='video_id',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
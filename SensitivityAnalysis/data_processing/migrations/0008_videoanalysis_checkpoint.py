@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0007_analysisjob_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='checkpoint',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
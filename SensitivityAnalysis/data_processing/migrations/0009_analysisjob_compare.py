@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0008_videoanalysis_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='compare',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
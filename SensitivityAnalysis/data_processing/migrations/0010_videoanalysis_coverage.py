@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0009_analysisjob_compare'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='videoanalysis',
+            name='unique_video_analysis',
+        ),
+        migrations.AddField(
+            model_name='videoanalysis',
+            name='coverage',
+            field=models.CharField(choices=[('full', 'Full'), ('capped', 'Capped')], default='full', max_length=16),
+        ),
+        migrations.AddConstraint(
+            model_name='videoanalysis',
+            constraint=models.UniqueConstraint(fields=('video_id', 'model_name', 'model_version', 'coverage'), name='unique_video_analysis'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0010_videoanalysis_coverage'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='cachedanalysis',
+            name='unique_cached_analysis',
+        ),
+        migrations.AddField(
+            model_name='cachedanalysis',
+            name='coverage',
+            field=models.CharField(default='full', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='videoanalysis',
+            name='coverage',
+            field=models.CharField(choices=[('full', 'Full'), ('capped', 'Capped'), ('sample', 'Sample')], default='full', max_length=16),
+        ),
+        migrations.AddConstraint(
+            model_name='cachedanalysis',
+            constraint=models.UniqueConstraint(fields=('video_id', 'model_name', 'model_version', 'coverage'), name='unique_cached_analysis'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_processing', '0012_videoanalysis_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='worker',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,237 @@
+# data_processing/model_registry.py
+# Registry of the sentiment models, loaded on demand.
+#
+# The manifest lists every model and the files behind it, so the available models are known
+# without loading anything (a model is available when its files exist). A model is loaded the
+# first time it is used, together with the artifacts it requires (TF-IDF vectorizer, RoBERTa
+# tokenizer). With MODEL_MEMORY_BUDGET_MB set, the least recently used artifacts are unloaded
+# once the loaded ones exceed the budget (sizes estimated from the files on disk).
+# The RoBERTa model is also served as ONNX fp32/int8 (data_processing.onnx_inference).
+# Loading the PyTorch RoBERTa model sets the torch CPU threads of the process (ROBERTA_NUM_THREADS).
+# MODEL_WARMUP lists models loaded in a background thread when the app starts.
+# Entries without a path combine the models they require (the 'cascade' model, data_processing.cascade):
+# their loader gets the manifest entry, and they are available when their requirements are.
+# Artifacts are memory-mapped (data_processing.artifacts), so worker processes share their arrays.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from django.conf import settings
+
+from data_processing import artifacts, cascade, onnx_inference
+
+MODEL_DIR = os.path.join(settings.BASE_DIR, 'data_processing', 'colab_train_models', 'models')
+MEMORY_BUDGET_MB = getattr(settings, 'MODEL_MEMORY_BUDGET_MB', None)
+WARMUP_MODELS = getattr(settings, 'MODEL_WARMUP', [])
+ROBERTA_NUM_THREADS = getattr(settings, 'ROBERTA_NUM_THREADS', None)
+
+# name -> loader, path (relative to MODEL_DIR), artifacts it needs, and whether users can pick it
+DEFAULT_MANIFEST = {
+    'tfidf_vectorizer': {'loader': 'tfidf_compact', 'path': 'tfidf_vectorizer', 'selectable': False},
+    'logistic_regression': {'loader': 'joblib', 'path': 'logistic_regression_model.joblib',
+                            'requires': ['tfidf_vectorizer']},
+    'naive_bayes': {'loader': 'joblib', 'path': 'naive_model.joblib', 'requires': ['tfidf_vectorizer']},
+    'svc': {'loader': 'joblib', 'path': 'svc_model.joblib', 'requires': ['tfidf_vectorizer']},
+    'roberta_tokenizer': {'loader': 'hf_tokenizer', 'path': 'roberta_model', 'selectable': False},
+    'roberta': {'loader': 'hf_model', 'path': 'roberta_model', 'requires': ['roberta_tokenizer']},
+    # written by `python manage.py export_roberta_onnx`
+    'roberta_onnx': {'loader': 'onnx_model', 'path': 'roberta_onnx/model.onnx', 'requires': ['roberta_tokenizer']},
+    'roberta_int8': {'loader': 'onnx_model', 'path': 'roberta_onnx/model_int8.onnx',
+                     'requires': ['roberta_tokenizer']},
+    # requires: [fast model, expert model]; comments below the threshold go to the expert
+    'cascade': {'loader': 'cascade', 'requires': [cascade.FAST_MODEL, cascade.EXPERT_MODEL],
+                'threshold': cascade.THRESHOLD},
+}
+MANIFEST = getattr(settings, 'MODEL_MANIFEST', DEFAULT_MANIFEST)
+
+
+def _load_hf_tokenizer(path):
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(path)
+
+
+def _load_hf_model(path):
+    from data_processing.roberta_inference import set_num_threads
+    set_num_threads(ROBERTA_NUM_THREADS)  # process-wide, so here rather than around every prediction
+    return artifacts.load_roberta_model(path)
+
+
+LOADERS = {
+    'joblib': artifacts.load_model,
+    'tfidf_compact': artifacts.load_vectorizer,
+    'hf_tokenizer': _load_hf_tokenizer,
+    'hf_model': _load_hf_model,
+    'onnx_model': onnx_inference.load_onnx_model,
+    'cascade': cascade.load_cascade,
+}
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return [os.path.join(path, f) for f in sorted(os.listdir(path))]
+    return [path] if os.path.isfile(path) else []
+
+
+class ModelRegistry(Mapping):
+    """
+    Read-only mapping of the selectable, available models: `name in registry` and keys() only look at
+    the manifest and the files; registry[name] loads the model (and what it requires) on first use.
+    Other artifacts (e.g. 'tfidf_vectorizer') are loaded with load(name).
+    """
+
+    def __init__(self, manifest, model_dir=MODEL_DIR, memory_budget_mb=MEMORY_BUDGET_MB):
+        self.manifest = manifest
+        self.model_dir = model_dir
+        self.memory_budget_mb = memory_budget_mb
+        self.loads = 0
+        self.evictions = 0
+        self._loaded = OrderedDict()  # name -> (object, estimated MB), least recently used first
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in manifest}
+
+    def path(self, name):
+        if 'path' not in self.manifest[name]:
+            return None
+        return os.path.join(self.model_dir, self.manifest[name]['path'])
+
+    def files(self, name):
+        """Files behind an artifact and the artifacts it requires."""
+        entry = self.manifest[name]
+        paths = []
+        for required in entry.get('requires', []):
+            paths.extend(self.files(required))
+        own = _files(self.path(name)) if 'path' in entry else []
+        return list(dict.fromkeys(paths + own))  # RoBERTa model and tokenizer share a directory
+
+    def is_available(self, name):
+        entry = self.manifest.get(name)
+        if entry is None:
+            return False
+        has_files = 'path' not in entry or bool(_files(self.path(name)))
+        return has_files and all(self.is_available(r) for r in entry.get('requires', []))
+
+    def size_mb(self, name):
+        if 'path' not in self.manifest[name]:
+            return 0.0
+        return sum(os.path.getsize(f) for f in _files(self.path(name))) / (1024 * 1024)
+
+    # Mapping interface: selectable models only
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        return self.load(name)
+
+    def __contains__(self, name):
+        entry = self.manifest.get(name)
+        return entry is not None and entry.get('selectable', True) and self.is_available(name)
+
+    def __iter__(self):
+        return (name for name in self.manifest if name in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def load(self, name):
+        """Returns the loaded artifact, loading it and its requirements if needed."""
+        for required in self.manifest[name].get('requires', []):
+            self.load(required)
+
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name][0]
+
+        with self._load_locks[name]:  # one thread loads, the others wait for it
+            with self._lock:
+                if name in self._loaded:
+                    return self._loaded[name][0]
+            start = time.time()
+            entry = self.manifest[name]
+            obj = LOADERS[entry['loader']](self.path(name) if 'path' in entry else entry)
+            logging.info(f"Loaded model {name} in {round(time.time() - start, 2)}s")
+            with self._lock:
+                self._loaded[name] = (obj, self.size_mb(name))
+                self.loads += 1
+                self._evict(keep={name, *self.manifest[name].get('requires', [])})
+            return obj
+
+    def _evict(self, keep):
+        if self.memory_budget_mb is None:
+            return
+        for name in list(self._loaded):
+            if self.loaded_mb() <= self.memory_budget_mb:
+                break
+            if name not in keep:
+                # objects still used by a running analysis stay alive until it drops them
+                del self._loaded[name]
+                self.evictions += 1
+                logging.info(f"Unloaded model {name} (memory budget {self.memory_budget_mb} MB)")
+
+    def unload(self, name):
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._loaded)
+
+    def loaded_mb(self):
+        return sum(size for _, size in self._loaded.values())
+
+    def warmup(self, names=None, background=True):
+        """Loads the given models (all available ones by default), in a daemon thread if background."""
+        names = [n for n in (names if names is not None else list(self)) if n in self]
+
+        def _run():
+            for name in names:
+                try:
+                    self.load(name)
+                except Exception as e:
+                    logging.warning(f"Warmup of model {name} failed: {e}")
+
+        if not background:
+            _run()
+            return None
+        thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def info(self):
+        with self._lock:
+            return {'loaded': list(self._loaded), 'loaded_mb': round(self.loaded_mb(), 1),
+                    'budget_mb': self.memory_budget_mb, 'loads': self.loads, 'evictions': self.evictions}
+
+
+MODEL_CATALOG = ModelRegistry(MANIFEST)
+
+
+def uses_tfidf(model_name):
+    """Classifiers of the TF-IDF matrix (one matrix can be shared by all of them, see views.classify_texts_multi)."""
+    return 'tfidf_vectorizer' in MODEL_CATALOG.manifest.get(model_name, {}).get('requires', [])
+
+
+def is_transformer(model_name):
+    """RoBERTa models (PyTorch or ONNX) classify raw texts through the RoBERTa tokenizer, not the TF-IDF pipeline."""
+    return 'roberta_tokenizer' in MODEL_CATALOG.manifest.get(model_name, {}).get('requires', [])
+
+
+def get_model_version(model_name):
+    """Short fingerprint (name, size, mtime) of the files behind a model, it changes whenever the model is retrained."""
+    paths = MODEL_CATALOG.files(model_name) if model_name in MODEL_CATALOG.manifest else []
+
+    fingerprint = hashlib.sha1(model_name.encode())
+    entry = MODEL_CATALOG.manifest.get(model_name, {})
+    if entry and 'path' not in entry:
+        # combined models: their settings (e.g. the cascade threshold) change the results too
+        fingerprint.update(json.dumps(entry, sort_keys=True, default=str).encode())
+    for path in paths:
+        if os.path.isfile(path):
+            st = os.stat(path)
+            fingerprint.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return fingerprint.hexdigest()[:12]
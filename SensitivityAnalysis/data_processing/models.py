@@ -1,3 +1,132 @@
 from django.db import models
 
-# Create your models here.
+
+class AnalysisJob(models.Model):
+    """One submitted analysis (video + model). Workers from data_processing.jobs run it in the background."""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+    video_id = models.CharField(max_length=32, blank=True)
+    model_name = models.CharField(max_length=64)
+    # batch analysis (data_processing.batch): videos / playlist / channel / comments_per_video, video_id is empty
+    batch = models.JSONField(null=True, blank=True)
+    # compare mode (data_processing.compare): models / max_comments, model_name is 'compare'
+    compare = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    step = models.CharField(max_length=255, default='Queued...')
+    cancel_requested = models.BooleanField(default=False)
+    # "host:pid" of the server process whose in-memory queue holds the job (data_processing.jobs)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.video_id or 'batch'} [{self.model_name}] {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in self.FINISHED_STATUSES
+
+    def status_payload(self):
+        return {
+            'job_id': self.pk,
+            'status': self.status,
+            'progress': self.progress,
+            'step': self.step,
+            'error': self.error,
+        }
+
+
+class CachedAnalysis(models.Model):
+    """Finished analysis of one video, reused by data_processing.result_cache for repeated submissions."""
+    video_id = models.CharField(max_length=32)
+    model_name = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=64)
+    # VideoAnalysis.coverage of the cached analysis: a sample never answers a lookup for the full analysis
+    coverage = models.CharField(max_length=16, default='full')
+    stats = models.JSONField()
+    predictions = models.JSONField(default=list)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video_id', 'model_name', 'model_version', 'coverage'],
+                                    name='unique_cached_analysis'),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id} [{self.model_name}@{self.model_version}]"
+
+
+class VideoAnalysis(models.Model):
+    """Running aggregates of every comment analysed so far for a video with a given model (incremental mode)."""
+    # full: every comment (up to PRO_COMMENT_LIMIT), continued by later runs and cached by result_cache;
+    # capped: the first max_comments by relevance (batch mode), never continued nor cached as a full analysis;
+    # sample: sampling mode (data_processing.sampling), shares are estimates, cached under its own coverage
+    COVERAGE_FULL = 'full'
+    COVERAGE_CAPPED = 'capped'
+    COVERAGE_SAMPLE = 'sample'
+    COVERAGE_CHOICES = [(COVERAGE_FULL, 'Full'), (COVERAGE_CAPPED, 'Capped'), (COVERAGE_SAMPLE, 'Sample')]
+
+    video_id = models.CharField(max_length=32)
+    model_name = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=64)
+    sentiment_counts = models.JSONField(default=dict)
+    comment_count = models.PositiveIntegerField(default=0)
+    complete = models.BooleanField(default=True)
+    report = models.JSONField(null=True, blank=True)  # summary shown by results_dashboard (no per-comment data)
+    # paging position of an unfinished run {'order', 'page_token', 'fetched'}: an interrupted run resumes there
+    checkpoint = models.JSONField(null=True, blank=True)
+    coverage = models.CharField(max_length=16, choices=COVERAGE_CHOICES, default=COVERAGE_FULL)
+    # job running the unfinished run (None outside the job queue): its checkpoint is only resumed once the job
+    # is no longer queued or running
+    owner = models.ForeignKey(AnalysisJob, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['video_id', 'model_name', 'model_version', 'coverage'],
+                                    name='unique_video_analysis'),
+        ]
+
+    def __str__(self):
+        return f"{self.video_id} [{self.model_name}@{self.model_version}] {self.comment_count} comments"
+
+
+class AnalyzedComment(models.Model):
+    """One classified comment of a VideoAnalysis; its id tells the next run where to stop paging."""
+    analysis = models.ForeignKey(VideoAnalysis, on_delete=models.CASCADE, related_name='comments')
+    comment_id = models.CharField(max_length=64)
+    published_at = models.DateTimeField(null=True, blank=True)
+    text = models.TextField()
+    label = models.PositiveSmallIntegerField()
+    confidence = models.FloatField(null=True, blank=True)  # probability of the label, None if the model has none
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['analysis', 'comment_id'], name='unique_analyzed_comment'),
+        ]
+        indexes = [
+            models.Index(fields=['analysis', 'published_at']),
+            models.Index(fields=['analysis', 'label', 'published_at']),
+        ]
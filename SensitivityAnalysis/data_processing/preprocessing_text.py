@@ -1,14 +1,41 @@
 # data_processing/preprocessing_text.py
+# spaCy (which imports torch through thinc) is imported on first use, so importing this module is cheap.
 
-# StopWords
-from spacy.lang.en.stop_words import STOP_WORDS
+import os
 import re
-import spacy
+import threading
+import time
+from collections import OrderedDict
 from string import punctuation
 
-stopwords_set = set(STOP_WORDS)
+import joblib
+
+# StopWords: final_stopwords / stopwords_set are built from spaCy's list on first access (module __getattr__)
 exclude_words = {'no', 'not', 'never', 'neither', 'nor', 'none', 'cannot'}
-final_stopwords = list(stopwords_set - exclude_words)
+_final_stopwords = None
+
+
+def get_stopwords():
+    global _final_stopwords
+    if _final_stopwords is None:
+        from spacy.lang.en.stop_words import STOP_WORDS
+        # frozenset: O(1) membership test for every lemma
+        _final_stopwords = frozenset(set(STOP_WORDS) - exclude_words)
+    return _final_stopwords
+
+
+def __getattr__(name):
+    if name == 'final_stopwords':
+        return get_stopwords()
+    if name == 'stopwords_set':
+        from spacy.lang.en.stop_words import STOP_WORDS
+        return set(STOP_WORDS)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# nlp.pipe defaults for tokenize_batch
+PIPE_BATCH_SIZE = 256
+PIPE_N_PROCESS = 1
 
 
 def clean_text(text):
@@ -22,18 +49,214 @@ def clean_text(text):
 
     return temp
 
-# Lematization:
-try:
-    nlp = spacy.load("en_core_web_sm", disable=['parser', 'ner'])
-except OSError:
-    print("Pobieranie modelu językowego spaCy (en_core_web_sm)...")
-    from spacy.cli import download
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm", disable=['parser', 'ner'])
+# Lematization: the spaCy model is loaded on first use (get_nlp), not when the module is imported
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    global _nlp
+    with _nlp_lock:
+        if _nlp is None:
+            import spacy
+            try:
+                _nlp = spacy.load("en_core_web_sm", disable=['parser', 'ner'])
+            except OSError:
+                print("Pobieranie modelu językowego spaCy (en_core_web_sm)...")
+                from spacy.cli import download
+                download("en_core_web_sm")
+                _nlp = spacy.load("en_core_web_sm", disable=['parser', 'ner'])
+        return _nlp
+
+
+# --- CACHES ---
+# Comment sections repeat a lot ("first", emoji-only replies, copy-pasted spam), so the
+# result of clean_text + spaCy is memoized per cleaned text. In "token" lemma mode every
+# word is lemmatized out of context and cached per word instead of running spaCy per comment.
+TEXT_CACHE_SIZE = 50000
+TOKEN_CACHE_SIZE = 100000
+LEMMA_MODE = "context"  # "context" (spaCy on whole comment) or "token" (cached per-word lemmas)
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that drops the least recently used key, with hit/miss counters."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0  # keys added since the start (not reset by clear, used to decide when to save)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if key not in self._data:
+                self.writes += 1
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+text_cache = LRUCache(TEXT_CACHE_SIZE)
+token_cache = LRUCache(TOKEN_CACHE_SIZE)
+
+
+def configure_cache(text_cache_size=None, token_cache_size=None, lemma_mode=None):
+    global LEMMA_MODE
+    if text_cache_size is not None:
+        text_cache.maxsize = text_cache_size
+    if token_cache_size is not None:
+        token_cache.maxsize = token_cache_size
+    if lemma_mode is not None:
+        if lemma_mode not in ("context", "token"):
+            raise ValueError(f"Unknown lemma mode: {lemma_mode}")
+        if lemma_mode != LEMMA_MODE:
+            text_cache.clear()  # cached token lists depend on the mode
+        LEMMA_MODE = lemma_mode
+
+
+def cache_info():
+    return {"text_cache": text_cache.info(), "token_cache": token_cache.info(), "lemma_mode": LEMMA_MODE}
+
+
+# Saving writes the whole cache, so it is not done after every analysis: save_cache_if_due saves once
+# `interval` seconds passed since the last save, or sooner once `min_changes` keys were added.
+_save_lock = threading.Lock()
+_saved = {"time": time.monotonic(), "writes": 0}
+
+
+def _writes():
+    return text_cache.writes + token_cache.writes
+
+
+def save_cache(path):
+    """Writes both caches to disk, e.g. to warm up other worker processes with load_cache()."""
+    with _save_lock:  # one dump at a time per process
+        writes = _writes()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump({"lemma_mode": LEMMA_MODE, "text": text_cache.items(), "token": token_cache.items()}, tmp_path)
+        os.replace(tmp_path, path)  # readers never see a half-written file
+        _saved.update(time=time.monotonic(), writes=writes)
+
+
+def save_cache_if_due(path, interval, min_changes):
+    """save_cache(path) if keys were added and the interval passed or min_changes were added; True if saved."""
+    changes = _writes() - _saved["writes"]
+    if changes <= 0 or (changes < min_changes and time.monotonic() - _saved["time"] < interval):
+        return False
+    if _save_lock.locked():
+        return False  # another thread is saving right now
+    save_cache(path)
+    return True
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return False
+    data = joblib.load(path)
+    if data.get("lemma_mode") == LEMMA_MODE:
+        for key, value in data.get("text", []):
+            text_cache.put(key, value)
+    for key, value in data.get("token", []):
+        token_cache.put(key, value)
+    _saved["writes"] = _writes()  # already on disk
+    return True
+
+
+def _filter_lemmas(doc, stopwords):
+    return [lemma for lemma in (token.lemma_ for token in doc) if lemma not in stopwords and len(lemma) > 2]
+
+
+def _token_mode_tokens(cleaned_texts, batch_size, n_process):
+    # out-of-context lemmas: each distinct word goes through spaCy once, then comes from token_cache
+    words = {w for text in cleaned_texts for w in text.split()}
+    lemmas = {}
+    missing = []
+    for w in words:
+        cached = token_cache.get(w)
+        if cached is None:
+            missing.append(w)
+        else:
+            lemmas[w] = cached
+    for w, doc in zip(missing, get_nlp().pipe(missing, batch_size=batch_size, n_process=n_process)):
+        lemmas[w] = tuple(token.lemma_ for token in doc)
+        token_cache.put(w, lemmas[w])
+
+    stopwords = get_stopwords()
+    return [
+        tuple(lemma for w in text.split() for lemma in lemmas[w] if lemma not in stopwords and len(lemma) > 2)
+        for text in cleaned_texts
+    ]
+
+
+def _tokenize_cleaned(cleaned_texts, batch_size, n_process):
+    # token tuples for the given cleaned texts; only texts missing from text_cache are processed
+    results = [text_cache.get(t) for t in cleaned_texts]
+    missing = list(dict.fromkeys(t for t, r in zip(cleaned_texts, results) if r is None))
+
+    if missing:
+        if LEMMA_MODE == "token":
+            computed = _token_mode_tokens(missing, batch_size, n_process)
+        else:
+            stopwords = get_stopwords()
+            computed = [tuple(_filter_lemmas(doc, stopwords))
+                        for doc in get_nlp().pipe(missing, batch_size=batch_size, n_process=n_process)]
+        fresh = dict(zip(missing, computed))
+        for t, tokens in fresh.items():
+            text_cache.put(t, tokens)
+        results = [r if r is not None else fresh[t] for t, r in zip(cleaned_texts, results)]
+
+    return results
+
 
 #Final function
 def text_tokenizer(text):
     cleaned_text = clean_text(text)
-    doc = nlp(cleaned_text)
-    lemmas = [token.lemma_ for token in doc]
-    return [lemma for lemma in lemmas if lemma not in final_stopwords and len(lemma) > 2]
\ No newline at end of file
+    return list(_tokenize_cleaned([cleaned_text], 1, 1)[0])
+
+
+def tokenize_batch(texts, batch_size=PIPE_BATCH_SIZE, n_process=PIPE_N_PROCESS):
+    """
+    Batch version of text_tokenizer: cleans every text, lemmatizes the ones not in the cache
+    with nlp.pipe (each distinct text once) and yields one token list per text, in input order.
+    """
+    cleaned = [clean_text(t) for t in texts]
+    for tokens in _tokenize_cleaned(cleaned, batch_size, n_process):
+        yield list(tokens)
+
+
+def split_tokens(text):
+    # tokenizer of the TF-IDF vectorizer: input is already cleaned, lemmatized and joined with spaces
+    return text.split()
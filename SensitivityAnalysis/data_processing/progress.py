@@ -0,0 +1,124 @@
+# data_processing/progress.py
+# Progress channel of the running analysis jobs.
+#
+# Every progress tick of a job is published to a small cache entry keyed by the job id (Django cache
+# ANALYSIS_PROGRESS_CACHE) instead of being written to the AnalysisJob row; the row is only updated every
+# ANALYSIS_PROGRESS_DB_INTERVAL seconds and when the job finishes (data_processing.jobs). /analyze-status/
+# reads the cache entry, /analyze-events/ pushes it to the loading page as Server-Sent Events.
+# Readers in the worker's process are woken up as soon as a job publishes; readers in other processes
+# (or with no cache entry, e.g. after a restart) re-check every STREAM_POLL_INTERVAL seconds, falling back to the row.
+# Every job being watched has its own channel (condition + publish counter), so a publish only wakes up the
+# readers of that job, and the payload is read outside the channel's lock.
+
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from data_processing.models import AnalysisJob
+
+PROGRESS_CACHE = getattr(settings, 'ANALYSIS_PROGRESS_CACHE', 'default')
+DB_WRITE_INTERVAL = getattr(settings, 'ANALYSIS_PROGRESS_DB_INTERVAL', 2.0)
+STREAM_TIMEOUT = getattr(settings, 'ANALYSIS_PROGRESS_STREAM_TIMEOUT', 15 * 60)
+STREAM_POLL_INTERVAL = 1.0
+STREAM_HEARTBEAT = 15.0
+ENTRY_TTL = 60 * 60
+
+_channels = {}  # job id -> _Channel, while someone waits for the job
+_channels_lock = threading.Lock()
+
+
+class _Channel:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0  # publishes seen since the channel was opened
+        self.readers = 0
+
+
+def _key(job_id):
+    return f"analysis-progress:{job_id}"
+
+
+def _cancel_key(job_id):
+    return f"analysis-cancel:{job_id}"
+
+
+def publish(job_id, payload):
+    """Stores the latest status payload of the job (AnalysisJob.status_payload() format) and wakes up readers."""
+    caches[PROGRESS_CACHE].set(_key(job_id), payload, ENTRY_TTL)
+    with _channels_lock:
+        channel = _channels.get(job_id)
+    if channel is not None:
+        with channel.condition:
+            channel.version += 1
+            channel.condition.notify_all()
+
+
+def current(job_id):
+    """Latest status payload of the job: the published one, else the AnalysisJob row; None for unknown jobs."""
+    payload = caches[PROGRESS_CACHE].get(_key(job_id))
+    if payload is None:
+        job = AnalysisJob.objects.filter(pk=job_id).first()
+        payload = job.status_payload() if job is not None else None
+    return payload
+
+
+def request_cancel(job_id):
+    caches[PROGRESS_CACHE].set(_cancel_key(job_id), True, ENTRY_TTL)
+
+
+def cancel_requested(job_id):
+    return bool(caches[PROGRESS_CACHE].get(_cancel_key(job_id)))
+
+
+def _open_channel(job_id):
+    with _channels_lock:
+        channel = _channels.setdefault(job_id, _Channel())
+        channel.readers += 1
+        return channel
+
+
+def _close_channel(job_id, channel):
+    with _channels_lock:
+        channel.readers -= 1
+        if not channel.readers:
+            _channels.pop(job_id, None)
+
+
+def wait_for_change(job_id, payload, timeout=STREAM_POLL_INTERVAL):
+    """Blocks until the job's payload differs from `payload` or the timeout passes; returns the latest payload."""
+    channel = _open_channel(job_id)
+    try:
+        with channel.condition:
+            version = channel.version
+        latest = current(job_id)  # the version is taken first, so a publish from now on is not missed
+        if latest == payload:
+            with channel.condition:
+                channel.condition.wait_for(lambda: channel.version != version, timeout)
+            latest = current(job_id)
+        return latest
+    finally:
+        _close_channel(job_id, channel)
+
+
+def event_stream(job_id, timeout=STREAM_TIMEOUT):
+    """Server-Sent Events with the job's payload on every change, until the job finishes or the timeout passes."""
+    deadline = time.monotonic() + timeout
+    last_sent = time.monotonic()
+    payload = current(job_id)
+    yield f"retry: {int(STREAM_POLL_INTERVAL * 1000)}\n\n"
+    while payload is not None:
+        yield f"data: {json.dumps(payload)}\n\n"
+        last_sent = time.monotonic()
+        if payload['status'] in AnalysisJob.FINISHED_STATUSES:
+            return
+        previous = payload
+        while payload == previous and time.monotonic() < deadline:
+            payload = wait_for_change(job_id, previous)
+            if payload == previous and time.monotonic() - last_sent >= STREAM_HEARTBEAT:
+                yield ": keep-alive\n\n"  # comment line, keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+        if payload == previous:
+            return
@@ -0,0 +1,88 @@
+# data_processing/result_cache.py
+# Persistent cache of finished analyses, keyed on (video_id, model_name, model_version, coverage);
+# coverage is 'full' or 'sample' (sampling mode estimates, see VideoAnalysis.coverage).
+#
+# Entries live in the CachedAnalysis table, expire after ANALYSIS_CACHE_TTL seconds and
+# the table is kept below ANALYSIS_CACHE_MAX_ENTRIES rows by dropping the least recently
+# used entries. Hit/miss counters are kept per process (see cache_stats()) and in data_processing.metrics.
+
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from data_processing import metrics
+from data_processing.models import CachedAnalysis
+
+CACHE_TTL = getattr(settings, 'ANALYSIS_CACHE_TTL', 6 * 60 * 60)
+CACHE_MAX_ENTRIES = getattr(settings, 'ANALYSIS_CACHE_MAX_ENTRIES', 200)
+
+_counters = {'hits': 0, 'misses': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(key):
+    with _counters_lock:
+        _counters[key] += 1
+    metrics.CACHE_LOOKUPS.labels('analysis', 'hit' if key == 'hits' else 'miss').inc()
+
+
+def _expiry_cutoff():
+    return timezone.now() - timedelta(seconds=CACHE_TTL)
+
+
+def get_cached(video_id, model_name, model_version, coverage='full'):
+    """Returns the CachedAnalysis for the key or None (missing or expired)."""
+    entry = CachedAnalysis.objects.filter(
+        video_id=video_id, model_name=model_name, model_version=model_version, coverage=coverage
+    ).first()
+    if entry is None:
+        _count('misses')
+        return None
+    if entry.created_at < _expiry_cutoff():
+        entry.delete()
+        _count('misses')
+        return None
+
+    CachedAnalysis.objects.filter(pk=entry.pk).update(last_accessed=timezone.now(), hits=F('hits') + 1)
+    _count('hits')
+    return entry
+
+
+def store(video_id, model_name, model_version, stats, predictions, coverage='full'):
+    entry, _ = CachedAnalysis.objects.update_or_create(
+        video_id=video_id, model_name=model_name, model_version=model_version, coverage=coverage,
+        defaults={
+            'stats': stats,
+            'predictions': [int(p) for p in predictions],
+            'hits': 0,
+            'created_at': timezone.now(),
+            'last_accessed': timezone.now(),
+        },
+    )
+    evict()
+    return entry
+
+
+def evict():
+    """Drops expired entries, then the least recently used ones above CACHE_MAX_ENTRIES."""
+    CachedAnalysis.objects.filter(created_at__lt=_expiry_cutoff()).delete()
+    stale_ids = list(
+        CachedAnalysis.objects.order_by('-last_accessed').values_list('pk', flat=True)[CACHE_MAX_ENTRIES:]
+    )
+    if stale_ids:
+        CachedAnalysis.objects.filter(pk__in=stale_ids).delete()
+
+
+def cache_stats():
+    with _counters_lock:
+        hits, misses = _counters['hits'], _counters['misses']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+        'entries': CachedAnalysis.objects.count(),
+    }
@@ -0,0 +1,66 @@
+# data_processing/results_store.py
+# Results of finished analyses, read back from the database.
+#
+# The classified comments stay in AnalyzedComment (bulk-inserted page by page by data_processing.incremental),
+# the summary shown by the dashboard is stored on the VideoAnalysis row. The session only keeps the analysis id;
+# comments are served one page at a time, optionally filtered by label (index on analysis, label, published_at).
+
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from data_processing.aggregation import IDX_TO_LABEL
+from data_processing.models import VideoAnalysis
+
+PAGE_SIZE = getattr(settings, 'RESULTS_PAGE_SIZE', 50)
+MAX_PAGE_SIZE = getattr(settings, 'RESULTS_MAX_PAGE_SIZE', 500)
+
+LABEL_TO_IDX = {name: idx for idx, name in IDX_TO_LABEL.items()}
+
+
+def save_report(analysis, stats):
+    analysis.report = stats
+    analysis.save(update_fields=['report'])
+    return analysis
+
+
+def get_analysis(analysis_id):
+    """The finished VideoAnalysis with a report, or None (unknown id, replaced by a newer full run, still running)."""
+    if not analysis_id:
+        return None
+    return VideoAnalysis.objects.filter(pk=analysis_id, complete=True, report__isnull=False).first()
+
+
+def find_analysis(video_id, model_name, model_version):
+    return VideoAnalysis.objects.filter(
+        video_id=video_id, model_name=model_name, model_version=model_version, complete=True, report__isnull=False,
+        coverage=VideoAnalysis.COVERAGE_FULL,
+    ).first()
+
+
+def comment_page(analysis, label=None, page=1, page_size=None):
+    """
+    One page of the analysis' comments, newest first. label is a name from IDX_TO_LABEL (None = all);
+    ValueError for an unknown label. Out of range page numbers give the last page.
+    """
+    page_size = max(1, min(int(page_size or PAGE_SIZE), MAX_PAGE_SIZE))
+    comments = analysis.comments.order_by('-published_at', '-pk')
+    if label:
+        if label not in LABEL_TO_IDX:
+            raise ValueError(f"Unknown label: {label}")
+        comments = comments.filter(label=LABEL_TO_IDX[label])
+
+    paginator = Paginator(comments.values_list('text', 'label', 'published_at'), page_size)
+    current = paginator.get_page(page)
+    return {
+        'label': label or None,
+        'page': current.number,
+        'page_size': page_size,
+        'num_pages': paginator.num_pages,
+        'total': paginator.count,
+        'has_next': current.has_next(),
+        'comments': [
+            {'text': text, 'label': IDX_TO_LABEL.get(idx, 'unknown'),
+             'published_at': published_at.isoformat() if published_at else None}
+            for text, idx, published_at in current.object_list
+        ],
+    }
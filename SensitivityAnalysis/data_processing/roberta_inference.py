@@ -0,0 +1,65 @@
+# data_processing/roberta_inference.py
+# Batched RoBERTa inference used by run_analysis.
+#
+# Comments are tokenized once (without padding), sorted by token length and split
+# into batches, so every batch only gets padded to its own longest comment.
+# Predictions and softmax probabilities are returned in the original input order.
+# The torch CPU thread count is process-wide, so it is set once, when the model is loaded
+# (set_num_threads, ROBERTA_NUM_THREADS), and never changed around a call: analyses run concurrently.
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_LENGTH = 128
+
+
+def _length_sorted_batches(lengths, batch_size):
+    # indices sorted by token length -> neighbouring comments have similar length
+    order = np.argsort(lengths, kind='stable')
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+
+def set_num_threads(num_threads):
+    """Sets the torch CPU threads of the process (None keeps the torch default)."""
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+
+def predict_roberta(texts, tokenizer, model, batch_size=DEFAULT_BATCH_SIZE, max_length=DEFAULT_MAX_LENGTH,
+                    progress_callback=None):
+    """
+    Classifies texts with a RoBERTa sequence classification model.
+    Returns (predictions, probabilities): an int array of shape (n,) and a float array of shape (n, num_labels).
+    progress_callback(done, total) is called after every batch.
+    """
+    texts = [str(t) for t in texts]
+    n = len(texts)
+    num_labels = model.config.num_labels
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, num_labels), dtype=np.float32)
+
+    batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+    # one tokenizer call for all comments, padding is done per batch
+    encodings = tokenizer(texts, truncation=True, max_length=max_length)
+    input_ids = encodings['input_ids']
+    attention_mask = encodings['attention_mask']
+    lengths = np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=n)
+
+    probabilities = np.empty((n, num_labels), dtype=np.float32)
+    done = 0
+    with torch.inference_mode():
+        for batch_idx in _length_sorted_batches(lengths, batch_size):
+            features = [{'input_ids': input_ids[i], 'attention_mask': attention_mask[i]} for i in batch_idx]
+            inputs = tokenizer.pad(features, padding=True, return_tensors="pt")
+            logits = model(**inputs).logits
+            probabilities[batch_idx] = F.softmax(logits, dim=-1).float().cpu().numpy()
+
+            done += len(batch_idx)
+            if progress_callback:
+                progress_callback(done, n)
+
+    predictions = probabilities.argmax(axis=1)
+    return predictions, probabilities
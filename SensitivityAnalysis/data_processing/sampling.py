@@ -0,0 +1,82 @@
+# data_processing/sampling.py
+# Sampling mode for videos with more than PRO_COMMENT_LIMIT comments: instead of refusing them, a bounded
+# sample (at most SAMPLING_MAX_COMMENTS) is classified and the sentiment shares are reported with
+# confidence intervals.
+#
+# The YouTube API only pages comments in two orders, so the sample takes pages from both: newest first
+# (order=time) and most relevant first (order=relevance), alternately (services.iter_sample_pages).
+# After every page the Wilson score intervals of the shares are recomputed. Sampling stops once the widest
+# interval is at most SAMPLING_TARGET_WIDTH and at least SAMPLING_MIN_COMMENTS are classified.
+# The intervals treat the sample as a random one and apply the finite population correction
+# (total = commentCount of the video).
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+
+from data_processing.aggregation import IDX_TO_LABEL, N_CLASSES
+
+SAMPLING_ENABLED = getattr(settings, 'SAMPLING_ENABLED', True)
+SAMPLING_MAX_COMMENTS = getattr(settings, 'SAMPLING_MAX_COMMENTS', 5000)
+SAMPLING_MIN_COMMENTS = getattr(settings, 'SAMPLING_MIN_COMMENTS', 400)
+SAMPLING_TARGET_WIDTH = getattr(settings, 'SAMPLING_TARGET_WIDTH', 0.05)
+SAMPLING_CONFIDENCE = getattr(settings, 'SAMPLING_CONFIDENCE', 0.95)
+
+
+def _counts_array(counts):
+    if isinstance(counts, dict):  # {class: count}, keys are strings once stored as JSON
+        counts = [int(counts.get(k, counts.get(str(k), 0))) for k in range(N_CLASSES)]
+    return np.asarray(counts, dtype=np.float64)
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def share_intervals(counts, total=None, confidence=SAMPLING_CONFIDENCE):
+    """
+    Wilson score interval of every class share, as (low, high) fractions. counts: array or {class: count}
+    dict of the sample; total: number of comments the sample was drawn from (finite population correction).
+    """
+    counts = _counts_array(counts)
+    n = counts.sum()
+    if not n:
+        return np.zeros(N_CLASSES), np.ones(N_CLASSES)
+    z = _z(confidence)
+    p = counts / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half = z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    if total and total > n:
+        half *= math.sqrt((total - n) / (total - 1))
+    elif total:
+        half[:] = 0.0  # the whole population was classified
+        center = p
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+
+def max_width(counts, total=None, confidence=SAMPLING_CONFIDENCE):
+    low, high = share_intervals(counts, total, confidence)
+    return float((high - low).max())
+
+
+def precise_enough(counts, total=None, target_width=SAMPLING_TARGET_WIDTH, min_comments=SAMPLING_MIN_COMMENTS):
+    """True once the sample is big enough to stop: widest interval <= target_width, min_comments classified."""
+    return _counts_array(counts).sum() >= min_comments and max_width(counts, total) <= target_width
+
+
+def report(counts, total=None, stopped_early=False, confidence=SAMPLING_CONFIDENCE):
+    """Sampling section of the analysis report: sample size, intervals in percent (like sentiment_share)."""
+    low, high = share_intervals(counts, total, confidence)
+    n = int(_counts_array(counts).sum())
+    return {
+        'sample_size': n,
+        'total_comments': total,
+        'sampled_fraction': round(n / total, 4) if total else None,
+        'confidence': confidence,
+        'intervals': {IDX_TO_LABEL[k]: {'low': round(float(low[k]) * 100, 1), 'high': round(float(high[k]) * 100, 1)}
+                      for k in range(N_CLASSES)},
+        'max_width': round(float((high - low).max()) * 100, 1),
+        'stopped_early': stopped_early,
+    }
@@ -0,0 +1,143 @@
+# data_processing/streaming.py
+# Streaming pipeline: pages of comments flow through stages running in their own threads.
+#
+#   source (YouTube pages) -> queue -> stage 1 (translate) -> queue -> stage 2 (classify) -> caller
+#
+# Queues are bounded (PIPELINE_BUFFER_PAGES), so a fast producer waits for slow consumers and
+# only a few pages are in memory at any time, whatever the size of the video. Network I/O
+# (fetching, translation) overlaps with CPU work (preprocessing, classification).
+
+import queue
+import threading
+import time
+
+from django.db import connections
+
+PIPELINE_BUFFER_PAGES = 4
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class PipelineStage:
+    """
+    One step of the pipeline; counts pages, items (len of page) and time spent in func.
+    Every page is also recorded in timings (data_processing.metrics.JobTimings) if given.
+    """
+
+    def __init__(self, name, func=None, timings=None):
+        self.name = name
+        self.func = func
+        self.timings = timings
+        self.pages = 0
+        self.items = 0
+        self.seconds = 0.0
+
+    def record(self, page, seconds):
+        items = len(page) if hasattr(page, '__len__') else 1
+        self.pages += 1
+        self.items += items
+        self.seconds += seconds
+        if self.timings is not None:
+            self.timings.add(self.name, seconds, items)
+
+    def throughput(self):
+        return round(self.items / self.seconds, 1) if self.seconds else 0.0
+
+    def stats(self):
+        return {'pages': self.pages, 'items': self.items, 'seconds': round(self.seconds, 3),
+                'items_per_sec': self.throughput()}
+
+
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _feed(source, stage, out_q, stop):
+    iterator = iter(source)
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                page = next(iterator)
+            except StopIteration:
+                break
+            stage.record(page, time.perf_counter() - start)
+            if not _put(out_q, page, stop):
+                return
+        _put(out_q, _DONE, stop)
+    except BaseException as e:
+        _put(out_q, _Failure(e), stop)
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+        connections.close_all()  # stages may use the DB (e.g. translation cache), connections are per thread
+
+
+def _work(stage, in_q, out_q, stop):
+    try:
+        while True:
+            page = _get(in_q, stop)
+            if page is _DONE or isinstance(page, _Failure):
+                _put(out_q, page, stop)
+                return
+            try:
+                start = time.perf_counter()
+                result = stage.func(page)
+                stage.record(page, time.perf_counter() - start)
+            except BaseException as e:
+                _put(out_q, _Failure(e), stop)
+                return
+            if not _put(out_q, result, stop):
+                return
+    finally:
+        connections.close_all()
+
+
+def run_pipeline(source, source_stage, stages, buffer_size=PIPELINE_BUFFER_PAGES):
+    """
+    Generator yielding the results of the last stage, in source order.
+    source: iterable of pages, timed as source_stage. stages: PipelineStage objects applied in order.
+    An exception in any stage is re-raised here; closing the generator early stops all threads.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=buffer_size) for _ in range(len(stages) + 1)]
+    threads = [threading.Thread(target=_feed, args=(source, source_stage, queues[0], stop),
+                                name=f"pipeline-{source_stage.name}", daemon=True)]
+    for i, stage in enumerate(stages):
+        threads.append(threading.Thread(target=_work, args=(stage, queues[i], queues[i + 1], stop),
+                                        name=f"pipeline-{stage.name}", daemon=True))
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            item = _get(queues[-1], stop)
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=5)
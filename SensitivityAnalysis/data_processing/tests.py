@@ -1,3 +1,1281 @@
-from django.test import TestCase
+import argparse
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import closing
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+import psutil
+import torch
+from scipy import sparse
+from prometheus_client import REGISTRY
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from data_processing import (aggregation, artifacts, batch, cascade, compare, dedup, incremental, metrics,
+                             onnx_inference, preprocessing_text, progress, result_cache, sampling)
+from data_processing.Serialization_files import train_and_serialize
+from data_processing.benchmark_cascade import cascade_table
+from data_processing.benchmark_artifacts import measure_workers
+from data_processing.model_registry import MODEL_CATALOG, ModelRegistry, get_model_version
+from data_processing.jobs import (JobQueue, QueueFull, cancel_job, current_job_id, recover_stale_jobs, run_job,
+                                  worker_name)
+from data_processing.models import AnalysisJob, AnalyzedComment, CachedAnalysis, VideoAnalysis
+from data_processing.preprocessing_text import split_tokens
+from data_processing.roberta_inference import predict_roberta
+from data_processing.streaming import PipelineStage, run_pipeline
+from youtube_integration.services import CommentPage
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.model_dir = tmp.name
+        for name in ('vectorizer', 'small', 'big'):
+            joblib.dump({'name': name, 'payload': b'x' * (1024 * 1024 if name == 'big' else 1024)},
+                        os.path.join(self.model_dir, f'{name}.joblib'))
+        self.manifest = {
+            'vectorizer': {'loader': 'joblib', 'path': 'vectorizer.joblib', 'selectable': False},
+            'small': {'loader': 'joblib', 'path': 'small.joblib', 'requires': ['vectorizer']},
+            'big': {'loader': 'joblib', 'path': 'big.joblib', 'requires': ['vectorizer']},
+            'missing': {'loader': 'joblib', 'path': 'missing.joblib'},
+        }
+
+    def test_models_are_listed_without_loading(self):
+        registry = ModelRegistry(self.manifest, model_dir=self.model_dir)
+
+        self.assertEqual(list(registry.keys()), ['small', 'big'])
+        self.assertNotIn('vectorizer', registry)
+        self.assertNotIn('missing', registry)
+        self.assertEqual(registry.loaded(), [])
+
+        self.assertEqual(registry['small']['name'], 'small')
+        self.assertEqual(registry.loaded(), ['vectorizer', 'small'])
+        registry['small']
+        self.assertEqual(registry.loads, 2)
+
+    def test_least_recently_used_models_are_unloaded_over_budget(self):
+        registry = ModelRegistry(self.manifest, model_dir=self.model_dir, memory_budget_mb=0.5)
+
+        registry['small']
+        registry['big']
+
+        self.assertEqual(registry.loaded(), ['vectorizer', 'big'])
+        self.assertEqual(registry.evictions, 1)
+        registry['small']
+        self.assertEqual(registry.loaded(), ['vectorizer', 'small'])
+
+    def test_cascade_entry_is_built_from_its_requirements(self):
+        manifest = dict(self.manifest,
+                        cascade={'loader': 'cascade', 'requires': ['small', 'big'], 'threshold': 0.7},
+                        broken={'loader': 'cascade', 'requires': ['small', 'missing']})
+        registry = ModelRegistry(manifest, model_dir=self.model_dir)
+
+        self.assertEqual(list(registry.keys()), ['small', 'big', 'cascade'])
+        model = registry['cascade']
+        self.assertEqual((model.fast_model, model.expert_model, model.threshold), ('small', 'big', 0.7))
+        self.assertCountEqual(registry.loaded(), ['vectorizer', 'small', 'big', 'cascade'])
+
+
+def stub_nlp():
+    """Blank English spaCy pipeline (no model download) whose lemma is the lowercase word without a plural s."""
+    import spacy
+    from spacy.language import Language
+
+    if not Language.has_factory('test_plural_lemmas'):
+        @Language.component('test_plural_lemmas')
+        def plural_lemmas(doc):
+            for token in doc:
+                word = token.lower_
+                token.lemma_ = word[:-1] if len(word) > 3 and word.endswith('s') else word
+            return doc
+
+    nlp = spacy.blank('en')
+    nlp.add_pipe('test_plural_lemmas')
+    return nlp
+
+
+class PreprocessingCacheTests(SimpleTestCase):
+    texts = ["Cats LOVE these videos!", "great videos", "Cats love these videos", "<b>the</b> songs :)"]
+
+    def setUp(self):
+        patcher = mock.patch.object(preprocessing_text, '_nlp', stub_nlp())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        saved = dict(preprocessing_text._saved)
+        self.addCleanup(preprocessing_text._saved.update, saved)
+        self.addCleanup(preprocessing_text.configure_cache, lemma_mode=preprocessing_text.LEMMA_MODE)
+        self.addCleanup(preprocessing_text.token_cache.clear)
+        self.addCleanup(preprocessing_text.text_cache.clear)
+        preprocessing_text.text_cache.clear()
+        preprocessing_text.token_cache.clear()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'preprocessing_cache.joblib')
+
+    def test_least_recently_used_key_is_dropped(self):
+        cache = preprocessing_text.LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertEqual(cache.items(), [('a', 1), ('c', 3)])
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.info(), {'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        self.assertEqual(cache.writes, 3)
+
+    def test_batch_matches_text_tokenizer(self):
+        texts = self.texts + ["", "🔥🔥🔥", 12345, "great videos", "Songs and cats and songs"]
+        for mode in ("context", "token"):
+            preprocessing_text.configure_cache(lemma_mode=mode)
+            preprocessing_text.text_cache.clear()
+            preprocessing_text.token_cache.clear()
+            batch_tokens = list(preprocessing_text.tokenize_batch(texts, batch_size=2))
+            preprocessing_text.text_cache.clear()
+            preprocessing_text.token_cache.clear()
+
+            self.assertEqual(batch_tokens, [preprocessing_text.text_tokenizer(t) for t in texts], mode)
+
+    def test_saved_cache_is_loaded_back(self):
+        tokens = list(preprocessing_text.tokenize_batch(self.texts))
+        text_items = preprocessing_text.text_cache.items()
+        preprocessing_text.save_cache(self.path)
+        preprocessing_text.text_cache.clear()
+
+        self.assertTrue(preprocessing_text.load_cache(self.path))
+        self.assertCountEqual(preprocessing_text.text_cache.items(), text_items)
+        with mock.patch.object(preprocessing_text, 'get_nlp', side_effect=AssertionError("not cached")):
+            self.assertEqual(list(preprocessing_text.tokenize_batch(self.texts)), tokens)
+        self.assertFalse(preprocessing_text.load_cache(self.path + '.missing'))
+
+    def test_cache_is_saved_once_due(self):
+        preprocessing_text.save_cache(self.path)
+        self.assertFalse(preprocessing_text.save_cache_if_due(self.path, 0, 0))  # nothing new
+
+        preprocessing_text.text_tokenizer("great videos")
+        self.assertFalse(preprocessing_text.save_cache_if_due(self.path, 3600, 100))
+        self.assertTrue(preprocessing_text.save_cache_if_due(self.path, 3600, 1))
+        preprocessing_text.text_tokenizer("cats")
+        self.assertTrue(preprocessing_text.save_cache_if_due(self.path, 0, 100))
+        self.assertFalse(preprocessing_text.save_cache_if_due(self.path, 0, 100))
+
+    def test_token_mode_lemmatizes_every_word_once(self):
+        preprocessing_text.configure_cache(lemma_mode="token")
+        nlp = preprocessing_text.get_nlp()
+
+        with mock.patch.object(nlp, 'pipe', wraps=nlp.pipe) as pipe:
+            tokens = list(preprocessing_text.tokenize_batch(self.texts))
+            list(preprocessing_text.tokenize_batch(["love cats songs"]))
+
+        self.assertEqual(tokens, [['cat', 'love', 'video'], ['great', 'video'], ['cat', 'love', 'video'],
+                                  ['song']])
+        self.assertEqual(sorted(w for call in pipe.call_args_list for w in call.args[0]),
+                         sorted({'cats', 'love', 'these', 'videos', 'great', 'the', 'songs', ':)'}))
+        self.assertEqual(preprocessing_text.token_cache.get('videos'), ('video',))
+        with self.assertRaises(ValueError):
+            preprocessing_text.configure_cache(lemma_mode="word")
+
+
+class FeaturizerTests(SimpleTestCase):
+    corpus = [
+        "love song love", "great video love song", "hate video", "song great", "video video video",
+        "terrible song hate", "great great video", "love video song",
+    ]
+    token_lists = [["love", "song", "unknownword"], [], ["video", "video", "great"], ["hate", "terrible", "song"],
+                   ["unknownword"], ["great", "video", "love", "song", "love"]]
+
+    def assertSameMatrix(self, a, b):
+        self.assertEqual(a.shape, b.shape)
+        self.assertLess(abs(a - b).max() if a.nnz or b.nnz else 0, 1e-12)
+
+    def compact(self, vectorizer):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return artifacts.load_vectorizer(artifacts.save_vectorizer(vectorizer, tmp.name))
+
+    def test_token_transform_matches_sklearn(self):
+        for params in ({'ngram_range': (1, 2)}, {'ngram_range': (1, 2), 'max_df': 0.5},
+                       {'ngram_range': (2, 2)}, {'ngram_range': (1, 3), 'sublinear_tf': True}):
+            sklearn = TfidfVectorizer(tokenizer=split_tokens, token_pattern=None, lowercase=False, **params)
+            sklearn.fit(self.corpus)
+            compact = self.compact(sklearn)
+            expected = sklearn.transform([" ".join(tokens) for tokens in self.token_lists])
+
+            self.assertSameMatrix(compact.transform_tokens(self.token_lists), expected)
+            self.assertSameMatrix(compact.transform([" ".join(tokens) for tokens in self.token_lists]), expected)
+
+    def test_shipped_vectorizer_matches_sklearn(self):
+        # rows computed by the original sklearn TfidfVectorizer (tfidf_vectorizer.joblib) before it was
+        # converted to the compact format, so the check does not depend on the converted arrays
+        with open(os.path.join(TEST_DATA_DIR, 'shipped_tfidf_sample.json')) as f:
+            sample = json.load(f)
+        rows = sample['rows']
+        expected = sparse.csr_matrix(
+            ([value for row in rows for _, value in row], [column for row in rows for column, _ in row],
+             np.cumsum([0] + [len(row) for row in rows])), shape=(len(rows), sample['n_features']))
+        compact = MODEL_CATALOG.load('tfidf_vectorizer')
+
+        self.assertSameMatrix(compact.transform_tokens(sample['token_lists']), expected)
+        self.assertSameMatrix(compact.transform([" ".join(tokens) for tokens in sample['token_lists']]), expected)
+
+
+class OutOfCoreTrainingTests(SimpleTestCase):
+    words = "love hate great terrible video song funny boring music voice cats dogs".split()
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for name, value in (('CACHE_DIR', os.path.join(tmp.name, 'cache')), ('MODEL_DIR', tmp.name),
+                            ('print', lambda *args: None)):
+            patcher = mock.patch.object(train_and_serialize, name, value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(preprocessing_text, '_nlp', stub_nlp())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(preprocessing_text.text_cache.clear)
+
+        rng = np.random.default_rng(0)
+        comments = [" ".join(rng.choice(self.words, rng.integers(2, 7))) for _ in range(60)]
+        sentiments = ['positive' if 'love' in c else 'negative' if 'hate' in c else 'neutral' for c in comments]
+        self.csv = os.path.join(tmp.name, 'comments.csv')
+        pd.DataFrame({'Comment': comments, 'Sentiment': sentiments}).to_csv(self.csv, index=False)
+        self.args = argparse.Namespace(data=self.csv, chunksize=7, n_process=1, n_jobs=1, epochs=1)
+
+    def sklearn_vectorizer(self):
+        # every TEST_EVERY-th row is held out, like iter_token_chunks
+        tokens = list(preprocessing_text.tokenize_batch(pd.read_csv(self.csv)['Comment']))
+        training = [" ".join(t) for i, t in enumerate(tokens) if i % train_and_serialize.TEST_EVERY]
+        return TfidfVectorizer(tokenizer=split_tokens, token_pattern=None, lowercase=False,
+                               **train_and_serialize.VECTORIZER_PARAMS).fit(training)
+
+    def test_chunked_vocabulary_matches_sklearn(self):
+        expected = self.sklearn_vectorizer()
+
+        vocabulary, idf, class_weight = train_and_serialize.fit_vocabulary(self.args)
+
+        self.assertEqual(vocabulary, expected.vocabulary_)
+        np.testing.assert_allclose(idf, expected.idf_)
+        self.assertEqual(set(class_weight), {0, 1, 2})
+
+    def test_pruned_terms_keep_exact_frequencies(self):
+        expected = self.sklearn_vectorizer()
+
+        with mock.patch.object(train_and_serialize, 'MAX_COUNTED_TERMS', 20), \
+                mock.patch.object(train_and_serialize, 'count_documents',
+                                  wraps=train_and_serialize.count_documents) as count:
+            vocabulary, idf, _ = train_and_serialize.fit_vocabulary(self.args)
+
+        self.assertEqual(count.call_count, 2)  # pruned, then recounted
+        self.assertTrue(vocabulary)
+        self.assertLessEqual(set(vocabulary), set(expected.vocabulary_))
+        np.testing.assert_allclose(idf, [expected.idf_[expected.vocabulary_[t]] for t in sorted(vocabulary)])
+
+    def test_models_are_trained_and_saved(self):
+        train_and_serialize.train_out_of_core(self.args)
+
+        vectorizer = artifacts.load_vectorizer(os.path.join(train_and_serialize.MODEL_DIR, 'tfidf_vectorizer'))
+        X = vectorizer.transform_tokens([["love", "video"], ["hate", "song"]])
+        self.assertEqual(X.shape, (2, len(self.sklearn_vectorizer().vocabulary_)))
+        for _, file_name in train_and_serialize.build_models(incremental=True).values():
+            model = artifacts.load_model(os.path.join(train_and_serialize.MODEL_DIR, file_name))
+            self.assertEqual(model.predict(X).shape, (2,))
+
+
+@unittest.skipUnless(hasattr(psutil.Process().memory_full_info(), 'pss'), "PSS is only reported on Linux")
+class SharedArtifactTests(SimpleTestCase):
+    def test_memory_mapped_model_is_shared_by_workers(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        model = LogisticRegression().fit(np.eye(3), [0, 1, 2])
+        model.coef_ = np.random.default_rng(0).random((3, 500_000))  # ~12 MB
+        path = artifacts.dump_model(model, os.path.join(tmp.name, 'model.joblib'))
+
+        copied = sum(measure_workers(path, workers=3, mmap=False))
+        mapped = sum(measure_workers(path, workers=3, mmap=True))
+
+        # three private copies vs one copy split between the three workers
+        self.assertGreater(copied, 30)
+        self.assertLess(mapped, copied * 0.6)
+        self.assertIsInstance(artifacts.load_model(path).coef_, np.memmap)
+
+
+def save_tiny_roberta(directory):
+    """Randomly initialised 2-layer RoBERTa with a word-level tokenizer, saved like the fine-tuned model."""
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+
+    words = ["<s>", "<pad>", "</s>", "<unk>"] + "good bad great terrible video love hate this is not".split()
+    backend = Tokenizer(models.WordLevel({w: i for i, w in enumerate(words)}, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    backend.post_processor = processors.TemplateProcessing(single="<s> $A </s>",
+                                                           special_tokens=[("<s>", 0), ("</s>", 2)])
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, bos_token="<s>", eos_token="</s>",
+                                        pad_token="<pad>", unk_token="<unk>")
+    config = RobertaConfig(vocab_size=len(words), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                           intermediate_size=64, max_position_embeddings=140, num_labels=3, pad_token_id=1)
+    artifacts.save_roberta(RobertaForSequenceClassification(config), tokenizer, directory)
+    return tokenizer
+
+
+class RobertaInferenceTests(SimpleTestCase):
+    texts = ["love this video is great", "bad", "this is not great", "good video", "hate hate hate", "terrible",
+             "good bad great terrible video"]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tokenizer = save_tiny_roberta(tmp.name)
+        self.model = artifacts.load_roberta_model(tmp.name)
+
+    def test_results_are_in_input_order(self):
+        predictions, probabilities = predict_roberta(self.texts, self.tokenizer, self.model, batch_size=2)
+
+        # one text per batch: no length sorting, no padding
+        single = np.vstack([predict_roberta([t], self.tokenizer, self.model)[1] for t in self.texts])
+        np.testing.assert_allclose(probabilities, single, atol=1e-5)
+        np.testing.assert_array_equal(predictions, single.argmax(axis=1))
+
+    def test_thread_count_is_left_alone(self):
+        threads = torch.get_num_threads()
+        with mock.patch.object(torch, 'set_num_threads') as set_threads:
+            predict_roberta(self.texts, self.tokenizer, self.model, batch_size=2)
+        set_threads.assert_not_called()
+        self.assertEqual(torch.get_num_threads(), threads)
+
+
+@unittest.skipUnless(importlib.util.find_spec('onnxruntime') and importlib.util.find_spec('onnx'),
+                     "onnxruntime and onnx are not installed")
+class OnnxExportTests(SimpleTestCase):
+    texts = ["good video", "this is not great", "bad", "love this video is great", "hate hate hate", "terrible"]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.source = os.path.join(tmp.name, 'roberta_model')
+        self.output = os.path.join(tmp.name, 'roberta_onnx')
+        self.tokenizer = save_tiny_roberta(self.source)
+
+    def test_exported_models_match_pytorch(self):
+        model = artifacts.load_roberta_model(self.source)
+        path = onnx_inference.export_onnx(model, self.tokenizer, self.output)
+        int8_path = onnx_inference.quantize_onnx(path)
+
+        _, expected = predict_roberta(self.texts, self.tokenizer, model, batch_size=4)
+        _, exported = predict_roberta(self.texts, self.tokenizer, onnx_inference.OnnxSequenceClassifier(path),
+                                      batch_size=4)
+        predictions, quantized = predict_roberta(self.texts, self.tokenizer,
+                                                 onnx_inference.OnnxSequenceClassifier(int8_path, 1), batch_size=4)
+
+        np.testing.assert_allclose(exported, expected, atol=1e-4)  # batches of different lengths, one graph
+        np.testing.assert_allclose(quantized, expected, atol=0.05)
+        self.assertEqual(predictions.shape, (len(self.texts),))
+        self.assertLess(os.path.getsize(int8_path), os.path.getsize(path))
+
+    def test_command_exports_and_checks_accuracy(self):
+        eval_data = os.path.join(self.output + '_eval.csv')
+        with open(eval_data, 'w') as f:
+            f.write("Comment,Sentiment\n" + "".join(f"{t},{s}\n" for t, s in zip(
+                self.texts * 5, ['positive', 'neutral', 'negative', 'positive', 'negative', 'negative'] * 5)))
+        out = io.StringIO()
+
+        call_command('export_roberta_onnx', source=self.source, output=self.output, eval_data=eval_data,
+                     max_accuracy_drop=0.5, stdout=out)
+
+        self.assertTrue(os.path.exists(os.path.join(self.output, onnx_inference.ONNX_INT8_FILE)))
+        table = out.getvalue()
+        self.assertIn("pytorch fp32", table)
+        self.assertIn("onnx int8", table)
+
+
+class CascadeTests(SimpleTestCase):
+    def test_only_uncertain_comments_reach_the_expert(self):
+        calls = []
+
+        def classify(model_name, texts):
+            calls.append((model_name, texts))
+            if model_name == 'fast':
+                return np.array([2, 0, 1, 2]), np.array([0.95, 0.5, np.nan, 0.8])
+            return np.array([1] * len(texts)), np.array([0.7] * len(texts))
+
+        timings = metrics.JobTimings('cascade')
+        labels, confidences = cascade.CascadeClassifier('fast', 'expert', 0.8).classify(
+            ['a', 'b', 'c', 'd'], classify, timings)
+
+        self.assertEqual(calls[1], ('expert', ['b', 'c']))  # below the threshold or without a probability
+        self.assertEqual(labels.tolist(), [2, 1, 1, 2])
+        self.assertEqual(confidences.tolist(), [0.95, 0.7, 0.7, 0.8])
+        self.assertEqual(timings.breakdown()['escalated']['items'], 2)
+
+    def test_benchmark_table_trades_accuracy_for_cost(self):
+        labels = np.array([0, 1, 2, 2])
+        fast = (np.array([0, 0, 2, 1]), np.array([0.9, 0.55, 0.95, 0.65]))
+        expert = (np.array([0, 1, 2, 2]), np.array([0.9] * 4))
+
+        rows = {r['method']: r for r in cascade_table(labels, fast, 1.0, expert, 10.0, thresholds=(0.6, 0.7))}
+
+        self.assertEqual(rows['fast']['accuracy'], 0.5)
+        self.assertEqual((rows['cascade@0.6']['escalated'], rows['cascade@0.6']['accuracy']), (0.25, 0.75))
+        self.assertEqual((rows['cascade@0.7']['accuracy'], rows['cascade@0.7']['relative_cost']), (1.0, 0.6))
+
+
+class CascadeAnalysisTests(TransactionTestCase):
+    spam = "Buy cheap followers now, visit my channel for the best offers"
+
+    def classify(self, model_name, texts, timings=None):
+        if model_name == 'cascade':
+            return self.cascade.classify(texts, lambda name, subset: self.classify(name, subset, timings), timings)
+        if model_name == 'fast':  # unsure about the spam only
+            return np.zeros(len(texts), dtype=np.int64), np.array([0.5 if 'followers' in t else 0.9 for t in texts])
+        return np.full(len(texts), 1, dtype=np.int64), np.full(len(texts), 0.95)
+
+    def test_escalated_share_counts_each_group_of_duplicates_once(self):
+        from data_processing import views
+
+        self.cascade = cascade.CascadeClassifier('fast', 'expert', 0.8)
+        texts = [self.spam] * 6 + [f"comment number {word}" for word in ("one", "two", "three", "four")]
+        page = CommentPage({'id': str(i), 'text': t, 'published_at': None} for i, t in enumerate(texts))
+
+        with mock.patch.object(views, 'iter_comment_pages', return_value=iter([page])), \
+                mock.patch.object(views, 'translate_page', side_effect=lambda p: p), \
+                mock.patch.object(views, 'get_model_version', return_value='v1'), \
+                mock.patch.object(views, 'classify_texts', side_effect=self.classify), \
+                mock.patch.object(dedup, 'DEDUP_ENABLED', True):
+            stats = views.analyze_video('abcdefghijk', 'cascade', lambda progress, step: None,
+                                        meta=('T', None, 'C', None, '1', '0', '10'))
+
+        # 5 comments classified (the spam once), 1 of them escalated
+        self.assertEqual(stats['duplicates']['classified'], 5)
+        self.assertEqual(stats['escalated_fraction'], 0.2)
+        self.assertEqual(stats['sentiment_counts'][1], 6)
+
+
+class ResultsStoreTests(TestCase):
+    def setUp(self):
+        self.analysis = VideoAnalysis.objects.create(
+            video_id='abcdefghijk', model_name='naive_bayes', model_version='v1',
+            sentiment_counts={0: 40, 1: 0, 2: 80}, comment_count=120,
+            report={'video_title': 'Title', 'model_used': 'naive_bayes',
+                    **aggregation.aggregate([0] * 40 + [2] * 80, [0.5] * 120,
+                                            np.datetime64('2024-01-01') + np.arange(120).astype('timedelta64[h]'))},
+        )
+        now = timezone.now()
+        AnalyzedComment.objects.bulk_create([
+            AnalyzedComment(analysis=self.analysis, comment_id=str(i), text=f'comment {i}', label=0 if i % 3 else 2,
+                            published_at=now - timezone.timedelta(minutes=i))
+            for i in range(120)
+        ])
+        session = self.client.session
+        session['last_analysis_id'] = self.analysis.pk
+        session.save()
+
+    def test_dashboard_renders_only_the_first_page(self):
+        response = self.client.get(reverse('results_dashboard'))
+
+        self.assertEqual(response.context['video_title'], 'Title')
+        self.assertEqual(response.context['low_confidence_count'], 120)
+        self.assertContains(response, 'Sentiment over time (per day)')
+        self.assertEqual(len(response.context['classified_comments']), 50)
+        self.assertEqual(response.context['classified_comments'][0]['text'], 'comment 0')
+        self.assertTrue(response.context['comments_has_next'])
+        self.assertEqual(dict(self.client.session), {'last_analysis_id': self.analysis.pk})
+
+    def test_comments_are_paged_and_filtered_by_label(self):
+        page = self.client.get(reverse('results_comments'), {'label': 'positive', 'page': 2, 'page_size': 30}).json()
+
+        self.assertEqual((page['total'], page['num_pages'], page['page'], page['has_next']), (40, 2, 2, False))
+        self.assertEqual([c['text'] for c in page['comments']], [f'comment {i}' for i in range(90, 120, 3)])
+        self.assertEqual({c['label'] for c in page['comments']}, {'positive'})
+
+        self.assertEqual(self.client.get(reverse('results_comments'), {'label': 'angry'}).status_code, 400)
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(reverse('results_comments')).status_code, 404)
+
+
+    def test_dashboard_reports_the_duplicate_ratio(self):
+        self.analysis.report['duplicates'] = {'comments': 120, 'exact': 30, 'near': 6, 'classified': 84, 'ratio': 0.3}
+        self.analysis.save(update_fields=['report'])
+
+        response = self.client.get(reverse('results_dashboard'))
+
+        self.assertContains(response, 'Duplicates: 30')
+        self.assertContains(response, '30 exact, 6 near-duplicates')
+
+
+class StreamingTests(SimpleTestCase):
+    def counting_source(self, limit=None):
+        self.fetched = 0
+        self.source_closed = threading.Event()
+        try:
+            while limit is None or self.fetched < limit:
+                self.fetched += 1
+                yield [self.fetched]
+        finally:
+            self.source_closed.set()
+
+    def pipeline(self, source, *funcs, buffer_size=2):
+        stages = [PipelineStage(f"stage{i}", func) for i, func in enumerate(funcs)]
+        return run_pipeline(source, PipelineStage("fetch"), stages, buffer_size=buffer_size)
+
+    def pipeline_threads(self):
+        return [t for t in threading.enumerate() if t.name.startswith("pipeline-")]
+
+    def test_pages_come_out_in_order(self):
+        results = list(self.pipeline(self.counting_source(20), lambda page: page * 2, sum))
+        self.assertEqual(results, [2 * i for i in range(1, 21)])
+
+    def test_stage_errors_are_raised_to_the_caller(self):
+        def fail_on_third(page):
+            if page == [3]:
+                raise ValueError("bad page")
+            return page
+
+        results = []
+        with self.assertRaisesMessage(ValueError, "bad page"):
+            for page in self.pipeline(self.counting_source(), fail_on_third):
+                results.append(page)
+        self.assertEqual(results, [[1], [2]])
+        self.assertTrue(self.source_closed.wait(5))
+
+    def test_source_errors_are_raised_to_the_caller(self):
+        def source():
+            yield [1]
+            raise ConnectionError("quota exceeded")
+
+        with self.assertRaisesMessage(ConnectionError, "quota exceeded"):
+            list(self.pipeline(source(), lambda page: page))
+
+    def test_closing_early_stops_fetching(self):
+        pages = self.pipeline(self.counting_source(), lambda page: page)
+        self.assertEqual([next(pages), next(pages)], [[1], [2]])
+        pages.close()
+
+        self.assertTrue(self.source_closed.is_set())
+        self.assertEqual(self.pipeline_threads(), [])
+        fetched = self.fetched
+        time.sleep(0.2)
+        self.assertEqual(self.fetched, fetched)
+
+    def test_bounded_queues_hold_back_the_source(self):
+        with closing(self.pipeline(self.counting_source(), lambda page: page, buffer_size=2)) as pages:
+            next(pages)
+            time.sleep(0.5)  # a slow consumer
+            # 1 consumed + 2 + 2 queued + 1 in the stage + 1 waiting in the fetch thread
+            self.assertLessEqual(self.fetched, 7)
+            fetched = self.fetched
+            time.sleep(0.2)
+            self.assertEqual(self.fetched, fetched)
+
+            self.assertEqual(next(pages), [2])
+            time.sleep(0.2)
+            self.assertLessEqual(self.fetched, 8)
+
+
+class ResultCacheTests(TestCase):
+    stats = {'sentiment_share': {'positive': 100.0}}
+
+    def store(self, video_id, **fields):
+        result_cache.store(video_id, 'naive_bayes', 'v1', self.stats, [2, 2])
+        if fields:
+            CachedAnalysis.objects.filter(video_id=video_id).update(**fields)
+
+    def test_expired_entries_are_misses(self):
+        self.store('fresh')
+        self.store('old', created_at=timezone.now() - timezone.timedelta(seconds=result_cache.CACHE_TTL + 60))
+
+        self.assertEqual(result_cache.get_cached('fresh', 'naive_bayes', 'v1').predictions, [2, 2])
+        self.assertIsNone(result_cache.get_cached('old', 'naive_bayes', 'v1'))
+        self.assertFalse(CachedAnalysis.objects.filter(video_id='old').exists())
+        self.assertIsNone(result_cache.get_cached('fresh', 'naive_bayes', 'v2'))  # another model version
+
+    def test_least_recently_accessed_entries_are_evicted(self):
+        now = timezone.now()
+        with mock.patch.object(result_cache, 'CACHE_MAX_ENTRIES', 2):
+            self.store('first', last_accessed=now - timezone.timedelta(minutes=2))
+            self.store('second', last_accessed=now - timezone.timedelta(minutes=1))
+            result_cache.get_cached('first', 'naive_bayes', 'v1')  # now the most recently used
+            self.store('third')
+
+        self.assertCountEqual(CachedAnalysis.objects.values_list('video_id', flat=True), ['first', 'third'])
+
+    def test_stats_count_hits_and_misses(self):
+        before = result_cache.cache_stats()
+        result_cache.get_cached('video', 'naive_bayes', 'v1')
+        self.store('video')
+        result_cache.get_cached('video', 'naive_bayes', 'v1')
+        result_cache.get_cached('video', 'naive_bayes', 'v1')
+
+        stats = result_cache.cache_stats()
+        self.assertEqual((stats['hits'] - before['hits'], stats['misses'] - before['misses']), (2, 1))
+        self.assertEqual(stats['hit_rate'], round(stats['hits'] / (stats['hits'] + stats['misses']), 3))
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(CachedAnalysis.objects.get(video_id='video').hits, 2)
+
+
+class DedupTests(SimpleTestCase):
+    spam = "Check out my channel for free gift cards and giveaways every day"
+
+    def fake_classify(self, texts):
+        self.classified.extend(texts)
+        return np.array([2 if 'love' in text else 0 for text in texts]), np.linspace(0.5, 0.9, len(texts))
+
+    def setUp(self):
+        self.classified = []
+
+    def test_duplicates_are_classified_once(self):
+        deduplicator = dedup.Deduplicator()
+        page1 = [self.spam, "I love this song", "i LOVE this song!!!", self.spam.replace("every day", "everyday"),
+                 "", "nice"]
+        page2 = ["I love this song.", self.spam + "!", "Check out my channel 4 free gift cards and giveaways every day",
+                 "nice", "completely different comment about the video"]
+
+        labels1, confidences1 = deduplicator.classify(page1, self.fake_classify)
+        labels2, confidences2 = deduplicator.classify(page2, self.fake_classify)
+
+        self.assertEqual(self.classified, [self.spam, "I love this song", "", "nice",
+                                           "completely different comment about the video"])
+        self.assertEqual(labels1.tolist(), [0, 2, 2, 0, 0, 0])
+        self.assertEqual(labels2.tolist(), [2, 0, 0, 0, 0])
+        self.assertEqual(confidences1[3], confidences1[0])
+        self.assertEqual(confidences2[0], confidences1[1])
+        # exact: the song x2, the spam with "!", "nice"; near: "everyday" and "4 free"
+        self.assertEqual(deduplicator.stats(), {'comments': 11, 'exact': 4, 'near': 2, 'classified': 5,
+                                                'ratio': round(6 / 11, 4)})
+        self.assertEqual(deduplicator.stats({'comments': 9, 'exact': 1, 'near': 0})['ratio'], 0.35)
+
+    def test_comments_in_other_scripts_are_kept_apart(self):
+        deduplicator = dedup.Deduplicator()
+        texts = ["Отличное видео ok", "素晴らしい動画 ok", "отличное   ВИДЕО ok!", "great 🔥", "great 😡", "nice :)",
+                 "nice :(", "???", "!!!"]
+
+        deduplicator.classify(texts, self.fake_classify)
+
+        # clean_text leaves "ok" of the first three, "great" of the next two and nothing of the last two
+        self.assertEqual(self.classified, [t for t in texts if t != "отличное   ВИДЕО ok!"])
+        self.assertEqual(dedup.normalize("отличное   ВИДЕО ok!"), "отличное видео ok")
+        self.assertEqual(dedup.normalize("nice :-("), "nice :(")
+
+    def test_minhash_estimates_jaccard_similarity(self):
+        a = dedup.shingles("the quick brown fox jumps over the lazy dog again and again")
+        b = dedup.shingles("the quick brown fox jumps over the lazy cat again and again")
+        hasher = dedup.MinHasher(num_perm=256)
+
+        estimate = (hasher.signature(a) == hasher.signature(b)).mean()
+        self.assertAlmostEqual(estimate, dedup.jaccard(a, b), delta=0.1)
+        self.assertEqual((hasher.signature(a) == hasher.signature(a)).mean(), 1.0)
+
+
+class ProgressTests(TransactionTestCase):  # run_job closes its connection like a worker thread
+    def setUp(self):
+        caches[progress.PROGRESS_CACHE].clear()
+        self.job = AnalysisJob.objects.create(video_id='abcdefghijk', model_name='naive_bayes')
+
+    def test_ticks_are_published_without_rewriting_the_job_row(self):
+        seen = {}
+
+        def analysis(video_id, model_name, update_step):
+            with CaptureQueriesContext(connection) as queries:
+                for i in range(1, 90):
+                    update_step(i, f"step {i}")
+            seen['queries'] = len(queries)
+            seen['published'] = progress.current(self.job.pk)['progress']
+            seen['stored'] = AnalysisJob.objects.get(pk=self.job.pk).progress
+            return {'analysis_id': None}
+
+        run_job(self.job.pk, analysis)
+
+        self.assertEqual(seen, {'queries': 0, 'published': 89, 'stored': 0})
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.progress), (AnalysisJob.STATUS_DONE, 100))
+        self.assertEqual(progress.current(self.job.pk), self.job.status_payload())
+
+    def test_events_are_pushed_until_the_job_finishes(self):
+        running = dict(self.job.status_payload(), status=AnalysisJob.STATUS_RUNNING, progress=40)
+        progress.publish(self.job.pk, running)
+        finish = threading.Timer(0.2, progress.publish,
+                                 [self.job.pk, dict(running, status=AnalysisJob.STATUS_DONE, progress=100)])
+        finish.start()
+        self.addCleanup(finish.cancel)
+
+        events = [e for e in progress.event_stream(self.job.pk, timeout=10) if e.startswith('data:')]
+
+        self.assertEqual(len(events), 2)
+        self.assertIn('"progress": 40', events[0])
+        self.assertIn('"status": "done"', events[1])
+        self.assertEqual(progress._channels, {})
+
+    def test_readers_are_only_woken_up_by_their_job(self):
+        other = AnalysisJob.objects.create(video_id='kjihgfedcba', model_name='naive_bayes')
+        payload = progress.current(self.job.pk)
+        noise = threading.Timer(0.05, progress.publish, [other.pk, other.status_payload()])
+        noise.start()
+        self.addCleanup(noise.cancel)
+
+        with mock.patch.object(progress, 'current', wraps=progress.current) as current:
+            start = time.monotonic()
+            self.assertEqual(progress.wait_for_change(self.job.pk, payload, timeout=0.5), payload)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+        self.assertEqual(current.call_count, 2)  # before and after waiting
+
+
+class JobQueueTests(TransactionTestCase):
+    def setUp(self):
+        caches[progress.PROGRESS_CACHE].clear()
+
+    def create_jobs(self, n):
+        return [AnalysisJob.objects.create(video_id=f'video{i:06d}', model_name='naive_bayes') for i in range(n)]
+
+    def test_workers_limit_the_jobs_running_at_once(self):
+        jobs_queue = JobQueue(max_workers=2, max_queued=10)
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def analysis(video_id, model_name, update_step):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return {}
+
+        jobs = self.create_jobs(6)
+        for job in jobs:
+            jobs_queue.submit(job, analysis)
+        jobs_queue._queue.join()
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(set(AnalysisJob.objects.values_list('status', flat=True)), {AnalysisJob.STATUS_DONE})
+
+    def test_full_queue_rejects_new_jobs(self):
+        jobs_queue = JobQueue(max_workers=1, max_queued=1)
+        started, release = threading.Event(), threading.Event()
+
+        def blocking(video_id, model_name, update_step):
+            started.set()
+            release.wait(10)
+            return {}
+
+        first, second, third = self.create_jobs(3)
+        jobs_queue.submit(first, blocking)
+        self.assertTrue(started.wait(10))  # the worker took the first job, the queue is empty again
+        jobs_queue.submit(second, blocking)
+        with self.assertRaises(QueueFull):
+            jobs_queue.submit(third, blocking)
+        release.set()
+        jobs_queue._queue.join()
+
+    def test_job_id_is_known_to_the_analysis_and_its_batch_threads(self):
+        job, = self.create_jobs(1)
+        seen = []
+
+        def analysis(video_id, model_name, update_step, max_comments, meta):
+            seen.append(current_job_id())
+            return {'analysis_id': None}
+
+        with mock.patch.object(batch, 'get_videos_meta', return_value={'a': ('T', None, 'C', None, '1', '0', '5')}):
+            run_job(job.pk, lambda video_id, model_name, update_step: (
+                seen.append(current_job_id()), batch.run_batch(['a'], model_name, analysis))[1])
+
+        self.assertEqual(seen, [job.pk, job.pk])
+        self.assertIsNone(current_job_id())
+
+    def test_cancelled_jobs_stop(self):
+        queued, running = self.create_jobs(2)
+        self.assertTrue(cancel_job(queued.pk))
+        run_job(queued.pk, lambda *args: self.fail("a cancelled job must not run"))
+
+        def analysis(video_id, model_name, update_step):
+            update_step(10, "working")
+            cancel_job(running.pk)
+            update_step(20, "still working")
+            self.fail("update_step must raise once the job is cancelled")
+
+        run_job(running.pk, analysis)
+
+        for job in (queued, running):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.step), (AnalysisJob.STATUS_CANCELLED, 'Cancelled.'))
+        self.assertFalse(cancel_job(running.pk))  # already finished
+
+    def test_jobs_of_a_previous_process_are_marked_failed(self):
+        queued, running, done, newer = self.create_jobs(4)
+        before_restart = timezone.now() - timezone.timedelta(hours=1)
+        AnalysisJob.objects.exclude(pk=newer.pk).update(created_at=before_restart)
+        AnalysisJob.objects.filter(pk=running.pk).update(status=AnalysisJob.STATUS_RUNNING)
+        AnalysisJob.objects.filter(pk=done.pk).update(status=AnalysisJob.STATUS_DONE)
+
+        self.assertEqual(recover_stale_jobs(started=timezone.now() - timezone.timedelta(minutes=1)), 2)
+
+        statuses = dict(AnalysisJob.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[job.pk] for job in (queued, running, done, newer)],
+                         [AnalysisJob.STATUS_FAILED, AnalysisJob.STATUS_FAILED, AnalysisJob.STATUS_DONE,
+                          AnalysisJob.STATUS_QUEUED])
+        self.assertEqual(progress.current(queued.pk)['status'], AnalysisJob.STATUS_FAILED)
+
+    def test_jobs_of_live_server_processes_are_not_recovered(self):
+        own, live, stopped, other_host, restarted = self.create_jobs(5)
+        workers = {own: worker_name(), live: worker_name(1001), stopped: worker_name(1002),
+                   other_host: 'other-host:1002', restarted: worker_name()}
+        for job, worker in workers.items():
+            AnalysisJob.objects.filter(pk=job.pk).update(worker=worker, status=AnalysisJob.STATUS_RUNNING)
+        # a previous process of the host had the same pid
+        AnalysisJob.objects.filter(pk=restarted.pk).update(created_at=timezone.now() - timezone.timedelta(hours=1))
+
+        with mock.patch('data_processing.jobs._process_alive', side_effect=lambda pid: pid == 1001):
+            self.assertEqual(recover_stale_jobs(started=timezone.now() - timezone.timedelta(minutes=1)), 2)
+
+        statuses = dict(AnalysisJob.objects.values_list('pk', 'status'))
+        self.assertEqual([statuses[job.pk] for job in (own, live, stopped, other_host, restarted)],
+                         [AnalysisJob.STATUS_RUNNING, AnalysisJob.STATUS_RUNNING, AnalysisJob.STATUS_FAILED,
+                          AnalysisJob.STATUS_RUNNING, AnalysisJob.STATUS_FAILED])
+
+    def test_submitted_jobs_record_their_process(self):
+        job = self.create_jobs(1)[0]
+        jobs_queue = JobQueue(max_workers=1)
+        jobs_queue.submit(job, lambda *args: None)
+        jobs_queue._queue.join()
+        self.assertEqual(AnalysisJob.objects.get(pk=job.pk).worker, worker_name())
+
+
+class MetricsTests(TransactionTestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_stage_timings_are_observed_and_kept_per_job(self):
+        before = self.sample('sentiment_stage_duration_seconds_count', stage='vectorize', model='test_model')
+        timings = metrics.JobTimings('test_model')
+        for _ in range(3):
+            with timings.time('vectorize', 100):
+                pass
+        timings.add('predict', 0.5, 100)
+
+        breakdown = timings.breakdown()
+        self.assertEqual(list(breakdown), ['vectorize', 'predict'])
+        self.assertEqual((breakdown['vectorize']['calls'], breakdown['vectorize']['items']), (3, 300))
+        self.assertEqual(breakdown['predict']['items_per_sec'], 200.0)
+        self.assertEqual(
+            self.sample('sentiment_stage_duration_seconds_count', stage='vectorize', model='test_model') - before, 3)
+
+    def test_jobs_are_counted_by_status(self):
+        before = self.sample('sentiment_jobs_total', kind='analysis', status=AnalysisJob.STATUS_FAILED)
+        job = AnalysisJob.objects.create(video_id='abcdefghijk', model_name='naive_bayes')
+
+        def failing(video_id, model_name, update_step):
+            raise RuntimeError("no comments")
+
+        run_job(job.pk, failing)
+
+        self.assertEqual(self.sample('sentiment_jobs_total', kind='analysis', status=AnalysisJob.STATUS_FAILED),
+                         before + 1)
+
+    def test_metrics_endpoint_exposes_every_layer(self):
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        for name in ('sentiment_stage_duration_seconds', 'sentiment_comments_classified_total',
+                     'youtube_api_requests_total', 'translation_chunks_total', 'preprocessing_cache_lookups_total'):
+            self.assertIn(name, body)
+
+
+class AggregationTests(SimpleTestCase):
+    def test_statistics_match_a_per_comment_loop(self):
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 3, 500)
+        confidences = rng.random(500)
+        confidences[::7] = np.nan
+        published = np.datetime64('2024-03-01T00:00:00') + rng.integers(0, 20 * 86400, 500).astype('timedelta64[s]')
+
+        report = aggregation.aggregate(labels, confidences, published)
+
+        counts = {k: int(sum(1 for p in labels if p == k)) for k in range(3)}
+        self.assertEqual(report['sentiment_counts'], counts)
+        self.assertEqual(report['dominant_sentiment'], aggregation.IDX_TO_LABEL[max(counts, key=counts.get)])
+        scored = [(p, c) for p, c in zip(labels, confidences) if not np.isnan(c)]
+        self.assertEqual(report['low_confidence_count'], sum(1 for _, c in scored if c < aggregation.LOW_CONFIDENCE))
+        self.assertAlmostEqual(report['mean_confidence']['neutral'],
+                               np.mean([c for p, c in scored if p == 1]), places=3)
+        self.assertEqual(sum(map(sum, report['confidence_histogram'].values())), len(scored))
+
+        series = report['time_series']
+        self.assertEqual((series['unit'], len(series['periods'])), ('day', 20))
+        self.assertEqual(series['periods'][0], '2024-03-01')
+        first_day = labels[published < np.datetime64('2024-03-02')]
+        self.assertEqual([series['counts'][name][0] for name in ('negative', 'neutral', 'positive')],
+                         [int((first_day == k).sum()) for k in range(3)])
+
+    def test_missing_confidences_and_dates_are_skipped(self):
+        report = aggregation.aggregate([2, 2, 0], [np.nan] * 3, np.array(['NaT'] * 3, dtype='datetime64[s]'))
+
+        self.assertEqual(report['sentiment_counts'], {0: 1, 1: 0, 2: 2})
+        self.assertIsNone(report['overall_confidence'])
+        self.assertEqual(report['time_series']['periods'], [])
+
+
+    def test_agreement_and_kappa_of_models(self):
+        report = aggregation.agreement({'a': [2, 2, 0, 1], 'b': [2, 2, 0, 1], 'c': [2, 0, 0, 2]})
+
+        self.assertEqual(report['models'], ['a', 'b', 'c'])
+        self.assertEqual(report['agreement'][0], [1.0, 1.0, 0.5])
+        self.assertEqual(report['kappa'][0][1], 1.0)
+        # observed 0.5, expected by chance (0.25 * 0.5 + 0.5 * 0.5) = 0.375
+        self.assertEqual(report['kappa'][2][0], round((0.5 - 0.375) / (1 - 0.375), 4))
+        self.assertEqual(report['all_agree'], 0.5)
+        self.assertIsNone(aggregation.agreement({'a': [], 'b': []})['all_agree'])
+
+
+class IncrementalAggregationTests(TestCase):
+    def test_pages_are_stored_with_their_confidences(self):
+        state = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None)
+        records = [{'id': str(i), 'text': f'comment {i}', 'published_at': f'2024-05-0{i + 1}T10:00:00Z'}
+                   for i in range(4)]
+
+        state = incremental.add_page(state, records[:2], np.array([2, 0]), np.array([0.9, 0.4]))
+        state = incremental.add_page(state, records[2:], [1, 2])
+        labels, confidences, published = incremental.stored_arrays(state)
+
+        self.assertEqual(state.sentiment_counts, {0: 1, 1: 1, 2: 2})
+        self.assertEqual(labels.tolist(), [2, 1, 0, 2])
+        self.assertEqual(np.isnan(confidences).tolist(), [True, True, False, False])
+        self.assertEqual(str(published[-1]), '2024-05-01T10:00:00')
+        self.assertEqual(aggregation.aggregate(labels, confidences, published)['mean_confidence'],
+                         {'negative': 0.4, 'neutral': None, 'positive': 0.9})
+
+    def test_interrupted_run_keeps_its_paging_checkpoint(self):
+        state = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None)
+        records = [{'id': str(i), 'text': f'comment {i}'} for i in range(3)]
+        incremental.add_page(state, records[:2], [2, 0], next_page_token='page2')
+
+        # run stopped (e.g. quota exceeded): the next run finds it and continues after page 1
+        resumed = incremental.load_interrupted('abcdefghijk', 'naive_bayes', 'v1')
+        self.assertEqual(resumed.checkpoint, {'order': 'relevance', 'page_token': 'page2', 'fetched': 2})
+        self.assertIsNone(incremental.load_state('abcdefghijk', 'naive_bayes', 'v1'))
+        self.assertEqual(incremental.known_comment_ids(resumed), {'0', '1'})
+
+        resumed = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', resumed, 'relevance')
+        resumed = incremental.add_page(resumed, records[2:], [1])
+        resumed = incremental.finish_run(resumed)
+
+        self.assertEqual((resumed.comment_count, resumed.checkpoint), (3, None))
+        self.assertIsNone(incremental.load_interrupted('abcdefghijk', 'naive_bayes', 'v1'))
+        self.assertEqual(incremental.load_state('abcdefghijk', 'naive_bayes', 'v1').pk, state.pk)
+
+    def test_comments_stored_before_are_not_counted_again(self):
+        state = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None)
+        records = [{'id': str(i), 'text': f'comment {i}'} for i in range(4)]
+        state = incremental.add_page(state, records[:2], [2, 0], next_page_token='page2')
+
+        # a page fetched again after a resume, overlapping the stored one, with a repeated id
+        state = incremental.add_page(state, records[1:] + records[3:], [1, 1, 2, 2])
+
+        self.assertEqual(state.sentiment_counts, {0: 1, 1: 1, 2: 2})
+        self.assertEqual((state.comment_count, state.comments.count()), (4, 4))
+        self.assertEqual(state.comments.get(comment_id='1').label, 0)
+        self.assertEqual(state.checkpoint['fetched'], 6)
+
+    def test_new_runs_leave_running_and_older_analyses_until_they_finish(self):
+        first, second = [AnalysisJob.objects.create(video_id='abcdefghijk', model_name='naive_bayes',
+                                                    status=AnalysisJob.STATUS_RUNNING) for _ in range(2)]
+        records = [{'id': str(i), 'text': f'comment {i}'} for i in range(2)]
+        capped = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None,
+                                       coverage=VideoAnalysis.COVERAGE_CAPPED, owner=first.pk)
+
+        # a second capped run of the same video does not delete the running one
+        with self.assertRaises(incremental.AnalysisInProgress):
+            incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None,
+                                  coverage=VideoAnalysis.COVERAGE_CAPPED, owner=second.pk)
+        capped = incremental.finish_run(incremental.add_page(capped, records, [2, 0]))
+        self.assertEqual(capped.comment_count, 2)
+
+        # a run with a new model version: the old analysis stays readable until the new one is finished
+        old = incremental.finish_run(incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None))
+        new = incremental.start_run('abcdefghijk', 'naive_bayes', 'v2', None, owner=second.pk)
+        self.assertTrue(VideoAnalysis.objects.filter(pk=old.pk).exists())
+        incremental.finish_run(new)
+        self.assertFalse(VideoAnalysis.objects.filter(pk=old.pk).exists())
+        self.assertTrue(VideoAnalysis.objects.filter(pk=capped.pk).exists())
+
+    def test_overlapping_runs_do_not_share_the_analysis(self):
+        first, second = [AnalysisJob.objects.create(video_id='abcdefghijk', model_name='naive_bayes',
+                                                    status=AnalysisJob.STATUS_RUNNING) for _ in range(2)]
+        records = [{'id': str(i), 'text': f'comment {i}'} for i in range(3)]
+        state = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', None, owner=first.pk)
+        incremental.add_page(state, records[:2], [2, 0], next_page_token='page2')
+
+        # the same video submitted again while the first job runs: its unfinished run is not taken over
+        live = incremental.load_interrupted('abcdefghijk', 'naive_bayes', 'v1')
+        with self.assertRaises(incremental.AnalysisInProgress):
+            incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', live, 'relevance', owner=second.pk)
+        state = incremental.finish_run(incremental.add_page(state, records[2:], [1]))
+        self.assertEqual(state.comment_count, 3)
+
+        # both jobs re-run the finished analysis: the first one to claim it continues it
+        complete = incremental.load_state('abcdefghijk', 'naive_bayes', 'v1')
+        incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', complete, 'time', owner=second.pk)
+        with self.assertRaises(incremental.AnalysisInProgress):
+            incremental.start_run('abcdefghijk', 'naive_bayes', 'v1', complete, 'time', owner=first.pk)
+
+        # once the owner stopped (e.g. quota exceeded), its checkpoint can be continued
+        AnalysisJob.objects.filter(pk=second.pk).update(status=AnalysisJob.STATUS_FAILED)
+        resumed = incremental.start_run('abcdefghijk', 'naive_bayes', 'v1',
+                                        incremental.load_interrupted('abcdefghijk', 'naive_bayes', 'v1'),
+                                        'time', owner=first.pk)
+        self.assertEqual((resumed.pk, resumed.owner_id), (state.pk, first.pk))
+
+
+class ResumedAnalysisTests(TransactionTestCase):
+    spam = "Check out my channel for free gift cards and giveaways every day"
+
+    def classify(self, model_name, texts, timings=None):
+        self.classified.extend(texts)
+        return np.full(len(texts), 2, dtype=np.int64), np.full(len(texts), 0.9)
+
+    def test_duplicate_stats_cover_the_pages_stored_before_the_interruption(self):
+        from data_processing import views
+
+        self.classified = []
+        version = get_model_version('naive_bayes')
+        state = incremental.start_run('abcdefghijk', 'naive_bayes', version, None)
+        stored = [self.spam, self.spam + "!", "first comment"]
+        incremental.add_page(state, [{'id': f's{i}', 'text': t} for i, t in enumerate(stored)], [0, 0, 2],
+                             next_page_token='page2')
+        page = CommentPage({'id': f'n{i}', 'text': t, 'published_at': None}
+                           for i, t in enumerate([self.spam, "second comment"]))
+
+        with mock.patch.object(views, 'iter_comment_pages', return_value=iter([page])) as pages, \
+                mock.patch.object(views, 'translate_page', side_effect=lambda p: p), \
+                mock.patch.object(views, 'classify_texts', side_effect=self.classify), \
+                mock.patch.object(dedup, 'DEDUP_ENABLED', True):
+            stats = views.analyze_video('abcdefghijk', 'naive_bayes', lambda progress, step: None,
+                                        meta=('T', None, 'C', None, '1', '0', '5'))
+
+        self.assertEqual(pages.call_args.kwargs['page_token'], 'page2')
+        self.assertEqual(self.classified, ["second comment"])  # the spam copy got the stored label
+        self.assertEqual(stats['sentiment_counts'], {0: 3, 1: 0, 2: 2})
+        self.assertEqual(stats['duplicates'], {'comments': 5, 'exact': 2, 'near': 0, 'classified': 3,
+                                               'ratio': 0.4})
+
+
+class BatchTests(TransactionTestCase):
+    def setUp(self):
+        caches[progress.PROGRESS_CACHE].clear()  # job ids are reused after the flush of other tests
+
+    def fake_meta(self, video_ids):
+        counts = {'big': '20000'}
+        return {v: ('Title ' + v, None, 'Channel', None, '10', '1', counts.get(v, '100'))
+                for v in video_ids if v != 'missing'}
+
+    def fake_analyze_video(self, video_id, model_name, update_step, max_comments, meta):
+        update_step(50, "classifying")
+        labels = [2] * 3 + [0] if video_id == 'a' else [1] * max_comments
+        state = incremental.start_run(video_id, model_name, 'v1', None)
+        records = [{'id': f'{video_id}{i}', 'text': 'text', 'published_at': '2024-01-01T00:00:00Z'}
+                   for i in range(len(labels))]
+        state = incremental.add_page(state, records, labels, [0.9] * len(labels))
+        return {'video_title': meta[0], 'analysis_id': state.pk,
+                **aggregation.aggregate(*incremental.stored_arrays(state))}
+
+    def test_videos_are_checked_analysed_and_combined(self):
+        with mock.patch.object(batch, 'get_videos_meta', side_effect=self.fake_meta) as get_meta:
+            report = batch.run_batch(['a', 'missing', 'big', 'b', 'a'], 'naive_bayes', self.fake_analyze_video,
+                                     comments_per_video=2, workers=2)
+
+        get_meta.assert_called_once_with(['a', 'missing', 'big', 'b'])
+        self.assertEqual([(v['video_id'], v['status']) for v in report['videos']],
+                         [('a', 'done'), ('missing', 'skipped'), ('big', 'skipped'), ('b', 'done')])
+        self.assertEqual(report['videos'][0]['dominant_sentiment'], 'positive')
+        self.assertEqual(report['combined']['sentiment_counts'], {0: 1, 1: 2, 2: 3})
+        self.assertEqual(report['throughput']['videos'], 2)
+        self.assertGreater(report['throughput']['videos_per_hour'], 0)
+
+    def test_capped_runs_do_not_replace_the_full_analysis(self):
+        from data_processing import views
+
+        full = incremental.start_run('abcdefghijk', 'naive_bayes', get_model_version('naive_bayes'), None)
+        full = incremental.finish_run(incremental.add_page(full, [{'id': 'old', 'text': 'old comment'}], [2]))
+        page = CommentPage({'id': str(i), 'text': f'comment {i}', 'published_at': None} for i in range(5))
+
+        with mock.patch.object(views, 'iter_comment_pages', return_value=iter([page])) as pages, \
+                mock.patch.object(views, 'translate_page', side_effect=lambda p: p), \
+                mock.patch.object(views, 'classify_texts', side_effect=lambda m, texts, t=None: (
+                    np.zeros(len(texts), dtype=np.int64), np.full(len(texts), 0.9))):
+            stats = views.analyze_video('abcdefghijk', 'naive_bayes', lambda progress, step: None, max_comments=5,
+                                        meta=('T', None, 'C', None, '1', '0', '50'))
+
+        # relevance order from the start, not a continuation of the full analysis
+        self.assertEqual(pages.call_args.kwargs['order'], 'relevance')
+        capped = VideoAnalysis.objects.get(pk=stats['analysis_id'])
+        self.assertEqual((capped.coverage, capped.comment_count), (VideoAnalysis.COVERAGE_CAPPED, 5))
+        self.assertEqual(incremental.load_state('abcdefghijk', 'naive_bayes', get_model_version('naive_bayes')).pk,
+                         full.pk)
+        self.assertIsNone(result_cache.get_cached('abcdefghijk', 'naive_bayes', get_model_version('naive_bayes')))
+
+    def test_links_are_parsed_to_ids(self):
+        self.assertEqual(batch.parse_video_ids("dQw4w9WgXcQ, https://www.youtube.com/watch?v=abcdefghijk&t=3\n"
+                                               "https://youtu.be/ABCDEFGHIJK"),
+                         ['dQw4w9WgXcQ', 'abcdefghijk', 'ABCDEFGHIJK'])
+        self.assertEqual(batch.parse_channel("https://www.youtube.com/@somechannel"), '@somechannel')
+        self.assertEqual(batch.parse_playlist("https://www.youtube.com/playlist?list=PLabcdefghijkl"), 'PLabcdefghijkl')
+        with self.assertRaises(ValueError):
+            batch.parse_video_ids("https://example.com/video")
+
+    def test_endpoint_queues_the_batch_for_the_session(self):
+        self.assertEqual(self.client.post(reverse('batch_analysis'), {'videos': 'https://example.com'}).status_code, 400)
+        with mock.patch('data_processing.views.analysis_queue.submit') as submit:
+            response = self.client.post(reverse('batch_analysis'), {
+                'videos': 'dQw4w9WgXcQ https://youtu.be/abcdefghijk', 'model_name': 'naive_bayes',
+                'comments_per_video': '300'})
+
+        job = AnalysisJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.batch, {'videos': ['dQw4w9WgXcQ', 'abcdefghijk'], 'playlist': None, 'channel': None,
+                                     'comments_per_video': 300})
+        submit.assert_called_once()
+        self.assertEqual(self.client.get(reverse('batch_analysis'), {'job_id': job.pk}).json()['status'], 'queued')
+
+
+class CompareTests(TransactionTestCase):
+    texts = ["I love this song so much", "worst video ever, I hate it", "the video is ten minutes long",
+             "great great great", "not sure what to think"]
+
+    def fake_tokenize(self, texts, **kwargs):
+        return [text.lower().replace(',', '').split() for text in texts]
+
+    def test_tfidf_models_share_one_matrix(self):
+        from data_processing import views
+
+        vectorizer = MODEL_CATALOG.load('tfidf_vectorizer')
+        with mock.patch.object(views, 'tokenize_batch', side_effect=self.fake_tokenize) as tokenize, \
+                mock.patch.object(vectorizer, 'transform_tokens', wraps=vectorizer.transform_tokens) as transform:
+            timings = metrics.JobTimings('compare')
+            results = views.classify_texts_multi(['logistic_regression', 'naive_bayes', 'svc'], self.texts, timings)
+            self.assertEqual((tokenize.call_count, transform.call_count), (1, 1))
+
+            for name, (labels, confidences) in results.items():
+                expected_labels, expected_confidences = views.classify_texts(name, self.texts)
+                self.assertEqual(list(labels), list(expected_labels))
+                np.testing.assert_allclose(confidences, expected_confidences)
+        self.assertEqual(timings.breakdown()['predict:naive_bayes']['items'], len(self.texts))
+
+    def test_models_are_compared_on_the_same_comments(self):
+        pages = [[{'id': str(i), 'text': f'comment {i}', 'published_at': '2024-01-02T03:04:05Z'} for i in range(4)],
+                 [{'id': '4', 'text': 'comment 4', 'published_at': None}]]
+        votes = {'a': [2, 2, 0, 1, 2], 'b': [2, 0, 0, 1, 1]}
+
+        def classify_multi(model_names, texts, timings):
+            ids = [int(text.split()[-1]) for text in texts]
+            return {name: (np.array([votes[name][i] for i in ids]), np.full(len(ids), 0.75)) for name in model_names}
+
+        with mock.patch.object(compare, 'iter_comment_pages', return_value=iter(pages)), \
+                mock.patch.object(compare, 'translate_page', side_effect=lambda page: page), \
+                mock.patch.object(compare, 'get_yt_video_meta', return_value=('T', None, 'C', None, '1', '0', '5')), \
+                mock.patch.object(compare, 'COMPARE_MAX_DISAGREEMENTS', 1):
+            report = compare.run_comparison('abcdefghijk', ['a', 'b'], classify_multi)
+
+        self.assertEqual(report['comment_count'], 5)
+        self.assertEqual(report['per_model']['b']['sentiment_counts'], {0: 2, 1: 2, 2: 1})
+        self.assertEqual(report['agreement']['agreement'][0][1], 0.6)
+        self.assertEqual((report['disagreement_count'], report['disagreement_share']), (2, 0.4))
+        self.assertEqual(report['disagreements'], [{
+            'id': '1', 'text': 'comment 1', 'published_at': '2024-01-02T03:04:05Z',
+            'labels': {'a': 'positive', 'b': 'negative'}, 'confidences': {'a': 0.75, 'b': 0.75}}])
+
+    def test_endpoint_queues_the_comparison(self):
+        self.assertEqual(self.client.post(reverse('compare_models'), {
+            'video': 'dQw4w9WgXcQ', 'models': 'naive_bayes,unknown'}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('compare_models'), {
+            'video': 'dQw4w9WgXcQ', 'models': 'naive_bayes'}).status_code, 400)
+        with mock.patch('data_processing.views.analysis_queue.submit') as submit:
+            response = self.client.post(reverse('compare_models'), {'video': 'https://youtu.be/dQw4w9WgXcQ'})
+
+        job = AnalysisJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.video_id, job.model_name), ('dQw4w9WgXcQ', 'compare'))
+        self.assertEqual(job.compare['models'], compare.default_models())
+        submit.assert_called_once()
+        self.assertEqual(self.client.get(reverse('compare_models'), {'job_id': job.pk}).json()['status'], 'queued')
+
+
+class SamplingTests(TransactionTestCase):
+    def test_wilson_intervals_shrink_with_the_sample(self):
+        low, high = sampling.share_intervals({0: 20, 1: 0, 2: 80})
+        # Wilson interval of 80/100 at 95%: 0.7112 - 0.8667
+        self.assertAlmostEqual(low[2], 0.7112, places=3)
+        self.assertAlmostEqual(high[2], 0.8667, places=3)
+        self.assertEqual(low[1], 0.0)
+        self.assertGreater(high[1], 0.0)  # no neutral comment in the sample is not proof of a 0% share
+
+        self.assertLess(sampling.max_width([200, 0, 800]), sampling.max_width([20, 0, 80]))
+        # finite population: a sample of half the comments is more precise than of 1% of them
+        self.assertLess(sampling.max_width([200, 0, 800], total=2000), sampling.max_width([200, 0, 800], total=100000))
+        self.assertEqual(sampling.max_width([200, 0, 800], total=1000), 0.0)
+
+    def test_sampling_stops_once_the_shares_are_precise(self):
+        from data_processing import views
+
+        closed = []
+
+        def pages(video_id, max_comments):
+            try:
+                for p in range(max_comments // 100):
+                    yield CommentPage({'id': f'{p}-{i}', 'text': f'comment {p} {i}', 'published_at': None}
+                                      for i in range(100))
+            finally:
+                closed.append(True)
+
+        def classify(model_name, texts, timings=None):
+            return np.array([0 if i % 5 == 0 else 2 for i in range(len(texts))]), np.full(len(texts), 0.9)
+
+        with mock.patch.object(views, 'iter_sample_pages', side_effect=pages), \
+                mock.patch.object(views, 'translate_page', side_effect=lambda page: page), \
+                mock.patch.object(views, 'get_yt_video_meta', return_value=('T', None, 'C', None, '1', '0', '100000')), \
+                mock.patch.object(views, 'classify_texts', side_effect=classify), \
+                mock.patch.object(dedup, 'DEDUP_ENABLED', False):
+            stats = views.analyze_video('abcdefghijk', 'naive_bayes', lambda progress, step: None, sample=True)
+
+        # 80% positive: the 95% interval is 5 points wide after ~980 comments, the 10th page of 100
+        report = stats['sampling']
+        self.assertEqual((stats['comment_count'], report['sample_size'], report['total_comments']), (1000, 1000, 100000))
+        self.assertTrue(report['stopped_early'])
+        self.assertEqual(closed, [True])
+        self.assertLessEqual(report['max_width'], 5.0)
+        self.assertLess(report['intervals']['positive']['low'], stats['sentiment_share']['positive'])
+        self.assertGreater(report['intervals']['positive']['high'], stats['sentiment_share']['positive'])
+
+        # stored and cached as a sample: a full (e.g. batch) run neither continues it nor gets it from the cache
+        from data_processing import result_cache
+        version = get_model_version('naive_bayes')
+        self.assertEqual(VideoAnalysis.objects.get(pk=stats['analysis_id']).coverage, VideoAnalysis.COVERAGE_SAMPLE)
+        self.assertIsNone(incremental.load_state('abcdefghijk', 'naive_bayes', version))
+        self.assertIsNone(result_cache.get_cached('abcdefghijk', 'naive_bayes', version))
+        self.assertEqual(result_cache.get_cached('abcdefghijk', 'naive_bayes', version, 'sample').stats['sampling'],
+                         report)
+
+    def test_videos_above_the_limit_are_sampled(self):
+        with mock.patch('dashboard.views.check_video', return_value=(250000, None)):
+            response = self.client.post(reverse('sentiment_dashboard'), {
+                'youtube_link': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'model_name': 'naive_bayes'})
+
+        self.assertRedirects(response, reverse('loading'), fetch_redirect_response=False)
+        self.assertEqual(self.client.session['analysis_params'],
+                         {'video_id': 'dQw4w9WgXcQ', 'model_name': 'naive_bayes', 'sample': True})
@@ -1,175 +1,423 @@
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
-import os
-import joblib
+import atexit
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+
+import numpy as np
 from django.conf import settings
+from django.views.decorators.http import require_POST
+
+from data_processing.jobs import analysis_queue, cancel_job, current_job_id, QueueFull
+from data_processing.models import AnalysisJob, VideoAnalysis
+from data_processing import (result_cache, incremental, results_store, progress, aggregation, batch, compare, dedup,
+                             metrics, sampling)
+from data_processing.streaming import PipelineStage, run_pipeline
 # 1. IMPORT loading yt comments
-from youtube_integration.services import get_yt_comments, get_yt_video_meta, PRO_COMMENT_LIMIT
+from youtube_integration.services import (iter_comment_pages, iter_sample_pages, translate_page, get_yt_video_meta,
+                                          PRO_COMMENT_LIMIT)
 
 
 # ---------preprocessing  ----------
-# StopWords
-from spacy.lang.en.stop_words import STOP_WORDS
-import re
-import spacy
-
-# deep models
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch.nn.functional as F
-
-stopwords_set = set(STOP_WORDS)
-exclude_words = {'no', 'not', 'never', 'neither', 'nor', 'none', 'cannot'}
-final_stopwords = list(stopwords_set - exclude_words)
-
-
-def clean_text(text):
-    text = str(text)
-    temp = text.lower()
-    #temp = re.sub(r'\d+', '', temp)
-    temp = re.sub(r'<[^>]*>', '', temp)
-    emojis = re.findall(r'(?::|;|=)(?:-)?(?:\)|\(|D|P)', temp)
-    temp = re.sub(r'[^a-zA-Z\s]', ' ', temp)
-    temp = temp + ' ' + ' '.join(emojis).replace('-', '')
-    temp = re.sub(r'\s+', ' ', temp).strip()
-    return temp
-
-# Lemantization with spaCy:
-try:
-    nlp = spacy.load("en_core_web_sm", disable=['parser', 'ner'])
-except OSError:
-    print("Downloading spaCy (en_core_web_sm)...")
-    from spacy.cli import download
-
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm", disable=['parser', 'ner'])
-
-
-def text_tokenizer(text):
-    cleaned_text = clean_text(text)
-    doc = nlp(cleaned_text)
-
-    # (e.g., "was" -> "be", "dogs" -> "dog")
-    lemmas = [token.lemma_ for token in doc]
-
-    # Filtering
-    return [lemma for lemma in lemmas if lemma not in final_stopwords and len(lemma) > 2]
-
-
-# --- LOAD MODELS ---
-# location of saved models
-MODEL_DIR = os.path.join(settings.BASE_DIR, 'data_processing', 'colab_train_models', 'models')
-ROBERTA_MODEL_DIR = os.path.join(settings.BASE_DIR, 'data_processing', 'colab_train_models', 'models', 'roberta_model')
-
-try:
-    # Load the TF-IDF Vectorizer
-    VECTORIZER = joblib.load(os.path.join(MODEL_DIR, 'tfidf_vectorizer.joblib'))
-    MODEL_CATALOG = {
-        'logistic_regression': joblib.load(os.path.join(MODEL_DIR, 'logistic_regression_model.joblib')),
-        'naive_bayes': joblib.load(os.path.join(MODEL_DIR, 'naive_model.joblib')),
-        'svc': joblib.load(os.path.join(MODEL_DIR, 'svc_model.joblib')),
-    }
-    # Loading RoBERTa model
-    if os.path.exists(ROBERTA_MODEL_DIR):
-        print("Loading RoBERTa model...")
-        # Loading tokenizer
-        TOKENIZER_ROBERTA = AutoTokenizer.from_pretrained(ROBERTA_MODEL_DIR)
-        model_roberta = AutoModelForSequenceClassification.from_pretrained(ROBERTA_MODEL_DIR)
+# clean_text / lemmatization / stopwords live in preprocessing_text (shared with the training script)
+from data_processing import preprocessing_text
+from data_processing.preprocessing_text import clean_text, text_tokenizer, tokenize_batch
+
+# deep models: torch/transformers are imported by the registry and roberta_inference only when RoBERTa is used
+
+PIPE_BATCH_SIZE = getattr(settings, 'PREPROCESSING_BATCH_SIZE', 256)
+PIPE_N_PROCESS = getattr(settings, 'PREPROCESSING_N_PROCESS', 1)
+PREPROCESSING_CACHE_PATH = getattr(settings, 'PREPROCESSING_CACHE_PATH', None)
+PREPROCESSING_CACHE_SAVE_INTERVAL = getattr(settings, 'PREPROCESSING_CACHE_SAVE_INTERVAL', 300)
+PREPROCESSING_CACHE_SAVE_MIN_CHANGES = getattr(settings, 'PREPROCESSING_CACHE_SAVE_MIN_CHANGES', 10000)
+
+preprocessing_text.configure_cache(
+    text_cache_size=getattr(settings, 'PREPROCESSING_TEXT_CACHE_SIZE', None),
+    token_cache_size=getattr(settings, 'PREPROCESSING_TOKEN_CACHE_SIZE', None),
+    lemma_mode=getattr(settings, 'PREPROCESSING_LEMMA_MODE', None),
+)
+if PREPROCESSING_CACHE_PATH:
+    # caches written by other workers / previous runs
+    preprocessing_text.load_cache(PREPROCESSING_CACHE_PATH)
+    # what was added since the last periodic save is written when the process exits
+    atexit.register(preprocessing_text.save_cache_if_due, PREPROCESSING_CACHE_PATH, 0, 0)
 
-        #Switching to evaluation mode
-        model_roberta.eval()
-        MODEL_CATALOG['roberta'] = model_roberta
-        print("RoBERTa loaded successfully.")
-    else:
-        print(f"Warning: RoBERTa directory not found at {ROBERTA_MODEL_DIR}")
 
-    print("Models loaded successfully.")
+# --- MODELS ---
+# listed from the manifest and loaded on first use (data_processing.model_registry)
+from data_processing.model_registry import MODEL_CATALOG, get_model_version, is_transformer, uses_tfidf
+from data_processing.cascade import CascadeClassifier
 
-except Exception as e:
-    VECTORIZER = None
-    MODEL_CATALOG = {'no_models': None}
+ROBERTA_BATCH_SIZE = getattr(settings, 'ROBERTA_BATCH_SIZE', 32)
+
+
+def _session_job(request):
+    job_id = request.GET.get('job_id') or request.session.get('analysis_job_id')
+    # only jobs submitted from this session can be read or cancelled
+    allowed = [request.session.get('analysis_job_id'), *request.session.get('batch_job_ids', []),
+               *request.session.get('compare_job_ids', [])]
+    if not job_id or str(job_id) not in map(str, allowed):
+        return None
+    return AnalysisJob.objects.filter(pk=job_id).first()
 
 
 # NEW STATUS FUNCTION
 def get_analysis_status(request):
-    return JsonResponse(request.session.get('analysis_status', {'progress': 0, 'step': 'Waiting...'}))
+    job = _session_job(request)
+    if job is None:
+        return JsonResponse({'progress': 0, 'step': 'Waiting...', 'status': None})
+    return JsonResponse(progress.current(job.pk))
+
+
+def analysis_events(request):
+    """Server-Sent Events stream of the job's progress (same payload as get_analysis_status), ends with the job."""
+    job = _session_job(request)
+    if job is None:
+        return JsonResponse({"status": "error", "message": "No analysis in progress."}, status=404)
+    response = StreamingHttpResponse(progress.event_stream(job.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # no proxy buffering of the stream (nginx)
+    return response
+
+
+@require_POST
+def cancel_analysis(request):
+    job = _session_job(request)
+    if job is None:
+        return JsonResponse({"status": "error", "message": "No analysis to cancel."}, status=404)
+    cancel_job(job.pk)
+    return JsonResponse({"status": "cancelling", "job_id": job.pk})
 
 
 def run_analysis(request):
     params = request.session.pop('analysis_params', None)
     if not params: return redirect('sentiment_dashboard')
 
-    video_id, model_name = params['video_id'], params['model_name']
-    CLASSIFIER = MODEL_CATALOG.get(model_name)
-
-    def update_step(progress, step_name):
-        request.session['analysis_status'] = {'progress': progress, 'step': step_name}
-        request.session.save()
+    job = AnalysisJob.objects.create(video_id=params['video_id'], model_name=params['model_name'])
+    try:
+        # videos above PRO_COMMENT_LIMIT are estimated from a sample (data_processing.sampling)
+        analysis_queue.submit(job, partial(analyze_video, sample=True) if params.get('sample') else analyze_video)
+    except QueueFull as e:
+        job.status, job.step, job.error = AnalysisJob.STATUS_FAILED, 'Server busy.', str(e)
+        job.save(update_fields=['status', 'step', 'error'])
+        return JsonResponse({"status": "error", "message": str(e)}, status=503)
+
+    request.session['analysis_job_id'] = job.pk
+    return JsonResponse({"status": "queued", "job_id": job.pk})
+
+
+def batch_analysis(request):
+    """
+    POST queues a batch analysis: videos (ids or links separated by commas/whitespace), playlist (id or link),
+    channel (id, @handle or link), model_name, comments_per_video. Returns the job id.
+    GET ?job_id= returns the job's status and, once done, the per-video and combined reports.
+    Progress is also streamed by /analyze-events/?job_id=.
+    """
+    if request.method != 'POST':
+        job = _session_job(request)
+        if job is None or job.batch is None:
+            return JsonResponse({"status": "error", "message": "No such batch analysis."}, status=404)
+        payload = progress.current(job.pk)
+        if job.status == AnalysisJob.STATUS_DONE:
+            payload = dict(job.status_payload(), result=job.result)
+        return JsonResponse(payload)
+
+    model_name = request.POST.get('model_name', 'logistic_regression')
+    try:
+        params = {
+            'videos': batch.parse_video_ids(request.POST.get('videos')),
+            'playlist': batch.parse_playlist(request.POST.get('playlist')),
+            'channel': batch.parse_channel(request.POST.get('channel')),
+            'comments_per_video': max(1, min(int(request.POST.get('comments_per_video') or
+                                                 batch.BATCH_COMMENTS_PER_VIDEO), PRO_COMMENT_LIMIT)),
+        }
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    if not (params['videos'] or params['playlist'] or params['channel']):
+        return JsonResponse({"status": "error", "message": "Give videos, a playlist or a channel."}, status=400)
+    if len(params['videos']) > batch.BATCH_MAX_VIDEOS:
+        return JsonResponse({"status": "error",
+                             "message": f"Up to {batch.BATCH_MAX_VIDEOS} videos per batch."}, status=400)
+    if model_name not in MODEL_CATALOG:
+        return JsonResponse({"status": "error", "message": f"The selected model ({model_name}) is unavailable."},
+                            status=400)
+
+    job = AnalysisJob.objects.create(model_name=model_name, batch=params)
+    try:
+        analysis_queue.submit(job, partial(analyze_batch, params))
+    except QueueFull as e:
+        job.status, job.step, job.error = AnalysisJob.STATUS_FAILED, 'Server busy.', str(e)
+        job.save(update_fields=['status', 'step', 'error'])
+        return JsonResponse({"status": "error", "message": str(e)}, status=503)
+
+    request.session['batch_job_ids'] = [*request.session.get('batch_job_ids', [])[-9:], job.pk]
+    return JsonResponse({"status": "queued", "job_id": job.pk})
+
+
+def compare_models(request):
+    """
+    POST queues a comparison of models on one video: video (id or link), models (comma separated names,
+    default every TF-IDF model), max_comments. Returns the job id.
+    GET ?job_id= returns the job's status and, once done, the per-model aggregates, the agreement matrix
+    and the comments the models disagree on. Progress is also streamed by /analyze-events/?job_id=.
+    """
+    if request.method != 'POST':
+        job = _session_job(request)
+        if job is None or job.compare is None:
+            return JsonResponse({"status": "error", "message": "No such comparison."}, status=404)
+        payload = progress.current(job.pk)
+        if job.status == AnalysisJob.STATUS_DONE:
+            payload = dict(job.status_payload(), result=job.result)
+        return JsonResponse(payload)
 
     try:
-        # STEP 1, 2, 3 (YouTube: Download, Filter, Translate)
-        update_step(5, "Connecting to YouTube API...")
-        comments_list = get_yt_comments(video_id, progress_callback=update_step)
-
-        update_step(65, "Fetching video metadata...")
-        title, thumb, channel, published_at, views, likes = get_yt_video_meta(video_id)
-
-        predictions = []
-        # STEP 4: MODEL
-        if model_name == 'roberta':
-            update_step(70, "Deep Learning Analysis (RoBERTa)...")
-            for i, comment in enumerate(comments_list):
-                inputs = TOKENIZER_ROBERTA(comment, return_tensors="pt", truncation=True, max_length=128, padding=True)
-                with torch.no_grad():
-                    outputs = CLASSIFIER(**inputs)
-                predictions.append(torch.argmax(F.softmax(outputs.logits, dim=-1), dim=-1).item())
-
-                if i % 50 == 0:
-                    update_step(70 + int((i / len(comments_list)) * 20),
-                                f"Analyzing comment {i}/{len(comments_list)}...")
-        else:
-            update_step(70, "Preprocessing text for ML model...")
-            processed = [" ".join(text_tokenizer(c)) for c in comments_list]
-
-            update_step(85, f"Running {model_name} classifier...")
-            predictions = CLASSIFIER.predict(VECTORIZER.transform(processed))
-
-        # STEP 5: FINALIZATION
-        update_step(95, "Generating final report...")
-        idx_to_label = {0: 'negative', 1: 'neutral', 2: 'positive'}
-        classified_comments = [{'text': t, 'label': idx_to_label.get(int(p), 'unknown')} for t, p in
-                               zip(comments_list, predictions)]
-
-        sentiment_counts = {0: 0, 1: 0, 2: 0}
-        for pred in predictions: sentiment_counts[int(pred)] = sentiment_counts.get(int(pred), 0) + 1
-
-        total = len(predictions) or 1
-        sentiment_share = {idx_to_label[k]: round((sentiment_counts[k] / total) * 100.0, 1) for k in [0, 1, 2]}
-
-        if len(predictions) > 0:
-            avg_score = round(float(sum(predictions) / len(predictions)) - 1, 2)
-            avg_percent = round(((avg_score + 1) / 2) * 100, 1)
-            dominant_class = max(sentiment_counts, key=sentiment_counts.get)
-            dominant_sentiment = idx_to_label[dominant_class]
-            dominant_percent = round((sentiment_counts[dominant_class] / total) * 100.0, 1)
-        else:
-            avg_score = avg_percent = 0
-            dominant_sentiment = "N/A";
-            dominant_percent = 0
-
-        request.session['last_stats'] = {
-            'comment_count': len(comments_list), 'video_title': title, 'thumbnail_url': thumb,
-            'channel_title': channel, 'published_at': published_at, 'view_count': views, 'like_count': likes,
-            'sentiment_counts': sentiment_counts, 'sentiment_share': sentiment_share,
-            'avg_sentiment_score': avg_score, 'avg_sentiment_percent': avg_percent,
-            'dominant_sentiment': dominant_sentiment, 'dominant_sentiment_percent': dominant_percent,
-            'model_used': model_name, 'classified_comments': classified_comments,
+        video_ids = batch.parse_video_ids(request.POST.get('video'))
+        params = {
+            'models': compare.parse_models(request.POST.get('models')),
+            'max_comments': max(1, min(int(request.POST.get('max_comments') or PRO_COMMENT_LIMIT), PRO_COMMENT_LIMIT)),
         }
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    if len(video_ids) != 1:
+        return JsonResponse({"status": "error", "message": "Give one YouTube video id or link."}, status=400)
 
-        update_step(100, "Done!")
-        return JsonResponse({"status": "done"})
-    except Exception as e:
-        print(f"Error: {e}")
-        return JsonResponse({"status": "error", "message": str(e)})
\ No newline at end of file
+    job = AnalysisJob.objects.create(video_id=video_ids[0], model_name='compare', compare=params)
+    try:
+        analysis_queue.submit(job, partial(analyze_comparison, params))
+    except QueueFull as e:
+        job.status, job.step, job.error = AnalysisJob.STATUS_FAILED, 'Server busy.', str(e)
+        job.save(update_fields=['status', 'step', 'error'])
+        return JsonResponse({"status": "error", "message": str(e)}, status=503)
+
+    request.session['compare_job_ids'] = [*request.session.get('compare_job_ids', [])[-9:], job.pk]
+    return JsonResponse({"status": "queued", "job_id": job.pk})
+
+
+def analyze_comparison(params, video_id, model_name, update_step):
+    """Compare job run by the background workers (model_name is 'compare', the models are in params)."""
+    return compare.run_comparison(video_id, params['models'], classify_texts_multi, update_step,
+                                  params['max_comments'])
+
+
+def analyze_batch(params, video_id, model_name, update_step):
+    """Batch job run by the background workers (video_id is empty for batch jobs)."""
+    update_step(1, "Listing videos...")
+    video_ids = batch.resolve_video_ids(params.get('videos'), params.get('playlist'), params.get('channel'))
+    if not video_ids:
+        raise ValueError("No videos to analyse.")
+    return batch.run_batch(video_ids, model_name, analyze_video, params['comments_per_video'],
+                           update_step=update_step)
+
+
+def classify_texts(model_name, texts, timings=None):
+    """
+    Labels (0 negative, 1 neutral, 2 positive) of the texts with the given MODEL_CATALOG model and their
+    confidences (probability of the predicted label; NaN for models without probabilities, e.g. SVC).
+    The preprocess / vectorize / predict steps are timed in timings (metrics.JobTimings).
+    """
+    if not texts:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    timings = timings or metrics.JobTimings(model_name)
+    CLASSIFIER = MODEL_CATALOG[model_name]
+    if isinstance(CLASSIFIER, CascadeClassifier):
+        # the fast model on every comment, the expert on the uncertain ones (data_processing.cascade)
+        return CLASSIFIER.classify(texts, lambda name, subset: classify_texts(name, subset, timings), timings)
+    metrics.COMMENTS_CLASSIFIED.labels(model_name).inc(len(texts))
+    if is_transformer(model_name):
+        from data_processing.roberta_inference import predict_roberta
+        with timings.time("predict", len(texts)):
+            predictions, probabilities = predict_roberta(
+                texts, MODEL_CATALOG.load('roberta_tokenizer'), CLASSIFIER,
+                batch_size=ROBERTA_BATCH_SIZE,
+            )
+        return predictions, probabilities.max(axis=1)
+
+    X = tfidf_matrix(texts, timings)
+    with timings.time("predict", len(texts)):
+        return predict_sparse(CLASSIFIER, X)
+
+
+def tfidf_matrix(texts, timings):
+    # lemmas go straight into the TF-IDF matrix (no join, no second tokenizer pass)
+    with timings.time("preprocess", len(texts)):
+        tokens = tokenize_batch(texts, batch_size=PIPE_BATCH_SIZE, n_process=PIPE_N_PROCESS)
+    with timings.time("vectorize", len(texts)):
+        return MODEL_CATALOG.load('tfidf_vectorizer').transform_tokens(tokens)
+
+
+def predict_sparse(classifier, X):
+    """Labels and confidences of a classifier on a TF-IDF matrix (NaN confidences without predict_proba)."""
+    if not hasattr(classifier, 'predict_proba'):
+        return classifier.predict(X), np.full(X.shape[0], np.nan)
+    probabilities = classifier.predict_proba(X)
+    best = probabilities.argmax(axis=1)
+    return classifier.classes_[best], probabilities[np.arange(len(best)), best]
+
+
+def classify_texts_multi(model_names, texts, timings=None):
+    """
+    {model_name: (labels, confidences)} of the texts for several models (compare mode). The TF-IDF models
+    share one preprocessing pass and one sparse matrix, each of them only adds its predict call.
+    """
+    timings = timings or metrics.JobTimings('compare')
+    results = {}
+    shared = [name for name in model_names if uses_tfidf(name)]
+    if shared and texts:
+        X = tfidf_matrix(texts, timings)
+        for name in shared:
+            metrics.COMMENTS_CLASSIFIED.labels(name).inc(len(texts))
+            with timings.time("predict", len(texts), model=name):
+                results[name] = predict_sparse(MODEL_CATALOG[name], X)
+    for name in model_names:
+        if name not in results:
+            results[name] = classify_texts(name, texts, timings)
+    return {name: results[name] for name in model_names}
+
+
+def prometheus_metrics(request):
+    """Prometheus scrape endpoint (data_processing.metrics, youtube_integration.metrics)."""
+    body, content_type = metrics.exposition()
+    return HttpResponse(body, content_type=content_type)
+
+
+def _comment_total(meta_future):
+    """commentCount of the video once its metadata is fetched, else None."""
+    if meta_future.done() and meta_future.result()[6]:
+        return int(meta_future.result()[6])
+    return None
+
+
+def analyze_video(video_id, model_name, update_step, max_comments=PRO_COMMENT_LIMIT, meta=None, sample=False):
+    """
+    Whole analysis pipeline for one video, run by the background workers (data_processing.jobs).
+    update_step(progress, step_name) reports progress; returns the summary shown by results_dashboard
+    (the classified comments themselves are left in the database, see results_store).
+    max_comments caps the comments fetched (batch mode quota; below PRO_COMMENT_LIMIT the run is stored as a
+    capped analysis, see incremental), meta is the get_yt_video_meta() tuple if
+    it was already fetched (batch mode gets it for 50 videos per call).
+    Pages of comments are translated and classified while the next pages are downloaded (data_processing.streaming).
+    If the video was analysed before with the same model, only the new comments are fetched and classified;
+    a run that was interrupted (e.g. YouTube quota exceeded) continues from the last stored page.
+    sample=True (videos above PRO_COMMENT_LIMIT) classifies a new sample of up to SAMPLING_MAX_COMMENTS comments
+    from the time and relevance orders, stops once the shares are precise enough and reports their intervals.
+    """
+    model_version = get_model_version(model_name)
+    timings = metrics.JobTimings(model_name)
+    # a capped run (batch mode) only sees part of the comments: it is stored apart from the full analysis,
+    # always starts anew and is not cached as the video's result
+    capped = not sample and max_comments < PRO_COMMENT_LIMIT
+    coverage = (VideoAnalysis.COVERAGE_SAMPLE if sample else
+                VideoAnalysis.COVERAGE_CAPPED if capped else VideoAnalysis.COVERAGE_FULL)
+    # a sample is always drawn anew, it is not extended like a full analysis
+    state = None if sample or capped else incremental.load_state(video_id, model_name, model_version)
+    if state is None and not (sample or capped):
+        state = incremental.load_interrupted(video_id, model_name, model_version)
+    checkpoint = state.checkpoint if state is not None and not state.complete else None
+    order = checkpoint['order'] if checkpoint else ("time" if state is not None else "relevance")
+    incremental_run = order == "time"
+    known_ids = incremental.known_comment_ids(state)
+    resumed = bool(checkpoint and checkpoint['fetched'])
+    # duplicate counts of the earlier runs, the new comments' are added to them
+    previous_duplicates = (state.report or {}).get('duplicates') if incremental_run and not resumed else None
+    deduplicator = dedup.Deduplicator() if dedup.DEDUP_ENABLED else None
+    if deduplicator is not None and resumed:
+        # the comments stored before the interruption are grouped again: later copies reuse their labels and
+        # the duplicate stats cover the whole analysis, like comment_count
+        deduplicator.seed(state.comments.order_by('pk').values_list('text', 'label', 'confidence').iterator())
+
+    update_step(5, "Connecting to YouTube API...")
+    with ThreadPoolExecutor(max_workers=1) as meta_pool:
+        # video metadata is fetched while the comments are paged
+        meta_future = meta_pool.submit((lambda: meta) if meta is not None else partial(get_yt_video_meta, video_id))
+        state = incremental.start_run(video_id, model_name, model_version, state, order, coverage,
+                                      owner=current_job_id())
+
+        # STEP 1-4 (YouTube: Download, Filter, Translate -> MODEL), one page of up to 100 comments at a time.
+        # Re-run: newest first, stop at the first comment analysed last time.
+        # Resumed run: from the checkpoint's page token, skipping the comments stored before the interruption.
+        # Sampling: pages alternate between the newest and the most relevant comments.
+        if sample:
+            max_comments = min(max_comments, sampling.SAMPLING_MAX_COMMENTS)
+            pages = iter_sample_pages(video_id, max_comments)
+        elif checkpoint and checkpoint['fetched'] and not checkpoint['page_token']:
+            pages = iter(())  # paging had finished, only the finalization was left
+        else:
+            pages = iter_comment_pages(video_id, order=order,
+                                       max_results_total=max_comments - (checkpoint or {}).get('fetched', 0),
+                                       known_ids=known_ids if incremental_run else None,
+                                       page_token=(checkpoint or {}).get('page_token'), skip_ids=known_ids)
+        fetch = PipelineStage("fetch", timings=timings)
+        translate = PipelineStage("translate", translate_page, timings)
+
+        def classify_page(page):
+            texts = [r['text'] for r in page]
+            if deduplicator is None:
+                return page, classify_texts(model_name, texts, timings)
+            # one representative per group of duplicates is classified, the others get its label
+            return page, deduplicator.classify(texts, lambda subset: classify_texts(model_name, subset, timings))
+
+        classify = PipelineStage("classify", classify_page, timings)
+
+        expected = max_comments
+        stopped_early = False
+        with closing(run_pipeline(pages, fetch, [translate, classify])) as results:
+            for records, (predictions, confidences) in results:
+                # STEP 5: aggregates are updated page by page
+                with timings.time("store", len(records)):
+                    state = incremental.add_page(state, records, predictions, confidences, records.next_page_token)
+
+                comment_total = _comment_total(meta_future)
+                if comment_total:
+                    expected = max(1, min(max_comments, comment_total - len(known_ids)))
+                update_step(10 + int(min(1.0, classify.items / expected) * 80),
+                            f"Fetched {fetch.items}, translated {translate.items}, classified {classify.items} comments "
+                            f"({classify.throughput()} comments/s)...")
+                if sample and sampling.precise_enough(state.sentiment_counts, comment_total):
+                    stopped_early = True  # closing the pipeline stops the paging
+                    break
+
+        state = incremental.finish_run(state)
+        if PREPROCESSING_CACHE_PATH and not is_transformer(model_name):
+            preprocessing_text.save_cache_if_due(PREPROCESSING_CACHE_PATH, PREPROCESSING_CACHE_SAVE_INTERVAL,
+                                                 PREPROCESSING_CACHE_SAVE_MIN_CHANGES)
+
+        update_step(90, "Fetching video metadata...")
+        with timings.time("metadata"):
+            title, thumb, channel, published_at, views, likes, _ = meta_future.result()
+
+    # FINALIZATION
+    update_step(95, "Generating final report...")
+    # counts, shares, confidence statistics and time series recomputed over all stored comments (aggregation)
+    with timings.time("report"):
+        labels, confidences, published = incremental.stored_arrays(state)
+        summary = aggregation.aggregate(labels, confidences, published)
+
+    stats = {
+        'video_title': title, 'thumbnail_url': thumb,
+        'channel_title': channel, 'published_at': published_at, 'view_count': views, 'like_count': likes,
+        **summary,
+        'model_used': model_name, 'analysis_id': state.pk,
+        'new_comment_count': classify.items, 'incremental': incremental_run,
+        'pipeline_stats': {stage.name: stage.stats() for stage in (fetch, translate, classify)},
+        # seconds per stage and step of this analysis (classify = preprocess + vectorize + predict)
+        'timings': timings.breakdown(),
+    }
+    if sample:
+        # shares are estimates: sample size and confidence intervals for the dashboard's error bars
+        stats['sampling'] = sampling.report(state.sentiment_counts, _comment_total(meta_future), stopped_early)
+    if deduplicator is not None:
+        # exact / near-duplicate comments (a spam signal), classified once per group
+        stats['duplicates'] = deduplicator.stats(previous_duplicates)
+    if 'escalated' in stats['timings']:
+        # cascade: share of the comments it classified (one per group of duplicates) that went on to RoBERTa
+        stats['escalated_fraction'] = round(
+            stats['timings']['escalated']['items'] / (stats['timings']['fast']['items'] or 1), 3)
+    # the comments stay in AnalyzedComment, the dashboard pages through them (results_store)
+    results_store.save_report(state, stats)
+    if not capped:
+        # a sample is only reused for another sampling request of the video (coverage 'sample')
+        result_cache.store(video_id, model_name, model_version, stats, labels, coverage)
+    return stats
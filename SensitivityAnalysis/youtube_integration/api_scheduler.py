@@ -0,0 +1,186 @@
+# youtube_integration/api_scheduler.py
+# Every YouTube Data API request goes through the ApiScheduler of its API key (owned by the client pool):
+# - quota: units used per key and day (YouTube resets quotas at midnight Pacific time); a request that
+#   would go over YOUTUBE_DAILY_QUOTA, or an API "quotaExceeded" answer, raises QuotaExceeded. The units are
+#   counted in the Django cache YOUTUBE_QUOTA_CACHE, so every process using the key (and the next one after a
+#   restart) sees the same usage; share that cache between processes (e.g. Redis) when running several workers
+# - rate limit: token bucket of YOUTUBE_REQUESTS_PER_SECOND requests/s (bursts up to YOUTUBE_BURST)
+# - retries: 5xx, 429, per-user rate limits and network errors are retried up to YOUTUBE_RETRIES times
+#   with exponential backoff and full jitter (or the server's Retry-After), both capped at MAX_BACKOFF seconds
+# Requests, their duration and the quota units used are counted in youtube_integration.metrics.
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import httplib2
+from django.conf import settings
+from django.core.cache import caches
+from googleapiclient.errors import HttpError
+
+from youtube_integration import metrics
+
+DAILY_QUOTA = getattr(settings, 'YOUTUBE_DAILY_QUOTA', 10000)
+REQUESTS_PER_SECOND = getattr(settings, 'YOUTUBE_REQUESTS_PER_SECOND', 10.0)
+BURST = getattr(settings, 'YOUTUBE_BURST', 10)
+RETRIES = getattr(settings, 'YOUTUBE_RETRIES', 4)
+BACKOFF = getattr(settings, 'YOUTUBE_BACKOFF', 1.0)
+MAX_BACKOFF = 32.0
+QUOTA_CACHE = getattr(settings, 'YOUTUBE_QUOTA_CACHE', 'default')
+QUOTA_ENTRY_TTL = 2 * 24 * 60 * 60  # a day's counter outlives the day in every timezone
+
+# quota units per call (https://developers.google.com/youtube/v3/determine_quota_cost)
+QUOTA_COSTS = {
+    'commentThreads.list': 1,
+    'videos.list': 1,
+    'playlistItems.list': 1,
+    'channels.list': 1,
+    'search.list': 100,
+}
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+QUOTA_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+RETRY_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError', 'internalError'}
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def error_reason(error):
+    """'reason' of an HttpError's JSON body (e.g. quotaExceeded), '' if there is none."""
+    try:
+        details = json.loads(error.content.decode('utf-8'))['error']
+        return (details.get('errors') or [{}])[0].get('reason') or details.get('status', '')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return ''
+
+
+def quota_day():
+    """Current quota day of the API (YouTube resets quotas at midnight Pacific time)."""
+    return datetime.now(QUOTA_TIMEZONE).date()
+
+
+class TokenBucket:
+    """rate tokens per second, up to capacity; acquire() blocks until a token is available."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class ApiScheduler:
+    def __init__(self, api_key, daily_quota=DAILY_QUOTA, requests_per_second=REQUESTS_PER_SECOND, burst=BURST,
+                 retries=RETRIES, backoff=BACKOFF, sleep=time.sleep):
+        self.api_key = api_key
+        self.daily_quota = daily_quota
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.bucket = TokenBucket(requests_per_second, burst, sleep=sleep)
+        self.requests = 0
+        self.retried = 0
+        self._key = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]  # the key itself stays out of the cache
+        self._lock = threading.Lock()
+
+    def _keys(self):
+        """Cache keys of today's units used and exhausted flag of the API key, and today's date."""
+        day = quota_day()
+        return f"youtube-quota:{self._key}:{day}", f"youtube-quota-exhausted:{self._key}:{day}", day
+
+    def _charge(self, cost, method):
+        cache = caches[QUOTA_CACHE]
+        used_key, exhausted_key, _ = self._keys()
+        cache.add(used_key, 0, QUOTA_ENTRY_TTL)
+        used = cache.incr(used_key, cost)
+        if cache.get(exhausted_key) or used > self.daily_quota:
+            used = cache.decr(used_key, cost)
+            raise QuotaExceeded(f"YouTube API quota used up for today ({used}/{self.daily_quota} units), "
+                                f"{method} needs {cost}.")
+        with self._lock:
+            self.requests += 1
+
+    def _set_exhausted(self):
+        caches[QUOTA_CACHE].set(self._keys()[1], True, QUOTA_ENTRY_TTL)
+
+    def quota_used(self):
+        return caches[QUOTA_CACHE].get(self._keys()[0], 0)
+
+    def status(self):
+        used_key, exhausted_key, day = self._keys()
+        cache = caches[QUOTA_CACHE]
+        with self._lock:
+            return {'day': str(day), 'used': cache.get(used_key, 0), 'daily_quota': self.daily_quota,
+                    'exhausted': bool(cache.get(exhausted_key)), 'requests': self.requests, 'retried': self.retried}
+
+    def _delay(self, attempt, error=None):
+        resp = getattr(error, 'resp', None)
+        retry_after = resp.get('retry-after') if resp is not None else None
+        if retry_after and str(retry_after).isdigit():
+            return min(float(retry_after), MAX_BACKOFF)
+        # full jitter: uniform in [0, backoff * 2^attempt]
+        return random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt))
+
+    def execute(self, request, method):
+        """request.execute() for an API method name of QUOTA_COSTS, with quota accounting, rate limit and retries."""
+        cost = QUOTA_COSTS.get(method, 1)
+        attempt = 0
+        while True:
+            try:
+                self._charge(cost, method)  # failed requests are charged too
+            except QuotaExceeded:
+                metrics.API_REQUESTS.labels(method, 'quota_exceeded').inc()
+                raise
+            metrics.API_QUOTA_UNITS.labels(method).inc(cost)
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = request.execute()
+                metrics.API_REQUESTS.labels(method, 'ok').inc()
+                return response
+            except HttpError as e:
+                status, reason = e.resp.status, error_reason(e)
+                if reason in QUOTA_REASONS:
+                    self._set_exhausted()
+                    metrics.API_REQUESTS.labels(method, 'quota_exceeded').inc()
+                    raise QuotaExceeded(f"YouTube API quota exceeded ({reason}).") from e
+                retryable = status >= 500 or status == 429 or reason in RETRY_REASONS
+                if not retryable or attempt >= self.retries:
+                    metrics.API_REQUESTS.labels(method, 'error').inc()
+                    raise
+                error = e
+            except (OSError, httplib2.HttpLib2Error) as e:
+                if attempt >= self.retries:
+                    metrics.API_REQUESTS.labels(method, 'error').inc()
+                    raise
+                error = e
+            finally:
+                metrics.API_REQUEST_SECONDS.labels(method).observe(time.perf_counter() - start)
+            metrics.API_REQUESTS.labels(method, 'retried').inc()
+            delay = self._delay(attempt, error)
+            logging.warning(f"YouTube {method} failed ({error}), retry {attempt + 1}/{self.retries} in {delay:.2f}s")
+            with self._lock:
+                self.retried += 1
+            self.sleep(delay)
+            attempt += 1
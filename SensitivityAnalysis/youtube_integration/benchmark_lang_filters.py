@@ -4,17 +4,21 @@ from youtube_integration.benchmark_lang_filters import test_all_filters
 test_all_filters("ID_FILMU")
 
 Benchmark of language filtering methods on YouTube comments.
+"cascade p=N" runs the cascade on N worker processes (only used for batches of PROCESS_POOL_MIN_TEXTS or more).
 """
 
+from functools import partial
+
 from youtube_integration.services import get_yt_comments
 from youtube_integration.language_filtering import (
     filter_lang_langdetect,
     filter_lang_langid,
     filter_lang_cld2,
+    filter_lang_cascade,
 )
 
 
-def test_all_filters(video_id):
+def test_all_filters(video_id, processes=4):
     comments = get_yt_comments(video_id)
     print(f"Pobrano {len(comments)} komentarzy.\n")
 
@@ -24,10 +28,12 @@ def test_all_filters(video_id):
         filter_lang_langdetect,
         filter_lang_langid,
         filter_lang_cld2,
+        filter_lang_cascade,
+        partial(filter_lang_cascade, processes=processes),
     ]
 
     for i, f in enumerate(tests, 1):
-        print(f"Test {i}/{len(tests)} — {f.__name__}")
+        print(f"Test {i}/{len(tests)} — {getattr(f, '__name__', None) or f.func.__name__}")
         en, non_en, stats = f(comments)
         print(stats)
         results.append(stats)
@@ -36,7 +42,7 @@ def test_all_filters(video_id):
 
     for r in results:
         print(
-            f"{r['method']:10} | EN: {r['english']:4} | "
+            f"{r['method']:14} | EN: {r['english']:4} | "
             f"NON-EN: {r['non_english']:4} | time: {r['time']}s"
         )
 
@@ -0,0 +1,137 @@
+# youtube_integration/language_detection.py
+# Batch language detection of comments.
+#
+# detect_languages(texts) returns two numpy arrays aligned with texts: language codes and confidences (0-1).
+# - texts with fewer than MIN_LETTERS letters (emoji, "ok", "!!!") are not sent to any engine: code "und"
+# - ASCII-only texts made up mostly of common English words are marked "en" without running an engine
+# - "cascade" runs cld2 (fast) first and only passes the texts cld2 is unsure about to langid
+# - with processes > 1, batches of at least PROCESS_POOL_MIN_TEXTS texts are split over worker processes
+
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pycld2 as cld2
+from django.conf import settings
+from langdetect import DetectorFactory, detect_langs, LangDetectException
+from langid.langid import LanguageIdentifier, model as langid_model
+
+CONFIDENCE_THRESHOLD = 0.90
+UNDETERMINED = "und"
+MIN_LETTERS = 3
+PROCESS_POOL_MIN_TEXTS = 2000
+
+# ASCII short-circuit: at least ASCII_MIN_WORDS words, ASCII_ENGLISH_SHARE of them in ENGLISH_WORDS
+ASCII_MIN_WORDS = 3
+ASCII_ENGLISH_SHARE = 0.4
+ASCII_ENGLISH_CONFIDENCE = 0.95
+# frequent English words that are not common words of other Latin-script languages
+ENGLISH_WORDS = frozenset({
+    "the", "and", "is", "are", "was", "were", "you", "your", "this", "that", "it", "its", "it's", "i", "i'm",
+    "with", "for", "of", "my", "so", "what", "have", "has", "just", "not", "be", "he", "she", "they", "we",
+    "love", "like", "but", "on", "at", "how", "who", "why", "when", "all", "very", "from", "don't", "can",
+    "will", "would", "there", "their", "been", "about", "really", "great", "good", "video", "thank", "thanks",
+})
+
+DETECTION_ENGINE = getattr(settings, 'LANGUAGE_DETECTION_ENGINE', 'cascade')
+DETECTION_PROCESSES = getattr(settings, 'LANGUAGE_DETECTION_PROCESSES', 1)
+
+DetectorFactory.seed = 0  # langdetect results are random otherwise
+
+_WORD_RE = re.compile(r"[a-z']+")
+_langid_identifier = None
+
+
+def _cld2(text):
+    try:
+        reliable, _, details = cld2.detect(text)
+    except Exception:  # cld2 rejects invalid UTF-8 (e.g. lone surrogates from some emoji)
+        return UNDETERMINED, 0.0
+    code, percent = details[0][1], details[0][2]
+    if code == "un":
+        return UNDETERMINED, 0.0
+    return code, percent / 100.0 if reliable else 0.0
+
+
+def _langid(text):
+    global _langid_identifier
+    if _langid_identifier is None:
+        # norm_probs=True gives probabilities; langid.classify returns unnormalised log-probabilities
+        _langid_identifier = LanguageIdentifier.from_modelstring(langid_model, norm_probs=True)
+    code, prob = _langid_identifier.classify(text)
+    return code, float(prob)
+
+
+def _langdetect(text):
+    try:
+        top = detect_langs(text)[0]
+    except LangDetectException:
+        return UNDETERMINED, 0.0
+    return top.lang, top.prob
+
+
+ENGINES = {"cld2": _cld2, "langid": _langid, "langdetect": _langdetect}
+
+
+def _short_circuit(text):
+    """(code, confidence) for texts that need no engine, None otherwise."""
+    if sum(1 for ch in text if ch.isalpha()) < MIN_LETTERS:
+        return UNDETERMINED, 0.0
+    if text.isascii():
+        words = _WORD_RE.findall(text.lower())
+        if len(words) >= ASCII_MIN_WORDS and \
+                sum(1 for w in words if w in ENGLISH_WORDS) >= ASCII_ENGLISH_SHARE * len(words):
+            return "en", ASCII_ENGLISH_CONFIDENCE
+    return None
+
+
+def _detect_chunk(texts, engine, threshold):
+    codes = []
+    confidences = []
+    for text in texts:
+        result = _short_circuit(text)
+        if result is None:
+            if engine == "cascade":
+                result = _cld2(text)
+                if result[1] < threshold:
+                    fallback = _langid(text)
+                    if fallback[1] > result[1]:
+                        result = fallback
+            else:
+                result = ENGINES[engine](text)
+        codes.append(result[0])
+        confidences.append(result[1])
+    return codes, confidences
+
+
+def detect_languages(texts, engine=None, threshold=CONFIDENCE_THRESHOLD, processes=None):
+    """
+    Detects the language of every text. Returns (codes, confidences) numpy arrays aligned with texts.
+    engine: "cascade" (default, LANGUAGE_DETECTION_ENGINE setting), "cld2", "langid" or "langdetect".
+    threshold: in cascade mode, cld2 results below it are re-checked with langid.
+    processes: worker processes for large batches (LANGUAGE_DETECTION_PROCESSES setting by default).
+    """
+    engine = engine or DETECTION_ENGINE
+    if engine != "cascade" and engine not in ENGINES:
+        raise ValueError(f"Unknown language detection engine: {engine}")
+    texts = list(texts)
+    processes = processes or DETECTION_PROCESSES
+
+    if processes > 1 and len(texts) >= PROCESS_POOL_MIN_TEXTS:
+        size = -(-len(texts) // processes)
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        codes, confidences = [], []
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for chunk_codes, chunk_confidences in pool.map(
+                    _detect_chunk, chunks, [engine] * len(chunks), [threshold] * len(chunks)):
+                codes.extend(chunk_codes)
+                confidences.extend(chunk_confidences)
+    else:
+        codes, confidences = _detect_chunk(texts, engine, threshold)
+
+    return np.array(codes, dtype=object), np.array(confidences, dtype=np.float64)
+
+
+def english_mask(codes, confidences, threshold=CONFIDENCE_THRESHOLD):
+    """Boolean array: True where the text is English with at least the given confidence."""
+    return (codes == "en") & (confidences >= threshold)
@@ -2,97 +2,44 @@
 # each method returns a tuple (english_comments, non_english_comments, stats_dict)
 
 #functionf for filtering comments into en and non-en used in script
+# detection itself is done in batches by language_detection.detect_languages
 
 import time
-import math
 
-from langdetect import detect_langs, LangDetectException
-import langid
-import pycld2 as cld2
+from youtube_integration.language_detection import CONFIDENCE_THRESHOLD, detect_languages, english_mask
 
-CONFIDENCE_THRESHOLD = 0.90
 
-
-# LANGDETECT
-def filter_lang_langdetect(comments):
+def filter_lang(comments, engine, processes=None):
     start = time.time()
-    en = []
-    non_en = []
-
-    for c in comments:
-        try:
-            langs = detect_langs(c)
-            top = langs[0]
-            lang = top.lang
-            prob = top.prob
+    codes, confidences = detect_languages(comments, engine=engine, processes=processes)
+    is_en = english_mask(codes, confidences, CONFIDENCE_THRESHOLD)
 
-            if lang == "en" and prob >= CONFIDENCE_THRESHOLD:
-                en.append(c)
-            else:
-                non_en.append(c)
-
-        except LangDetectException:
-            non_en.append(c)
+    en = [c for c, keep in zip(comments, is_en) if keep]
+    non_en = [c for c, keep in zip(comments, is_en) if not keep]
 
     return en, non_en, {
-        "method": "langdetect",
+        "method": engine if not processes or processes == 1 else f"{engine} p={processes}",
         "english": len(en),
         "non_english": len(non_en),
         "time": round(time.time() - start, 3),
     }
 
 
-# LANGID
-def filter_lang_langid(comments):
-    start = time.time()
-    en = []
-    non_en = []
-
-    for c in comments:
-        try:
-            lang, logprob = langid.classify(c)  # logprob = ln(p)
-            prob = math.exp(logprob)           # próbujemy odzyskać p z log(p)
+# LANGDETECT
+def filter_lang_langdetect(comments):
+    return filter_lang(comments, "langdetect")
 
-            if lang == "en" and prob >= CONFIDENCE_THRESHOLD:
-                en.append(c)
-            else:
-                non_en.append(c)
-        except Exception:
-            non_en.append(c)
 
-    return en, non_en, {
-        "method": "langid",
-        "english": len(en),
-        "non_english": len(non_en),
-        "time": round(time.time() - start, 3),
-    }
+# LANGID
+def filter_lang_langid(comments):
+    return filter_lang(comments, "langid")
 
 
 # CLD2
 def filter_lang_cld2(comments):
-    start = time.time()
-    en = []
-    non_en = []
-
-    for c in comments:
-        try:
-            reliable, textBytesFound, details = cld2.detect(c)
-            # details[0] = (language_name, language_code, percent, score)
-            lang_code = details[0][1]
-            percent = details[0][2]
-            prob = percent / 100.0
+    return filter_lang(comments, "cld2")
 
-            if lang_code == "en" and prob >= CONFIDENCE_THRESHOLD and reliable:
-                en.append(c)
-            else:
-                non_en.append(c)
 
-        except Exception:
-            non_en.append(c)
-
-    return en, non_en, {
-        "method": "cld2",
-        "english": len(en),
-        "non_english": len(non_en),
-        "time": round(time.time() - start, 3),
-    }
+# CLD2 -> LANGID for unreliable results
+def filter_lang_cascade(comments, processes=None):
+    return filter_lang(comments, "cascade", processes)
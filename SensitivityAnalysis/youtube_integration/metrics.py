@@ -0,0 +1,22 @@
+# youtube_integration/metrics.py
+# Prometheus metrics of the YouTube Data API client and the translation of comments (prometheus_client,
+# default registry; exposed with the pipeline metrics of data_processing.metrics at /metrics).
+
+from prometheus_client import Counter, Histogram
+
+API_REQUESTS = Counter('youtube_api_requests_total', "YouTube Data API requests by method and outcome "
+                       "(ok, retried, error, quota_exceeded).", ['method', 'outcome'])
+API_REQUEST_SECONDS = Histogram('youtube_api_request_duration_seconds', "Duration of YouTube Data API requests.",
+                                ['method'])
+API_QUOTA_UNITS = Counter('youtube_api_quota_units_total', "Quota units charged for YouTube Data API requests.",
+                          ['method'])
+COMMENTS_FETCHED = Counter('youtube_comments_fetched_total', "Top-level comments downloaded from the API.")
+LANGUAGE_DETECTION_SECONDS = Histogram('youtube_language_detection_duration_seconds',
+                                       "Language detection time per page of comments.")
+
+TRANSLATION_CHUNKS = Counter('translation_chunks_total', "Chunks of texts sent to the translator, by outcome "
+                             "(ok, failed after the retries).", ['outcome'])
+TRANSLATION_CHUNK_SECONDS = Histogram('translation_chunk_duration_seconds',
+                                      "Translation time per chunk, retries included.")
+TRANSLATION_TEXTS = Counter('translation_texts_total', "Texts to translate by source of the result "
+                            "(cache, translator, failed).", ['source'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=40)),
+                ('target', models.CharField(max_length=8)),
+                ('source_text', models.TextField()),
+                ('translated_text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source_hash', 'target'), name='unique_cached_translation')],
+            },
+        ),
+    ]
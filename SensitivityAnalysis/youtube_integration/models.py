@@ -1,3 +1,18 @@
 from django.db import models
 
-# Create your models here.
+
+class CachedTranslation(models.Model):
+    """Translation of one source text, reused by youtube_integration.translation across runs."""
+    source_hash = models.CharField(max_length=40)
+    target = models.CharField(max_length=8)
+    source_text = models.TextField()
+    translated_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source_hash', 'target'], name='unique_cached_translation'),
+        ]
+
+    def __str__(self):
+        return f"[{self.target}] {self.source_text[:40]}"
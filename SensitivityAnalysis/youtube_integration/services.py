@@ -1,109 +1,306 @@
 import logging
 import os
+import queue
+import threading
 import time
-from urllib.error import HTTPError
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import googleapiclient.discovery
-from deep_translator import GoogleTranslator
-import pycld2 as cld2
+
+from youtube_integration import metrics
+from youtube_integration.api_scheduler import ApiScheduler
+from youtube_integration.language_detection import CONFIDENCE_THRESHOLD, UNDETERMINED, detect_languages
+from youtube_integration.translation import translate_texts
 
 load_dotenv()
-CONFIDENCE_THRESHOLD = 0.90
 PRO_COMMENT_LIMIT = 10000
+CLIENT_POOL_SIZE = 4
+IDS_PER_REQUEST = 50  # max ids per videos.list call and max results per playlistItems.list page
 
 
-def check_video_limit(video_id):
+class YouTubeClientPool:
+    """
+    Reusable YouTube Data API clients. Building a client parses the discovery document, so it is done
+    once per pooled client (from the document bundled with google-api-python-client, no HTTP fetch).
+    Clients are not thread-safe: each thread borrows one with `with pool.client() as youtube:`.
+    Requests are executed through the pool's ApiScheduler (quota, rate limit and retries of the API key).
+    """
+
+    def __init__(self, api_key, size=CLIENT_POOL_SIZE, api_endpoint=None, scheduler=None):
+        self.api_key = api_key
+        self.api_endpoint = api_endpoint
+        self.size = size
+        self.scheduler = scheduler or ApiScheduler(api_key)
+        self.built = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _build(self):
+        client_options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+        youtube = googleapiclient.discovery.build(
+            "youtube", "v3", developerKey=self.api_key, client_options=client_options,
+            static_discovery=True, cache_discovery=False,
+        )
+        with self._lock:
+            self.built += 1
+        return youtube
+
+    @contextmanager
+    def client(self):
+        try:
+            youtube = self._idle.get_nowait()
+        except queue.Empty:
+            youtube = self._build()
+        try:
+            yield youtube
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(youtube)
+
+
+_client_pool = None
+_client_pool_lock = threading.Lock()
+
+
+def get_client_pool():
+    global _client_pool
+    with _client_pool_lock:
+        if _client_pool is None:
+            # YOUTUBE_API_ENDPOINT points the clients at another server (e.g. a local fake API in tests)
+            _client_pool = YouTubeClientPool(os.getenv("API_KEY"), api_endpoint=os.getenv("YOUTUBE_API_ENDPOINT"))
+        return _client_pool
+
+
+def youtube_client():
+    return get_client_pool().client()
+
+
+def execute(request, method):
+    """Runs an API request built by a pooled client, e.g. execute(youtube.videos().list(...), 'videos.list')."""
+    return get_client_pool().scheduler.execute(request, method)
+
+
+class CommentPage(list):
+    """Comment records of one API page; next_page_token resumes paging after it (None on the last page)."""
+
+    def __init__(self, records=(), next_page_token=None):
+        super().__init__(records)
+        self.next_page_token = next_page_token
+
+
+def comment_limit_message(comment_count):
+    """Reason a video with comment_count comments cannot be analysed, or None."""
+    if comment_count > PRO_COMMENT_LIMIT:
+        return (f"The video has {comment_count} comments. "
+                f"The free version supports up to {PRO_COMMENT_LIMIT}. "
+                "Purchase the PRO package to analyze such large channels.")
+    return None
+
+
+def check_video(video_id):
+    """(comment count, None) of the video, or (None, reason it cannot be analysed at all)."""
     try:
-        api_key = os.getenv("API_KEY")
-        youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
-        response = youtube.videos().list(part='statistics', id=video_id).execute()
+        with youtube_client() as youtube:
+            response = execute(youtube.videos().list(part='statistics', id=video_id), 'videos.list')
         if not response.get("items"):
-            return False, "Video with the given ID was not found or is private."
-
-        stats = response["items"][0]["statistics"]
-        comment_count = int(stats.get("commentCount", 0))
-        if comment_count > PRO_COMMENT_LIMIT:
-            msg = (f"The video has {comment_count} comments. "
-                   f"The free version supports up to {PRO_COMMENT_LIMIT}. "
-                   "Purchase the PRO package to analyze such large channels.")
-            return False, msg
-        return True, None
+            return None, "Video with the given ID was not found or is private."
+        return int(response["items"][0]["statistics"].get("commentCount", 0)), None
     except Exception as e:
-        return False, f"Verification error: {str(e)}"
+        return None, f"Verification error: {str(e)}"
+
+
+def check_video_limit(video_id):
+    comment_count, error = check_video(video_id)
+    msg = error or comment_limit_message(comment_count)
+    if msg:
+        return False, msg
+    return True, None
+
+
+def get_videos_meta(video_ids):
+    """
+    Metadata of many videos with one videos.list call per IDS_PER_REQUEST ids:
+    {video_id: get_yt_video_meta() tuple}. Missing and private videos are left out.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    metas = {}
+    with youtube_client() as youtube:
+        for start in range(0, len(video_ids), IDS_PER_REQUEST):
+            chunk = video_ids[start:start + IDS_PER_REQUEST]
+            response = execute(youtube.videos().list(part="snippet,statistics", id=",".join(chunk),
+                                                     maxResults=IDS_PER_REQUEST), 'videos.list')
+            for item in response.get("items", []):
+                metas[item["id"]] = _video_meta(item)
+    return metas
+
+
+def get_playlist_video_ids(playlist_id, max_videos=None):
+    """Video ids of a playlist in playlist order (IDS_PER_REQUEST per playlistItems.list page)."""
+    video_ids = []
+    with youtube_client() as youtube:
+        request = youtube.playlistItems().list(part="contentDetails", playlistId=playlist_id,
+                                               maxResults=IDS_PER_REQUEST)
+        while request and (max_videos is None or len(video_ids) < max_videos):
+            response = execute(request, 'playlistItems.list')
+            video_ids.extend(item["contentDetails"]["videoId"] for item in response.get("items", []))
+            request = youtube.playlistItems().list_next(request, response)
+    return video_ids[:max_videos] if max_videos is not None else video_ids
+
+
+def get_channel_video_ids(channel, max_videos=None):
+    """Ids of the newest uploads of a channel, given by id (UC...) or handle (@name)."""
+    lookup = {"forHandle": channel} if channel.startswith("@") else {"id": channel}
+    with youtube_client() as youtube:
+        response = execute(youtube.channels().list(part="contentDetails", **lookup), 'channels.list')
+    if not response.get("items"):
+        raise ValueError(f"Channel {channel} was not found.")
+    uploads = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+    return get_playlist_video_ids(uploads, max_videos)
 
 
 def get_yt_comments(video_id, max_results_total=PRO_COMMENT_LIMIT, progress_callback=None):
+    records = get_yt_comment_records(video_id, max_results_total, progress_callback)
+    return [r["text"] for r in records]
+
+
+def detect_page_languages(page):
+    """Sets 'lang' of every record of a page: a language code, "unknown" (unsure) or "und" (too short to tell)."""
+    with metrics.LANGUAGE_DETECTION_SECONDS.time():
+        codes, confidences = detect_languages([r["text"] for r in page])
+    for record, code, confidence in zip(page, codes, confidences):
+        record["lang"] = code if (confidence >= CONFIDENCE_THRESHOLD or code == UNDETERMINED) else "unknown"
+    return page
+
+
+def iter_comment_pages(video_id, order="relevance", max_results_total=PRO_COMMENT_LIMIT, known_ids=None,
+                       page_token=None, skip_ids=None):
+    """
+    Yields pages of top-level comments as CommentPage lists of dicts {'id', 'text', 'published_at', 'lang'}, one
+    page per API response, so callers can process a page while the next one is being downloaded.
+    With order="time" and known_ids, paging stops at the first already known comment.
+    page_token (a page's next_page_token) resumes an interrupted paging; skip_ids are left out (already fetched).
+    """
+    known_ids = known_ids or set()
+    seen_ids = set(skip_ids or ())
+    fetched = 0
+
+    with youtube_client() as youtube:
+        request = youtube.commentThreads().list(part='snippet', videoId=video_id, maxResults=100, order=order,
+                                                **({'pageToken': page_token} if page_token else {}))
+        reached_known = False
+
+        while request and not reached_known and fetched < max_results_total:
+            response = execute(request, 'commentThreads.list')
+            page = CommentPage(next_page_token=response.get("nextPageToken"))
+            for item in response.get("items", []):
+                if item["id"] in known_ids:
+                    # time order: everything from here on was analysed before
+                    reached_known = True
+                    break
+                if item["id"] in seen_ids: continue
+                seen_ids.add(item["id"])
+                snippet = item["snippet"]["topLevelComment"]["snippet"]
+                text = snippet["textOriginal"]
+                if not text: continue
+
+                page.append({"id": item["id"], "text": text, "published_at": snippet.get("publishedAt")})
+                fetched += 1
+                if fetched >= max_results_total: break
+
+            metrics.COMMENTS_FETCHED.inc(len(page))
+            yield detect_page_languages(page)
+            request = youtube.commentThreads().list_next(request, response)
+
+
+def iter_sample_pages(video_id, max_results_total):
+    """
+    Pages for sampling a video too large to analyse whole: alternately one page of the newest comments
+    (order=time) and one of the most relevant ones (order=relevance), without the comments already taken
+    from the other order, until max_results_total comments. Stopping early is closing the generator.
+    """
+    streams = [iter_comment_pages(video_id, order=order, max_results_total=max_results_total)
+               for order in ("time", "relevance")]
+    seen_ids = set()
+    fetched = 0
+    try:
+        while streams and fetched < max_results_total:
+            for stream in list(streams):
+                page = next(stream, None)
+                if page is None:
+                    streams.remove(stream)
+                    continue
+                sample = CommentPage(r for r in page if r["id"] not in seen_ids)
+                del sample[max_results_total - fetched:]
+                seen_ids.update(r["id"] for r in sample)
+                fetched += len(sample)
+                yield sample
+                if fetched >= max_results_total:
+                    break
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+def translate_page(page):
+    """Translates the non-English records of one page in place and drops their 'lang' key."""
+    # texts too short to detect ("und": emoji, "ok") are not worth a translation request either
+    to_translate = [r for r in page if r.pop("lang", "en") not in ("en", UNDETERMINED)]
+    if to_translate:
+        # failed translations come back as None, those comments keep their original text
+        translated_texts = translate_texts([r["text"] for r in to_translate])
+        for record, translated_text in zip(to_translate, translated_texts):
+            if translated_text:
+                record["text"] = translated_text
+    return page
+
+
+def get_yt_comment_records(video_id, max_results_total=PRO_COMMENT_LIMIT, progress_callback=None,
+                           order="relevance", known_ids=None):
+    """
+    Downloads top-level comments as dicts {'id', 'text', 'published_at'} (non-English text translated).
+    With order="time" and known_ids, paging stops at the first already known comment,
+    so only comments newer than the last run are fetched.
+    """
     print(f"\n--- STARTING YOUTUBE DOWNLOAD ---")
     start_time = time.time()
     comments_list = []
-    to_translate_index = []
-    to_translate_text = []
 
     try:
-        api_key = os.getenv("API_KEY")
-        youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
-        request = youtube.commentThreads().list(part='snippet', videoId=video_id, maxResults=100)
-
-        while request and len(comments_list) < max_results_total:
-            response = request.execute()
-            for item in response.get("items", []):
-                text = item["snippet"]["topLevelComment"]["snippet"]["textOriginal"]
-                if not text: continue
-                try:
-                    reliable, _, details = cld2.detect(text)
-                    lang = details[0][1] if (reliable and details[0][2] / 100.0 >= CONFIDENCE_THRESHOLD) else "unknown"
-                except:
-                    lang = "unknown"
-
-                curr_idx = len(comments_list)
-                comments_list.append(text)
-                if lang != "en":
-                    to_translate_index.append(curr_idx)
-                    to_translate_text.append(text)
-                if len(comments_list) >= max_results_total: break
+        for page in iter_comment_pages(video_id, order, max_results_total, known_ids):
+            comments_list.extend(page)
 
             # PROGRESS UPDATE: DOWNLOADING AND FILTERING (10-40%)
             if progress_callback:
                 progress = 10 + int((len(comments_list) / max_results_total) * 30)
                 progress_callback(progress, f"Downloading & Filtering: {len(comments_list)} comments...")
 
-            request = youtube.commentThreads().list_next(request, response)
-
-        if to_translate_text:
-            if progress_callback:
-                progress_callback(45, f"Translating {len(to_translate_text)} comments...")
-
-            t_start = time.time()
-            try:
-                translator = GoogleTranslator(source="auto", target="en")
-                translated_texts = translator.translate_batch(to_translate_text)
-                for i, translated_text in enumerate(translated_texts):
-                    if translated_text:
-                        comments_list[to_translate_index[i]] = translated_text
-            except Exception as e:
-                logging.warning(f"Translation error: {e}")
+        to_translate = [r for r in comments_list if r.get("lang", "en") not in ("en", UNDETERMINED)]
+        if to_translate and progress_callback:
+            progress_callback(45, f"Translating {len(to_translate)} comments...")
+        translate_page(comments_list)
+        if to_translate and progress_callback:
+            progress_callback(60, "Translation finished.")
 
-            if progress_callback:
-                progress_callback(60, "Translation finished.")
-
-        print(f"--- YOUTUBE SERVICE FINISHED ---")
+        print(f"--- YOUTUBE SERVICE FINISHED ({round(time.time() - start_time, 2)}s) ---")
         return comments_list
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         raise
 
 
+def _video_meta(item):
+    snippet = item.get("snippet", {})
+    stats = item.get("statistics", {})
+    thumbs = snippet.get("thumbnails", {})
+    best = (thumbs.get("maxres") or thumbs.get("high") or {}).get("url")
+    return snippet.get("title"), best, snippet.get("channelTitle"), snippet.get("publishedAt"), stats.get(
+        "viewCount"), stats.get("likeCount"), stats.get("commentCount")
+
+
 def get_yt_video_meta(video_id):
     try:
-        api_key = os.getenv("API_KEY")
-        youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=api_key)
-        resp = youtube.videos().list(part="snippet,statistics", id=video_id).execute()
-        item = resp["items"][0]
-        snippet = item.get("snippet", {})
-        stats = item.get("statistics", {})
-        thumbs = snippet.get("thumbnails", {})
-        best = (thumbs.get("maxres") or thumbs.get("high") or {}).get("url")
-        return snippet.get("title"), best, snippet.get("channelTitle"), snippet.get("publishedAt"), stats.get(
-            "viewCount"), stats.get("likeCount")
+        with youtube_client() as youtube:
+            resp = execute(youtube.videos().list(part="snippet,statistics", id=video_id), 'videos.list')
+        return _video_meta(resp["items"][0])
     except Exception:
-        return None, None, None, None, None, None
\ No newline at end of file
+        return None, None, None, None, None, None, None
\ No newline at end of file
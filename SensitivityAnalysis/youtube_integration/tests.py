@@ -1,3 +1,373 @@
-from django.test import TestCase
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from googleapiclient.errors import HttpError
+from prometheus_client import REGISTRY
+
+from youtube_integration import api_scheduler, services
+from youtube_integration.api_scheduler import ApiScheduler, QuotaExceeded, TokenBucket
+from youtube_integration.language_detection import detect_languages, english_mask
+from youtube_integration.models import CachedTranslation
+from youtube_integration.translation import translate_texts
+
+
+def make_comment(i):
+    return {
+        "id": f"c{i}",
+        "snippet": {"topLevelComment": {"snippet": {
+            "textOriginal": f"This is a really great video number {i}, thank you so much for making it",
+            "publishedAt": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z",
+        }}},
+    }
+
+
+def make_video(video_id):
+    return {
+        "id": video_id,
+        "snippet": {"title": f"Fake video {video_id}", "channelTitle": "Fake channel",
+                    "publishedAt": "2024-01-01T00:00:00Z",
+                    "thumbnails": {"high": {"url": "http://example.com/thumb.jpg"}}},
+        "statistics": {"viewCount": "1000", "likeCount": "10", "commentCount": "250"},
+    }
+
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    """
+    Answers commentThreads.list (pages of 100 comments), videos.list (ids starting with "missing" are not found),
+    playlistItems.list (playlist of 120 videos, pages of maxResults) and channels.list like the YouTube Data API.
+    errors: (status, reason) answers given to the next commentThreads.list requests instead of a page.
+    newest_first: order=time pages the comments from the last one.
+    """
+    comments = [make_comment(i) for i in range(250)]
+    newest_first = False
+    playlist = [f"video{i:06d}" for i in range(120)]
+    requests = []
+    errors = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        type(self).requests.append((url.path, query))
+
+        if url.path.endswith("/commentThreads") and self.errors:
+            status, reason = self.errors.pop(0)
+            body = {"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}}
+            self.send_json(body, status)
+            return
+        if url.path.endswith("/commentThreads"):
+            start = int(query.get("pageToken", ["0"])[0])
+            comments = self.comments[::-1] if self.newest_first and query["order"] == ["time"] else self.comments
+            body = {"items": comments[start:start + 100]}
+            if start + 100 < len(self.comments):
+                body["nextPageToken"] = str(start + 100)
+        elif url.path.endswith("/videos"):
+            ids = query["id"][0].split(",")
+            body = {"items": [make_video(video_id) for video_id in ids if not video_id.startswith("missing")]}
+        elif url.path.endswith("/playlistItems"):
+            start, size = int(query.get("pageToken", ["0"])[0]), int(query["maxResults"][0])
+            body = {"items": [{"contentDetails": {"videoId": video_id}}
+                              for video_id in self.playlist[start:start + size]]}
+            if start + size < len(self.playlist):
+                body["nextPageToken"] = str(start + size)
+        elif url.path.endswith("/channels"):
+            body = {"items": [{"contentDetails": {"relatedPlaylists": {"uploads": "UUfake"}}}]}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_json(body)
+
+    def send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeYouTubeServerTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeYouTubeHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        FakeYouTubeHandler.requests = []
+        FakeYouTubeHandler.errors = []
+        # quota usage is shared through the cache: every test starts with a fresh day
+        caches[api_scheduler.QUOTA_CACHE].clear()
+        self.addCleanup(caches[api_scheduler.QUOTA_CACHE].clear)
+        # no waiting between retries
+        self.scheduler = ApiScheduler("test-key", sleep=lambda seconds: None)
+        self.pool = services.YouTubeClientPool("test-key", api_endpoint=self.endpoint, scheduler=self.scheduler)
+        patcher = mock.patch.object(services, "_client_pool", self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class YouTubeServicesTests(FakeYouTubeServerTestCase):
+    def test_comment_records_are_paged_from_the_api(self):
+        records = services.get_yt_comment_records("video1")
+
+        self.assertEqual([r["id"] for r in records], [f"c{i}" for i in range(250)])
+        self.assertEqual(len([r for r in FakeYouTubeHandler.requests if r[0].endswith("/commentThreads")]), 3)
+
+    def test_paging_stops_at_known_comments(self):
+        records = services.get_yt_comment_records("video1", order="time", known_ids={"c120", "c121"})
+
+        self.assertEqual(len(records), 120)
+        self.assertEqual(FakeYouTubeHandler.requests[-1][1]["order"], ["time"])
+
+    def test_sample_alternates_time_and_relevance_pages(self):
+        with mock.patch.object(FakeYouTubeHandler, "newest_first", True):
+            pages = list(services.iter_sample_pages("video1", 220))
+
+        ids = [r["id"] for page in pages for r in page]
+        self.assertEqual(len(ids), 220)
+        self.assertEqual(len(set(ids)), 220)
+        self.assertEqual((ids[0], ids[100], ids[200]), ("c249", "c0", "c149"))
+        self.assertEqual([query["order"][0] for _, query in FakeYouTubeHandler.requests], ["time", "relevance", "time"])
+
+    def test_clients_are_reused_across_calls(self):
+        self.assertEqual(services.check_video_limit("video1"), (True, None))
+        meta = services.get_yt_video_meta("video1")
+        services.get_yt_comments("video1", max_results_total=50)
+
+        self.assertEqual(meta[0], "Fake video video1")
+        self.assertEqual(self.pool.built, 1)
+
+    def test_video_metadata_is_fetched_50_ids_per_call(self):
+        video_ids = [f"video{i:06d}" for i in range(110)] + ["missing0001"]
+        metas = services.get_videos_meta(video_ids)
+
+        self.assertEqual(len(metas), 110)
+        self.assertEqual(metas["video000007"][0], "Fake video video000007")
+        calls = [r for r in FakeYouTubeHandler.requests if r[0].endswith("/videos")]
+        self.assertEqual([len(q["id"][0].split(",")) for _, q in calls], [50, 50, 11])
+
+    def test_channel_uploads_are_listed_through_the_playlist(self):
+        video_ids = services.get_channel_video_ids("@fakechannel", max_videos=70)
+
+        self.assertEqual(video_ids, FakeYouTubeHandler.playlist[:70])
+        self.assertEqual(FakeYouTubeHandler.requests[0][1]["forHandle"], ["@fakechannel"])
+        self.assertEqual(FakeYouTubeHandler.requests[-1][1]["playlistId"], ["UUfake"])
+
+    def test_server_errors_are_retried(self):
+        def retried():
+            return REGISTRY.get_sample_value("youtube_api_requests_total",
+                                             {"method": "commentThreads.list", "outcome": "retried"}) or 0
+
+        before = retried()
+        FakeYouTubeHandler.errors = [(500, "backendError"), (503, "backendError"), (429, "rateLimitExceeded")]
+        records = services.get_yt_comment_records("video1")
+
+        self.assertEqual(len(records), 250)
+        status = self.scheduler.status()
+        self.assertEqual(status["retried"], 3)
+        self.assertEqual(status["used"], 6)  # 3 pages + 3 failed attempts
+        self.assertEqual(retried() - before, 3)
+
+    def test_client_errors_are_not_retried(self):
+        FakeYouTubeHandler.errors = [(403, "commentsDisabled")]
+        with self.assertRaises(HttpError):
+            services.get_yt_comment_records("video1")
+        self.assertEqual(self.scheduler.status()["retried"], 0)
+
+    def test_daily_quota_is_enforced_before_the_request(self):
+        self.pool.scheduler = ApiScheduler("test-key", daily_quota=2)
+        pages = services.iter_comment_pages("video1")
+        records = next(pages) + next(pages)
+        with self.assertRaises(QuotaExceeded):
+            next(pages)
+
+        self.assertEqual(len(records), 200)
+        self.assertEqual(len(FakeYouTubeHandler.requests), 2)
+
+    def test_quota_usage_is_shared_by_the_schedulers_of_a_key(self):
+        services.get_yt_comment_records("video1")
+        # another process using the key, or this one after a restart
+        other = ApiScheduler("test-key", daily_quota=4)
+        self.assertEqual(other.quota_used(), 3)
+        with self.assertRaises(QuotaExceeded):
+            other.execute(mock.Mock(), "search.list")
+        self.assertEqual(other.quota_used(), 3)  # refused requests are not charged
+        self.assertEqual(ApiScheduler("other-key").quota_used(), 0)
+
+        FakeYouTubeHandler.errors = [(403, "quotaExceeded")]
+        with self.assertRaises(QuotaExceeded):
+            services.get_yt_comment_records("video1")
+        self.assertTrue(ApiScheduler("test-key").status()["exhausted"])
+
+    def test_retry_after_is_capped(self):
+        error = mock.Mock(resp={"retry-after": "3600"})
+        self.assertEqual(self.scheduler._delay(0, error), api_scheduler.MAX_BACKOFF)
+        self.assertEqual(self.scheduler._delay(0, mock.Mock(resp={"retry-after": "2"})), 2.0)
+
+    def test_token_bucket_limits_the_request_rate(self):
+        now = [0.0]
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(6):
+            bucket.acquire()
+
+        # 2 requests of burst, then one every 0.5s
+        self.assertAlmostEqual(now[0], 2.0)
+        self.assertEqual(len(waits), 4)
+
+    def test_concurrent_callers_get_separate_clients(self):
+        barrier = threading.Barrier(3)
+
+        def fetch():
+            with services.youtube_client():
+                barrier.wait(timeout=5)
+
+        threads = [threading.Thread(target=fetch) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.pool.built, 3)
+        with services.youtube_client():
+            pass
+        self.assertEqual(self.pool.built, 3)
+
+
+class QuotaResumeTests(FakeYouTubeServerTestCase, TransactionTestCase):
+    def classify(self, model_name, texts, timings=None):
+        return np.full(len(texts), 2, dtype=np.int64), np.full(len(texts), 0.9)
+
+    def analyze(self):
+        from data_processing import views
+
+        with mock.patch.object(views, "translate_page", side_effect=lambda page: page), \
+                mock.patch.object(views, "classify_texts", side_effect=self.classify):
+            return views.analyze_video("video1", "naive_bayes", lambda progress, step: None,
+                                       meta=("T", None, "C", None, "1", "0", "250"))
+
+    def test_analysis_stopped_by_the_quota_resumes_from_its_last_page(self):
+        from data_processing import incremental
+        from data_processing.model_registry import get_model_version
+
+        self.pool.scheduler = ApiScheduler("test-key", daily_quota=1, sleep=lambda seconds: None)
+        with self.assertRaises(QuotaExceeded):
+            self.analyze()
+        version = get_model_version("naive_bayes")
+        interrupted = incremental.load_interrupted("video1", "naive_bayes", version)
+        self.assertEqual(interrupted.checkpoint["page_token"], "100")
+        self.assertEqual(interrupted.comment_count, 100)
+
+        # the key stays blocked for the rest of the day, without asking the API
+        requests_before = len(FakeYouTubeHandler.requests)
+        with self.assertRaises(QuotaExceeded):
+            self.analyze()
+        self.assertEqual(len(FakeYouTubeHandler.requests), requests_before)
+
+        # next day: the analysis continues from the page that failed
+        tomorrow = api_scheduler.quota_day() + datetime.timedelta(days=1)
+        with mock.patch.object(api_scheduler, "quota_day", return_value=tomorrow):
+            self.pool.scheduler.daily_quota = 10
+            stats = self.analyze()
+
+        self.assertEqual(stats["comment_count"], 250)
+        self.assertEqual(stats["new_comment_count"], 150)
+        self.assertEqual(FakeYouTubeHandler.requests[requests_before][1]["pageToken"], ["100"])
+        self.assertEqual(set(incremental.known_comment_ids(incremental.load_state("video1", "naive_bayes", version))),
+                         {f"c{i}" for i in range(250)})
+
+
+class LanguageDetectionTests(SimpleTestCase):
+    texts = [
+        "This is the best video I have seen this year",
+        "😂😂",
+        "Esta canción es increíble, la escucho todos los días desde que salió",
+        "Ce film est vraiment magnifique, merci beaucoup pour le partage",
+    ]
+
+    def test_codes_and_confidences_are_aligned_arrays(self):
+        codes, confidences = detect_languages(self.texts)
+
+        self.assertEqual(list(codes), ["en", "und", "es", "fr"])
+        self.assertEqual(confidences.shape, (4,))
+        self.assertEqual(confidences[1], 0.0)
+        self.assertEqual(list(english_mask(codes, confidences)), [True, False, False, False])
+
+    def test_engines_agree_on_clear_texts(self):
+        for engine in ("cld2", "langid", "langdetect"):
+            codes, _ = detect_languages(self.texts[2:], engine=engine)
+            self.assertEqual(list(codes), ["es", "fr"], engine)
+
+    def test_process_pool_gives_the_same_result(self):
+        texts = self.texts * 600
+        with mock.patch("youtube_integration.language_detection.PROCESS_POOL_MIN_TEXTS", 1000):
+            codes, confidences = detect_languages(texts, processes=2)
+        expected_codes, expected_confidences = detect_languages(texts, processes=1)
+
+        self.assertEqual(list(codes), list(expected_codes))
+        self.assertEqual(list(confidences), list(expected_confidences))
+
+
+class StubTranslator:
+    """Local translator backend: upper-cases texts, fails for texts containing 'FAIL' and 'flaky' ones once."""
+
+    def __init__(self):
+        self.calls = []
+        self.flaky_failed = False
+
+    def translate_batch(self, texts, target):
+        self.calls.append(list(texts))
+        if any("FAIL" in t for t in texts):
+            raise ConnectionError("translator unavailable")
+        if any("flaky" in t for t in texts) and not self.flaky_failed:
+            self.flaky_failed = True
+            raise ConnectionError("temporary error")
+        return [f"{t.upper()} [{target}]" for t in texts]
+
+
+class TranslationTests(TestCase):
+    def test_translations_are_cached_between_calls(self):
+        backend = StubTranslator()
+        first = translate_texts(["hola", "bonjour", "hola"], backend=backend, chunk_size=2, backoff=0)
+        stats = {}
+        second = translate_texts(["bonjour", "hola"], backend=backend, backoff=0, stats=stats)
+
+        self.assertEqual(first, ["HOLA [en]", "BONJOUR [en]", "HOLA [en]"])
+        self.assertEqual(second, ["BONJOUR [en]", "HOLA [en]"])
+        self.assertEqual(len(backend.calls), 1)
+        self.assertEqual(stats["cached"], 2)
+        self.assertEqual(CachedTranslation.objects.count(), 2)
+
+    def test_failed_chunk_returns_partial_results(self):
+        backend = StubTranslator()
+        stats = {}
+        result = translate_texts(["uno", "FAIL dos", "tres", "flaky cuatro"], backend=backend, chunk_size=1,
+                                 retries=2, backoff=0, stats=stats)
+
+        self.assertEqual(result, ["UNO [en]", None, "TRES [en]", "FLAKY CUATRO [en]"])
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(sum(1 for c in backend.calls if c == ["FAIL dos"]), 3)
+        self.assertFalse(CachedTranslation.objects.filter(source_text="FAIL dos").exists())
@@ -0,0 +1,110 @@
+# youtube_integration/translation.py
+# Translation of non-English comments.
+#
+# - translations are cached in the CachedTranslation table, keyed on (sha1 of source text, target language),
+#   so the same strings are never sent to the translator twice
+# - texts missing from the cache are split into chunks translated concurrently, every chunk is retried
+#   with exponential backoff, and a chunk that keeps failing only loses its own texts (None in the result)
+# - the translator is pluggable (TRANSLATION_BACKEND setting, dotted path to a class with translate_batch)
+# - chunks, their duration and cache hits are counted in youtube_integration.metrics
+
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from youtube_integration import metrics
+from youtube_integration.models import CachedTranslation
+
+TRANSLATION_BACKEND = getattr(settings, 'TRANSLATION_BACKEND',
+                              'youtube_integration.translation.GoogleTranslatorBackend')
+TRANSLATION_CHUNK_SIZE = getattr(settings, 'TRANSLATION_CHUNK_SIZE', 50)
+TRANSLATION_WORKERS = getattr(settings, 'TRANSLATION_WORKERS', 4)
+TRANSLATION_RETRIES = getattr(settings, 'TRANSLATION_RETRIES', 3)
+TRANSLATION_BACKOFF = getattr(settings, 'TRANSLATION_BACKOFF', 1.0)
+
+
+class GoogleTranslatorBackend:
+    """deep_translator's Google Translate client."""
+
+    def translate_batch(self, texts, target):
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source="auto", target=target).translate_batch(texts)
+
+
+def get_backend(path=None):
+    return import_string(path or TRANSLATION_BACKEND)()
+
+
+def _source_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+@metrics.TRANSLATION_CHUNK_SECONDS.time()
+def _translate_chunk(backend, texts, target, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            translated = backend.translate_batch(texts, target)
+            if len(translated) != len(texts):
+                raise ValueError(f"Translator returned {len(translated)} texts for {len(texts)}")
+            metrics.TRANSLATION_CHUNKS.labels('ok').inc()
+            return translated
+        except Exception as e:
+            if attempt == retries:
+                logging.warning(f"Translation of {len(texts)} texts failed after {retries + 1} attempts: {e}")
+                metrics.TRANSLATION_CHUNKS.labels('failed').inc()
+                return None
+            time.sleep(backoff * (2 ** attempt))
+
+
+def translate_texts(texts, target="en", backend=None, chunk_size=TRANSLATION_CHUNK_SIZE, workers=TRANSLATION_WORKERS,
+                    retries=TRANSLATION_RETRIES, backoff=TRANSLATION_BACKOFF, stats=None):
+    """
+    Translates texts to the target language. Returns a list aligned with texts; an item is None
+    when its translation failed (partial results). stats, if given, is a dict updated with the
+    'cached' (from the cache), 'translated' (by the backend), 'failed' and 'chunks' counters.
+    """
+    backend = backend or get_backend()
+    stats = stats if stats is not None else {}
+    for key in ('cached', 'translated', 'failed', 'chunks'):
+        stats.setdefault(key, 0)
+
+    hashes = {t: _source_hash(t) for t in texts}
+    cached = dict(
+        CachedTranslation.objects.filter(target=target, source_hash__in=set(hashes.values()))
+        .values_list('source_hash', 'translated_text')
+    )
+    translations = {t: cached[h] for t, h in hashes.items() if h in cached}
+    from_cache = sum(1 for t in texts if t in translations)
+
+    missing = [t for t in dict.fromkeys(texts) if t not in translations]
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), max(1, chunk_size))]
+    stats['chunks'] += len(chunks)
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as pool:
+            results = list(pool.map(lambda chunk: _translate_chunk(backend, chunk, target, retries, backoff), chunks))
+
+        fresh = []
+        for chunk, translated in zip(chunks, results):
+            if translated is None:
+                continue
+            for source, result in zip(chunk, translated):
+                if result:
+                    translations[source] = result
+                    fresh.append(CachedTranslation(source_hash=hashes[source], target=target,
+                                                   source_text=source, translated_text=result))
+        CachedTranslation.objects.bulk_create(fresh, batch_size=500, ignore_conflicts=True)
+
+    output = [translations.get(t) for t in texts]
+    failed = sum(1 for r in output if r is None)
+    stats['cached'] += from_cache
+    stats['failed'] += failed
+    stats['translated'] += len(output) - failed - from_cache
+    metrics.TRANSLATION_TEXTS.labels('cache').inc(from_cache)
+    metrics.TRANSLATION_TEXTS.labels('translator').inc(len(output) - failed - from_cache)
+    metrics.TRANSLATION_TEXTS.labels('failed').inc(failed)
+    return output